@@ -1,10 +1,7 @@
 import asyncio
-import functools
 import threading
 import time
 
-import schedule
-
 import lokbot.util
 from lokbot import project_root, logger, config
 from lokbot.async_farmer import AsyncLokFarmer
@@ -23,28 +20,21 @@ def find_alliance(farmer: LokFarmer):
         time.sleep(60 * 5)
 
 
-thread_map = {}
-
-
-def run_threaded(name, job_func):
-    if name in thread_map and thread_map[name].is_alive():
-        return
-
-    job_thread = threading.Thread(target=job_func, name=name, daemon=True)
-    thread_map[name] = job_thread
-    job_thread.start()
-
+def async_main(token, captcha_solver_config=None):
+    async_farmer = AsyncLokFarmer(token, captcha_solver_config)
 
-def async_main(token):
-    async_farmer = AsyncLokFarmer(token)
+    async def _main():
+        await async_farmer.enter()
+        await async_farmer.parallel_buy_caravan()
 
-    asyncio.run(async_farmer.parallel_buy_caravan())
+    asyncio.run(_main())
 
 
-def main(token, captcha_solver_config=None):
-    # async_main(token)
-    # exit()
-
+def load_farmer(token, captcha_solver_config=None, scheduler=None):
+    """
+    Log in with the token saved by the last run if it's still valid, otherwise with `token`
+    :return: LokFarmer
+    """
     if captcha_solver_config is None:
         captcha_solver_config = {}
 
@@ -54,13 +44,19 @@ def main(token, captcha_solver_config=None):
         token_from_file = token_file.read_text()
         logger.info(f'Using token: {token_from_file} from file: {token_file}')
         try:
-            farmer = LokFarmer(token_from_file, captcha_solver_config)
+            return LokFarmer(token_from_file, captcha_solver_config, scheduler)
         except NoAuthException:
             logger.info('Token is invalid, using token from command line')
-            farmer = LokFarmer(token, captcha_solver_config)
-    else:
-        farmer = LokFarmer(token, captcha_solver_config)
 
+    return LokFarmer(token, captcha_solver_config, scheduler)
+
+
+def start_farmer(farmer: LokFarmer):
+    """
+    Start the sockets, then queue the `main.threads` and every `main.jobs` of config.json on `farmer.scheduler`,
+    jobs are run once right away
+    :return:
+    """
     threading.Thread(target=farmer.sock_thread, daemon=True).start()
     threading.Thread(target=farmer.socc_thread, daemon=True).start()
 
@@ -72,13 +68,13 @@ def main(token, captcha_solver_config=None):
 
         name = job.get('name')
 
-        schedule.every(
-            job.get('interval').get('start')
-        ).to(
-            job.get('interval').get('end')
-        ).minutes.do(run_threaded, name, functools.partial(getattr(farmer, name), **job.get('kwargs', {})))
-
-    schedule.run_all()
+        farmer.scheduler.every(
+            f'{farmer._id}:{name}',
+            getattr(farmer, name),
+            job.get('interval').get('start') * 60,
+            job.get('interval').get('end') * 60,
+            job.get('kwargs', {}),
+        )
 
     # schedule.every(15).to(20).minutes.do(farmer.keepalive_request)
 
@@ -86,8 +82,14 @@ def main(token, captcha_solver_config=None):
         if not thread.get('enabled'):
             continue
 
-        threading.Thread(target=getattr(farmer, thread.get('name')), kwargs=thread.get('kwargs'), daemon=True).start()
+        name = thread.get('name')
+        farmer.scheduler.call_soon(getattr(farmer, name), kwargs=thread.get('kwargs'), name=f'{farmer._id}:{name}')
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+def main(token, captcha_solver_config=None):
+    # async_main(token)
+    # exit()
+
+    farmer = load_farmer(token, captcha_solver_config)
+    start_farmer(farmer)
+    farmer.scheduler.run_forever()
@@ -0,0 +1,255 @@
+import collections
+import collections.abc
+import json
+import os
+import pickle
+import threading
+
+from lokbot import project_root, logger
+
+# bump whenever the compiled layout changes
+COMPILED_VERSION = 1
+
+BuildingLevel = collections.namedtuple('BuildingLevel', 'level valid resources items requirements time power')
+ResearchLevel = collections.namedtuple('ResearchLevel', 'level resources items requirements time power ability_value')
+
+_tables = None
+_lock = threading.Lock()
+
+
+def compiled_path():
+    return project_root.joinpath('data/assets.pickle')
+
+
+def _sources():
+    """
+    :return: [(table name, category, path)]
+    """
+    import lokbot.enum  # it imports this module for its tables
+
+    res = [
+        ('building', building_type, project_root.joinpath(f'lokbot/assets/buildings/{building_type}.json'))
+        for building_type in lokbot.enum.BUILDING_CODE_MAP
+    ]
+    res += [
+        ('research', research_category, project_root.joinpath(f'lokbot/assets/research/{research_category}.json'))
+        for research_category in lokbot.enum.RESEARCH_CODE_MAP
+    ]
+
+    return res
+
+
+def _fingerprint():
+    return COMPILED_VERSION, tuple(
+        (path.name, os.stat(path).st_mtime_ns, os.stat(path).st_size) for _, _, path in _sources()
+    )
+
+
+def _number(value):
+    """
+    "500" -> 500, "0.02" -> 0.02
+    """
+    number = float(value)
+
+    return int(number) if number.is_integer() else number
+
+
+def _resources(requirements):
+    """
+    :return: (food, lumber, stone, gold)
+    """
+    import lokbot.enum
+
+    res = [0, 0, 0, 0]
+    for each in requirements:
+        if each.get('type') in lokbot.enum.RESOURCE_IDX_MAP:
+            res[lokbot.enum.RESOURCE_IDX_MAP[each.get('type')]] += _number(each.get('value'))
+
+    return tuple(res)
+
+
+def _items(requirements):
+    """
+    :return: ((type, value), ...) of what isn't a resource, e.g. golden_pillar
+    """
+    import lokbot.enum
+
+    return tuple(
+        (each.get('type'), _number(each.get('value')))
+        for each in requirements if each.get('type') not in lokbot.enum.RESOURCE_IDX_MAP
+    )
+
+
+def _requirements(requirements):
+    """
+    :return: ((type, level), ...)
+    """
+    return tuple((each.get('type'), _number(each.get('level'))) for each in requirements)
+
+
+def _compile_building(raw):
+    """
+    :return: BuildingLevel of level n at index n - 1
+    """
+    levels = sorted(raw.items(), key=lambda item: int(item[0]))
+    assert [int(level) for level, _ in levels] == list(range(1, len(levels) + 1)), 'building levels are not contiguous'
+
+    return tuple(
+        BuildingLevel(
+            int(level), bool(each.get('valid', True)), _resources(each.get('resources')),
+            _items(each.get('resources')), _requirements(each.get('requirements')),
+            _number(each.get('time')), _number(each.get('power')),
+        ) for level, each in levels
+    )
+
+
+def _compile_research(raw):
+    """
+    :return: ResearchLevel of level n at index n - 1
+    """
+    return tuple(
+        ResearchLevel(
+            _number(each.get('level')), _resources(each.get('resources')), _items(each.get('resources')),
+            _requirements(each.get('requirements')),
+            _number(each.get('time')), _number(each.get('power')),
+            _number(each.get('stats', {}).get('ability_value', 0)),
+        ) for each in raw
+    )
+
+
+def compile_assets():
+    """
+    Normalize `lokbot/assets` into ints and tuples
+    :return: {'building': {code: levels}, 'research': {code: levels}}
+    """
+    import lokbot.enum
+
+    tables = {'building': {}, 'research': {}}
+
+    for table, category, path in _sources():
+        with open(path) as f:
+            raw = json.load(f)
+
+        if table == 'building':
+            tables['building'][lokbot.enum.BUILDING_CODE_MAP[category]] = _compile_building(raw)
+            continue
+
+        for research_name, research_code in lokbot.enum.RESEARCH_CODE_MAP[category].items():
+            tables['research'][research_code] = _compile_research(raw[research_name])
+
+    return tables
+
+
+def _write(fingerprint, tables):
+    target = compiled_path()
+    tmp = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+
+    try:
+        tmp.write_bytes(pickle.dumps((fingerprint, tables), protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp, target)
+    except OSError as e:
+        logger.warning(f'failed to write compiled assets: {e}')
+        tmp.unlink(missing_ok=True)
+
+
+def _read(fingerprint):
+    try:
+        compiled_fingerprint, tables = pickle.loads(compiled_path().read_bytes())
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+        return None
+
+    return tables if compiled_fingerprint == fingerprint else None
+
+
+def load():
+    """
+    The compiled tables, compiled again if any asset changed since
+    """
+    global _tables
+
+    if _tables is not None:
+        return _tables
+
+    with _lock:
+        if _tables is None:
+            fingerprint = _fingerprint()
+            tables = _read(fingerprint)
+            if tables is None:
+                logger.info('compiling assets')
+                tables = compile_assets()
+                _write(fingerprint, tables)
+
+            _tables = tables
+
+    return _tables
+
+
+class LazyTable(collections.abc.Mapping):
+    """
+    Read-only mapping of one compiled table, nothing is loaded before the first access
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _table(self):
+        return load()[self.name]
+
+    def __getitem__(self, key):
+        return self._table()[key]
+
+    def __iter__(self):
+        return iter(self._table())
+
+    def __len__(self):
+        return len(self._table())
+
+    def __repr__(self):
+        return f'<LazyTable {self.name}>'
+
+
+def benchmark(number=5):
+    """
+    Cold start and memory of loading the asset tables as `lokbot.enum` used to, from json,
+    against the compiled ones, each in a fresh interpreter with `lokbot` already imported
+    :return:
+    """
+    import subprocess
+    import sys
+
+    cases = {
+        # name: (setup, measured)
+        'import lokbot.enum': ('', 'import lokbot.enum'),
+        'json, as before': (
+            'import json, lokbot.enum',
+            'tables = [json.load(open(path)) for _, _, path in lokbot.asset_compiler._sources()]',
+        ),
+        'compiled': ('import lokbot.enum', 'tables = lokbot.asset_compiler.load()'),
+    }
+    measure = (
+        'import resource, time, tracemalloc, lokbot\n'
+        '{setup}\n'
+        'tracemalloc.start()\n'
+        'started_at = time.perf_counter()\n'
+        '{measured}\n'
+        'elapsed = time.perf_counter() - started_at\n'
+        'print(elapsed, tracemalloc.get_traced_memory()[0], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n'
+    )
+
+    load()  # have the compiled file in place
+
+    for name, (setup, measured) in cases.items():
+        results = []
+        for _ in range(number):
+            output = subprocess.run(
+                [sys.executable, '-c', measure.format(setup=setup, measured=measured)], cwd=project_root,
+                check=True, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=str(project_root)),
+            ).stdout.split()
+            results.append([float(each) for each in output[-3:]])
+
+        elapsed, traced, max_rss = [min(each) for each in zip(*results)]
+        print(f'{name:>18}: {elapsed * 1000:7.1f} ms, {traced / 1024:6.0f} KiB held, max rss {max_rss / 1024:5.1f} MiB')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,27 +1,129 @@
+import asyncio
+import base64
+import gzip
 import json
+import time
+import typing
 
 import httpx
+import tenacity
 
+import lokbot.cache
+import lokbot.codec
 import lokbot.enum
-from lokbot import logger
+import lokbot.rate_limiter
+import lokbot.recorder
+import lokbot.single_flight
+import lokbot.util
+from lokbot.exceptions import *
+from lokbot import logger, project_root, config
 
+_opener = None
 
-class AsyncLokBotApi:
-    def __init__(self, access_token):
-        self.opener = httpx.AsyncClient(
+
+def get_opener():
+    """
+    The HTTP/2 connection pool shared by every `AsyncLokBotApi` in the process,
+    account related headers are sent per request
+    :return:
+    """
+    global _opener
+
+    if _opener is None:
+        _opener = httpx.AsyncClient(
             headers={
-                'User-Agent': 'BestHTTP',
-                'x-access-token': access_token
+                'Accept': '*/*',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Origin': 'https://play.leagueofkingdoms.com',
+                'Referer': 'https://play.leagueofkingdoms.com/',
+                'Sec-Fetch-Dest': 'empty',
+                'Sec-Fetch-Mode': 'cors',
+                'Sec-Fetch-Site': 'same-site',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/114.0',
             },
             http2=True,
-            base_url=lokbot.enum.API_BASE_URL
+            # `api.base_url` points the bot to a local replay/fake server
+            base_url=config.get('api', {}).get('base_url', lokbot.enum.API_BASE_URL),
         )
 
+    return _opener
+
+
+class AsyncLokBotApi:
+    def __init__(self, token, captcha_solver_config=None, request_callback=None):
+        self.opener = get_opener()
+        self.headers = {'X-Access-Token': token}
+        self.token = token
+        self.request_callback = request_callback
+        self._id = lokbot.util.decode_jwt(token).get('_id')
+
+        self.live_api_base_url = config.get('api', {}).get('base_url', lokbot.enum.LIVE_API_BASE_URL)
+        self.recorder = lokbot.recorder.get_recorder()
+
+        self.xor_password = None
+        self.protected_api_list = []
+
+        self.last_requested_at = time.time()
+
+        self.rate_limiter = lokbot.rate_limiter.RateLimiterRegistry()
+        self.response_cache = lokbot.cache.ResponseCache()
+        self.single_flight = lokbot.single_flight.SingleFlight()
+
+        self.captcha_solver = None
+        if captcha_solver_config and 'ttshitu' in captcha_solver_config:
+            from lokbot.captcha_solver import Ttshitu
+            self.captcha_solver = Ttshitu(**captcha_solver_config['ttshitu'])
+
+    def xor(self, plain: bytes) -> bytes:
+        assert self.xor_password is not None
+
+        return lokbot.codec.xor(plain, self.xor_password)
+
+    def b64xor_enc(self, d: dict) -> str:
+        assert self.xor_password is not None
+
+        return lokbot.codec.b64xor_enc(d, self.xor_password)
+
+    def b64xor_dec(self, s: typing.Union[str, bytes]) -> dict:
+        assert self.xor_password is not None
+
+        return lokbot.codec.b64xor_dec(s, self.xor_password)
+
+    async def _send(self, method, url, **kwargs):
+        request = self.opener.build_request(method, url, headers=self.headers, **kwargs)
+        # the pool is shared between accounts, never send cookies of any of them
+        request.headers.pop('Cookie', None)
+
+        return await self.opener.send(request)
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(2),
+        wait=tenacity.wait_random_exponential(multiplier=1, max=60),
+        # general http error or json decode error
+        retry=tenacity.retry_if_exception_type((httpx.HTTPError, json.JSONDecodeError)),
+        reraise=True
+    )
+    @tenacity.retry(
+        wait=tenacity.wait_fixed(2),
+        retry=tenacity.retry_if_exception_type(DuplicatedException),  # server-side rate limiter(wait 2s)
+    )
+    @tenacity.retry(
+        wait=tenacity.wait_fixed(3600),
+        retry=tenacity.retry_if_exception_type(ExceedLimitPacketException),  # server-side rate limiter(wait 1h)
+    )
+    @lokbot.rate_limiter.limits(calls=1, period=0.1)
     async def post(self, url, json_data=None):
         if json_data is None:
             json_data = {}
 
-        response = await self.opener.post(url, data={'json': json.dumps(json_data)})
+        post_data = json.dumps(json_data, separators=(',', ':'))
+        api_path = str(url).split('/api/').pop()
+        if api_path in self.protected_api_list:
+            post_data = self.b64xor_enc(json_data)
+
+        response = await self._send('POST', url, data={'json': post_data})
+        self.last_requested_at = time.time()
 
         log_data = {
             'url': url,
@@ -30,20 +132,528 @@ class AsyncLokBotApi:
         }
 
         try:
-            json_response = response.json()
+            if api_path in self.protected_api_list and response.text[0] != '{':
+                json_response = self.b64xor_dec(response.text)
+            else:
+                json_response = response.json()
         except json.JSONDecodeError:
             log_data.update({'res': response.text})
             logger.error(log_data)
 
-            return None
+            raise
+
+        if json_response.get('isPacked') is True:
+            json_response = json.loads(gzip.decompress(bytearray(json_response.get('payload'))))
+
+        if self.recorder:
+            self.recorder.record_http(api_path, json_data, json_response, log_data.get('elapsed'))
 
         log_data.update({'res': json_response})
+
         logger.debug(json.dumps(log_data))
 
-        return json_response
+        if json_response.get('result'):
+            if callable(self.request_callback):
+                self.request_callback(json_response)
+
+            return json_response
+
+        err = json_response.get('err')
+        code = err.get('code')
+
+        if code == 'no_auth':
+            project_root.joinpath(f'data/{self._id}.token').unlink(missing_ok=True)
+            raise NoAuthException()
+
+        if code == 'need_captcha':
+            if not self.captcha_solver:
+                raise NeedCaptchaException()
+
+            await self._solve_captcha()
+
+            raise DuplicatedException()
+
+        if code == 'duplicated':
+            raise DuplicatedException()
+
+        if code == 'exceed_limit_packet':
+            raise ExceedLimitPacketException()
+
+        if code == 'not_online':
+            raise NotOnlineException()
+
+        raise OtherException(code)
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(4),
+        wait=tenacity.wait_random_exponential(multiplier=1, max=60)
+    )
+    async def _solve_captcha(self):
+        # the solver is blocking, run it in a worker thread and bridge its callbacks back to the loop
+        loop = asyncio.get_running_loop()
+
+        def get_picture_base64_func():
+            response = asyncio.run_coroutine_threadsafe(self.auth_captcha(), loop).result()
+
+            return base64.b64encode(response.content).decode()
+
+        def captcha_confirm_func(_captcha):
+            res = asyncio.run_coroutine_threadsafe(self.auth_captcha_confirm(_captcha), loop).result()
+
+            return res.get('valid')
+
+        if not await asyncio.to_thread(self.captcha_solver.solve, get_picture_base64_func, captcha_confirm_func):
+            raise tenacity.TryAgain()
+
+    async def auth_captcha(self):
+        return await self._send('GET', 'auth/captcha')
+
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def auth_captcha_confirm(self, value):
+        return await self.post('auth/captcha/confirm', {'value': value})
+
+    async def auth_connect(self, json_data=None):
+        try:
+            res = await self.post(self.live_api_base_url + 'auth/connect', json_data)
+        except OtherException:
+            # {"result":false,"err":{}} when no auth
+            project_root.joinpath(f'data/{self._id}.token').unlink(missing_ok=True)
+            raise NoAuthException()
+
+        self.headers['X-Access-Token'] = res['token']
+
+        return res
+
+    async def auth_set_device_info(self, device_info):
+        return await self.post('auth/setDeviceInfo', {'deviceInfo': device_info})
+
+    async def alliance_research_list(self):
+        return await self.post('alliance/research/list')
+
+    async def alliance_research_donate_all(self, code):
+        return await self.post('alliance/research/donateAll', {'code': code})
+
+    async def alliance_shop_list(self):
+        return await self.post('alliance/shop/list')
+
+    @lokbot.cache.invalidates('item_list')
+    async def alliance_shop_buy(self, code, amount):
+        return await self.post('alliance/shop/buy', {'code': code, 'amount': amount})
+
+    @lokbot.cache.invalidates('item_list')
+    async def alliance_gift_claim_all(self):
+        return await self.post('alliance/gift/claim/all')
+
+    async def chat_logs(self, chat_channel):
+        return await self.post('chat/logs', {'chatChannel': chat_channel})
+
+    async def quest_main(self):
+        return await self.post('quest/main')
+
+    async def quest_list(self):
+        """
+        获取任务列表
+        :return:
+        """
+        return await self.post('quest/list')
+
+    async def quest_list_daily(self):
+        """
+        获取日常任务列表
+        :return:
+        """
+        return await self.post('quest/list/daily')
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
+    async def quest_claim(self, quest):
+        """
+        领取任务奖励
+        :param quest:
+        :return:
+        """
+        return await self.post('quest/claim', {'questId': quest.get('_id'), 'code': quest.get('code')})
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
+    async def quest_claim_daily(self, quest):
+        """
+        领取日常任务奖励
+        :param quest:
+        :return:
+        """
+        return await self.post('quest/claim/daily', {'questId': quest.get('_id'), 'code': quest.get('code')})
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
+    async def quest_claim_daily_level(self, reward):
+        """
+        领取日常任务上方进度条奖励
+        :param reward:
+        :return:
+        """
+        return await self.post('quest/claim/daily/level', {'level': reward.get('level')})
+
+    async def use_skill(self, id_skill):
+        """
+        use skill
+        :return:
+        """
+        return await self.post('skill/use', {'code': id_skill})
+
+    async def pkg_recommend(self):
+        return await self.post('pkg/recommend')
+
+    async def pkg_list(self):
+        return await self.post('pkg/list')
+
+    @lokbot.cache.invalidates('item_list')
+    async def event_roulette_open(self):
+        return await self.post('event/roulette/open')
+
+    async def event_cvc_open(self):
+        return await self.post('event/cvc/open')
+
+    @lokbot.single_flight.coalesce()
+    async def drago_lair_list(self):
+        return await self.post('drago/lair/list')
+
+    async def event_list(self):
+        """
+        获取活动列表
+        :return:
+        """
+        return await self.post('event/list')
+
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def event_info(self, root_event_id):
+        """
+        获取活动信息
+        :return:
+        """
+        return await self.post('event/info', {'rootEventId': root_event_id})
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
+    async def event_claim(self, event_id, event_target_id, code):
+        """
+        领取活动奖励
+        :return:
+        """
+        return await self.post('event/claim', {'eventId': event_id, 'eventTargetId': event_target_id, 'code': code})
+
+    @lokbot.cache.invalidates('kingdom_task_all')
+    async def train_troop(self, troop_code, amount):
+        return await self.post('kingdom/barrack/train', {'troopCode': troop_code, 'amount': amount, 'instant': 0})
+
+    async def kingdom_wall_info(self):
+        return await self.post('kingdom/wall/info')
+
+    async def kingdom_wall_repair(self):
+        return await self.post('kingdom/wall/repair')
+
+    async def kingdom_treasure_list(self):
+        return await self.post('kingdom/treasure/list')
+
+    async def kingdom_enter(self):
+        """
+        获取基础信息
+        :return:
+        """
+        res = await self.post(self.live_api_base_url + 'kingdom/enter')
+
+        captcha = res.get('captcha')
+        if captcha and captcha.get('next'):
+            if not self.captcha_solver:
+                raise NeedCaptchaException()
+
+            await self._solve_captcha()
+
+        return res
+
+    @lokbot.cache.cached(ttl=30)
+    @lokbot.single_flight.coalesce()
+    async def kingdom_task_all(self):
+        """
+        获取当前任务执行状态(左侧建筑x2/招募/研究)
+        :return:
+        """
+        return await self.post('kingdom/task/all')
+
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
+    async def kingdom_task_claim(self, position):
+        """
+        领取任务奖励
+        :return:
+        """
+        return await self.post('kingdom/task/claim', {'position': position})
+
+    @lokbot.cache.invalidates('item_list', 'kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def kingdom_task_speedup(self, task_id, code, amount, is_buy=0):
+        """
+        加速任务
+        :return:
+        """
+        res = await self.post(
+            'kingdom/task/speedup', {'taskId': task_id, 'code': code, 'amount': amount, 'isBuy': is_buy}
+        )
+
+        await self.auth_analytics('item/use', f'{code}|{amount}')
+
+        return res
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def kingdom_heal_speedup(self, code, amount, is_buy=0):
+        """
+        加速治疗
+        :return:
+        """
+        res = await self.post('kingdom/heal/speedup', {'code': code, 'amount': amount, 'isBuy': is_buy})
+
+        await self.auth_analytics('item/use', f'{code}|{amount}')
+
+        return res
+
+    async def kingdom_tutorial_finish(self, code):
+        """
+        完成教程
+        :return:
+        """
+        return await self.post('kingdom/tutorial/finish', {'code': code})
+
+    @lokbot.single_flight.coalesce()
+    async def kingdom_academy_research_list(self):
+        """
+        获取研究列表
+        :return:
+        """
+        return await self.post('kingdom/arcademy/research/list')
+
+    async def kingdom_hospital_recover(self):
+        """
+        医院恢复
+        :return:
+        """
+        return await self.post('kingdom/hospital/recover')
+
+    async def kingdom_hospital_wounded(self):
+        return await self.post('kingdom/hospital/wounded')
+
+    @lokbot.rate_limiter.limits(calls=1, period=4)
+    async def kingdom_resource_harvest(self, position):
+        """
+        收获资源
+        :param position:
+        :return:
+        """
+        return await self.post('kingdom/resource/harvest', {'position': position})
+
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
+    async def kingdom_building_upgrade(self, building, instant=0):
+        """
+        建筑升级
+        :param building:
+        :param instant:
+        :return:
+        """
+        return await self.post('kingdom/building/upgrade', {
+            'position': building.get('position'),
+            'level': building.get('level'),
+            'instant': instant
+        })
+
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
+    async def kingdom_building_build(self, building, instant=0):
+        """
+        建筑建造
+        :param building:
+        :param instant:
+        :return:
+        """
+        return await self.post('kingdom/building/build', {
+            'position': building.get('position'),
+            'buildingCode': building.get('code'),
+            'instant': instant
+        })
+
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
+    async def kingdom_academy_research(self, research, instant=0):
+        """
+        学院研究升级
+        :param research:
+        :param instant:
+        :return:
+        """
+        return await self.post('kingdom/arcademy/research', {
+            'researchCode': research.get('code'),
+            'instant': instant
+        })
+
+    async def kingdom_vip_info(self):
+        """
+        获取VIP信息
+        :return:
+        """
+        return await self.post('kingdom/vip/info')
+
+    @lokbot.cache.invalidates('item_list')
+    async def kingdom_vip_claim(self):
+        """
+        领取VIP奖励
+        daily
+        :return:
+        """
+        return await self.post('kingdom/vip/claim')
+
+    async def kingdom_world_change(self, world_id):
+        """
+        切换世界
+        :param world_id:
+        :return:
+        """
+        return await self.post('kingdom/world/change', {'worldId': world_id})
 
     async def kingdom_caravan_list(self):
         return await self.post('kingdom/caravan/list')
 
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     async def kingdom_caravan_buy(self, caravan_item_id):
         return await self.post('kingdom/caravan/buy', {'caravanItemId': caravan_item_id})
+
+    @lokbot.single_flight.coalesce()
+    async def kingdom_profile_troops(self):
+        return await self.post('kingdom/profile/troops')
+
+    @lokbot.cache.invalidates('item_list')
+    async def kingdom_vipshop_buy(self, code, amount):
+        return await self.post('kingdom/vipshop/buy', {'code': code, 'amount': amount})
+
+    async def alliance_help_all(self):
+        """
+        帮助全部
+        :return:
+        """
+        return await self.post('alliance/help/all')
+
+    async def alliance_recommend(self):
+        """
+        获取推荐的联盟, 配合加入联盟一起使用
+        :return:
+        """
+        return await self.post('alliance/recommend')
+
+    async def alliance_join(self, alliance_id):
+        """
+        加入联盟
+        :return:
+        """
+        return await self.post('alliance/join', {'allianceId': alliance_id})
+
+    @lokbot.single_flight.coalesce()
+    async def alliance_battle_list_v2(self):
+        """
+        获取战争列表
+        :return:
+        """
+        return await self.post('alliance/battle/list/v2')
+
+    @lokbot.cache.cached(ttl=60)
+    @lokbot.single_flight.coalesce()
+    async def item_list(self):
+        """
+        获取道具列表
+        :return:
+        """
+        return await self.post('item/list')
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def item_use(self, code, amount=1):
+        """
+        使用道具
+        :param code:
+        :param amount:
+        :return:
+        """
+        res = await self.post('item/use', {'code': code, 'amount': amount})
+
+        await self.auth_analytics('item/use', f'{code}|{amount}')
+
+        return res
+
+    async def auth_analytics(self, url, param):
+        """
+        Unknown API added in 1.1660.143.221
+        :param url:
+        :param param:
+        :return:
+        """
+        return await self.post('auth/analytics', {'url': url, 'param': param})
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
+    async def item_free_chest(self, _type=0):
+        """
+        领取免费宝箱
+        :type _type: int 0: silver 1: gold
+        :return:
+        """
+        return await self.post('item/freechest', {'type': _type})
+
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def event_roulette_spin(self):
+        """
+        转轮抽奖
+        daily
+        :return:
+        """
+        return await self.post('event/roulette/spin')
+
+    async def mail_list_check(self):
+        return await self.post('mail/list/check')
+
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
+    async def mail_claim_all(self, category=1):
+        return await self.post('mail/claim/all', {'category': category})
+
+    @lokbot.single_flight.coalesce()
+    async def field_worldmap_devrank(self):
+        """
+        Returns the land rank (length: 65535)
+        level: 0~9 for lvl 1-10
+        {"result": true, "lands": "000000011122334455 ..."}
+        :return:
+        """
+        return await self.post('field/worldmap/devrank')
+
+    async def field_march_info(self, data):
+        return await self.post('field/march/info', data)
+
+    @lokbot.rate_limiter.limits(calls=1, period=4)
+    async def field_march_start(self, data):
+        return await self.post('field/march/start', data)
+    
+    @lokbot.rate_limiter.limits(calls=1, period=15)
+    async def field_rally_join(self, data):
+        return await self.post('field/rally/join', data)
+
+    async def chat_new(self, chat_channel, chat_type, text, param=None):
+        data = {
+            'chatChannel': chat_channel,
+            'chatType': chat_type,
+            'text': text,
+        }
+
+        if param:
+            data['param'] = param
+
+        return await self.post('chat/new', data)
+
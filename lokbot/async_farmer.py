@@ -1,4 +1,6 @@
 import asyncio
+import base64
+import json
 
 import lokbot.async_client
 
@@ -6,9 +8,22 @@ import lokbot.enum
 
 
 class AsyncLokFarmer:
-    def __init__(self, token, concurrency=50):
-        self.api = lokbot.async_client.AsyncLokBotApi(token)
+    def __init__(self, token, captcha_solver_config=None, concurrency=50):
+        self.api = lokbot.async_client.AsyncLokBotApi(token, captcha_solver_config)
         self.concurrency = concurrency
+        self.kingdom_enter = None
+
+    async def enter(self):
+        """
+        async counterpart of the `auth/connect` + `kingdom/enter` handshake in `LokFarmer.__init__`
+        :return:
+        """
+        auth_res = await self.api.auth_connect({"deviceInfo": {"build": "global"}})
+        self.api.protected_api_list = json.loads(base64.b64decode(auth_res.get('lstProtect')).decode())
+        self.api.protected_api_list = [str(api).split('/api/').pop() for api in self.api.protected_api_list]
+        self.api.xor_password = json.loads(base64.b64decode(auth_res.get('regionHash')).decode()).split('-')[1]
+
+        self.kingdom_enter = await self.api.kingdom_enter()
 
     async def parallel_buy_caravan(self):
         caravan_items = (await self.api.kingdom_caravan_list()).get('caravan').get('items')
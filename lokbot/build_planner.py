@@ -0,0 +1,176 @@
+import collections
+import heapq
+import threading
+
+from lokbot.enum import BUILDING_CODE_MAP, BUILD_POSITION_UNLOCK_MAP, building_json
+
+
+def _requirement_graph():
+    """
+    One node per (code, level), meaning the highest building of `code` reached `level`
+    :return: {node: (node it requires, ...)}
+    """
+    castle = BUILDING_CODE_MAP['castle']
+    unlocked_at = {}  # code -> castle level the first position of it is unlocked at
+    for castle_level, positions in BUILD_POSITION_UNLOCK_MAP.items():
+        for position in positions:
+            unlocked_at[position.get('code')] = min(unlocked_at.get(position.get('code'), castle_level), castle_level)
+
+    graph = {}
+    for code, levels in building_json.items():
+        for each in levels:
+            requires = [(BUILDING_CODE_MAP[req_type], req_level) for req_type, req_level in each.requirements]
+            if each.level > 1:
+                requires.append((code, each.level - 1))
+            elif unlocked_at.get(code):
+                requires.append((castle, unlocked_at[code]))
+
+            graph[(code, each.level)] = tuple(requires)
+
+    return graph
+
+
+class BuildPlanner:
+    """
+    Upgrade order towards a target building level over the requirement DAG of `building_json`.
+    The DAG and the priorities are computed once, `update` then only touches the nodes between
+    the old and the new levels.
+    A node's priority is the longest build time from it to the target (critical path),
+    the hammers should always take the ready node with the highest one
+    """
+
+    def __init__(self, target_code, target_level):
+        self.target = (target_code, target_level)
+        self.graph = _requirement_graph()
+        self.lock = threading.Lock()
+
+        # only what the target needs
+        self.nodes = set()
+        stack = [self.target]
+        while stack:
+            node = stack.pop()
+            if node in self.nodes:
+                continue
+
+            self.nodes.add(node)
+            stack.extend(self.graph[node])
+
+        self.dependents = collections.defaultdict(list)
+        for node in self.nodes:
+            for required in self.graph[node]:
+                self.dependents[required].append(node)
+
+        self.priority = self._critical_paths()
+
+        self.levels = {}  # code -> highest level built
+        self.missing = {node: len(self.graph[node]) for node in self.nodes}  # requirements not met yet
+        self.done = set()
+        self.ready_nodes = {node for node, count in self.missing.items() if count == 0}
+        self.version = None
+
+    @staticmethod
+    def _time(node):
+        code, level = node
+        return building_json[code][level - 1].time
+
+    def _critical_paths(self):
+        """
+        :return: {node: longest build time from starting it to the target being done}
+        """
+        order = []
+        pending = {node: len(self.dependents[node]) for node in self.nodes}
+        queue = [node for node, count in pending.items() if count == 0]  # the target
+        while queue:
+            node = queue.pop()
+            order.append(node)
+            for required in self.graph[node]:
+                pending[required] -= 1
+                if pending[required] == 0:
+                    queue.append(required)
+
+        priority = {}
+        for node in order:
+            priority[node] = self._time(node) + max([priority[each] for each in self.dependents[node]], default=0)
+
+        return priority
+
+    def _complete(self, node):
+        self.done.add(node)
+        self.ready_nodes.discard(node)
+
+        for dependent in self.dependents[node]:
+            self.missing[dependent] -= 1
+            if self.missing[dependent] == 0 and dependent not in self.done:
+                self.ready_nodes.add(dependent)
+
+    def update(self, snapshot):
+        """
+        Catch up with the buildings of a `KingdomSnapshot`
+        """
+        with self.lock:
+            if snapshot.version == self.version:
+                return
+
+            self.version = snapshot.version
+            for code in building_json:
+                level = snapshot.building_level(code)
+                for each_level in range(self.levels.get(code, 0) + 1, level + 1):
+                    if (code, each_level) in self.nodes:
+                        self._complete((code, each_level))
+
+                self.levels[code] = max(self.levels.get(code, 0), level)
+
+    @property
+    def reached(self):
+        return self.target in self.done
+
+    def ready(self):
+        """
+        :return: [(code, level)] whose requirements are all met, most critical first
+        """
+        with self.lock:
+            return sorted(self.ready_nodes, key=lambda node: (-self.priority[node], node))
+
+    def schedule(self, queues=2):
+        """
+        List-schedule the rest of the plan on `queues` hammers, most critical ready node first
+        :return: [(start offset in seconds, (code, level))], the offset the target is done at
+        """
+        with self.lock:
+            missing, done = dict(self.missing), set(self.done)
+            ready = [(-self.priority[node], node) for node in self.ready_nodes]
+
+        heapq.heapify(ready)
+        running = []  # (ends at, node)
+        free, now, order = queues, 0, []
+
+        while ready or running:
+            while ready and free:
+                _, node = heapq.heappop(ready)
+                order.append((now, node))
+                heapq.heappush(running, (now + self._time(node), node))
+                free -= 1
+
+            now, node = heapq.heappop(running)
+            free += 1
+            for dependent in self.dependents[node]:
+                missing[dependent] -= 1
+                if missing[dependent] == 0 and dependent not in done:
+                    heapq.heappush(ready, (-self.priority[dependent], dependent))
+
+        return order, now
+
+    def stats(self):
+        _, eta = self.schedule()
+
+        with self.lock:
+            ready = sorted(self.ready_nodes, key=lambda node: -self.priority[node])
+
+            return {
+                'target': self.target,
+                'reached': self.target in self.done,
+                'remaining': len(self.nodes) - len(self.done),
+                'ready': ready[:4],
+                'critical_path': max([self.priority[node] for node in ready], default=0),
+                'eta': eta,
+            }
@@ -0,0 +1,203 @@
+import collections
+import copy
+import functools
+import inspect
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    TTL cache of read-only api responses of one api instance, keyed by endpoint name and arguments
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.generations = collections.Counter()  # name -> times invalidated
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] < time.monotonic():
+                self.misses[key[0]] += 1
+                return None
+
+            self.hits[key[0]] += 1
+
+        # callers are free to mutate what they get back
+        return copy.deepcopy(entry[1])
+
+    def generation(self, name):
+        with self.lock:
+            return self.generations[name]
+
+    def set(self, key, value, ttl, generation=None):
+        """
+        :param generation: of `key[0]` when the request was sent, nothing is stored if invalidated since
+        """
+        with self.lock:
+            if generation is not None and generation != self.generations[key[0]]:
+                return
+
+            self.entries[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+
+    def invalidate(self, *names):
+        with self.lock:
+            self.generations.update(names)
+            for key in [key for key in self.entries if key[0] in names]:
+                del self.entries[key]
+
+    def stats(self):
+        return {
+            name: {'hits': self.hits[name], 'misses': self.misses[name]}
+            for name in set(self.hits) | set(self.misses)
+        }
+
+
+def _cache_key(func, args, kwargs):
+    return (func.__name__,) + args + tuple(sorted(kwargs.items()))
+
+
+def cached(ttl):
+    """
+    Read-through cache for idempotent api methods, entries live in `self.response_cache`
+    :param ttl: in seconds
+    :return:
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                key = _cache_key(func, args, kwargs)
+                res = self.response_cache.get(key)
+                if res is None:
+                    generation = self.response_cache.generation(func.__name__)
+                    res = await func(self, *args, **kwargs)
+                    self.response_cache.set(key, res, ttl, generation)
+
+                return res
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = _cache_key(func, args, kwargs)
+            res = self.response_cache.get(key)
+            if res is None:
+                # a mutation finishing while this is in flight makes the response stale
+                generation = self.response_cache.generation(func.__name__)
+                res = func(self, *args, **kwargs)
+                self.response_cache.set(key, res, ttl, generation)
+
+            return res
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*names):
+    """
+    Drop the cached responses of `names` once the decorated (mutating) api method returns or fails,
+    the server state may have changed either way
+    :param names: names of `cached` api methods
+    :return:
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                try:
+                    return await func(self, *args, **kwargs)
+                finally:
+                    self.response_cache.invalidate(*names)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                self.response_cache.invalidate(*names)
+
+        return wrapper
+
+    return decorator
+
+
+# how long a field object stays skipped, by why it was
+NEGATIVE_TTL = {
+    'expired': 3600,
+    'dead': 3600,
+    'empty': 1800,
+    'march_start': 600,
+    'occupied': 300,
+}
+
+
+class NegativeCache:
+    """
+    Field objects not worth a `field_march_info`: expired, dead, emptied, occupied or refused by `field_march_start`,
+    keyed by object `_id` and `loc`
+    """
+
+    def __init__(self, ttl=None, max_size=10000):
+        self.ttl = dict(NEGATIVE_TTL, **(ttl or {}))
+        self.max_size = max_size
+        self.entries = {}  # (_id, loc) -> (expires_at, reason)
+        self.hits = 0
+        self.misses = 0
+        self.reasons = collections.Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(obj):
+        return obj.get('_id'), tuple(obj.get('loc') or ())
+
+    def add(self, obj, reason):
+        now = time.monotonic()
+
+        with self.lock:
+            if len(self.entries) >= self.max_size:
+                self.entries = {key: entry for key, entry in self.entries.items() if entry[0] > now}
+
+            self.entries[self._key(obj)] = (now + self.ttl.get(reason, 600), reason)
+
+    def get(self, obj):
+        """
+        :return: why `obj` is skipped, None if it's worth a try
+        """
+        key = self._key(obj)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.reasons[entry[1]] += 1
+
+            return entry[1]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'reasons': dict(self.reasons),
+        }
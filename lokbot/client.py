@@ -1,17 +1,40 @@
 import base64
 import gzip
 import json
+import threading
 import time
 import typing
 
 import httpx
-import ratelimit
 import tenacity
 
+import lokbot.cache
+import lokbot.codec
 import lokbot.enum
+import lokbot.rate_limiter
+import lokbot.recorder
+import lokbot.single_flight
 import lokbot.util
 from lokbot.exceptions import *
-from lokbot import logger, project_root
+from lokbot import logger, project_root, config
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    The http/2 connection pool shared by every `LokBotApi` of the process
+    :return:
+    """
+    global _transport
+
+    with _transport_lock:
+        if _transport is None:
+            _transport = httpx.HTTPTransport(http2=True)
+
+    return _transport
 
 
 class LokBotApi:
@@ -29,18 +52,26 @@ class LokBotApi:
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/114.0',
                 'X-Access-Token': token
             },
-            http2=True,
-            base_url=lokbot.enum.API_BASE_URL,
+            transport=get_transport(),
+            # `api.base_url` points the bot to a local replay/fake server
+            base_url=config.get('api', {}).get('base_url', lokbot.enum.API_BASE_URL),
         )
         self.token = token
         self.request_callback = request_callback
         self._id = lokbot.util.decode_jwt(token).get('_id')
 
+        self.live_api_base_url = config.get('api', {}).get('base_url', lokbot.enum.LIVE_API_BASE_URL)
+        self.recorder = lokbot.recorder.get_recorder()
+
         self.xor_password = None
         self.protected_api_list = []
 
         self.last_requested_at = time.time()
 
+        self.rate_limiter = lokbot.rate_limiter.RateLimiterRegistry()
+        self.response_cache = lokbot.cache.ResponseCache()
+        self.single_flight = lokbot.single_flight.SingleFlight()
+
         self.captcha_solver = None
         if 'ttshitu' in captcha_solver_config:
             from lokbot.captcha_solver import Ttshitu
@@ -49,16 +80,17 @@ class LokBotApi:
     def xor(self, plain: bytes) -> bytes:
         assert self.xor_password is not None
 
-        return bytearray([
-            each_plain ^ ord(self.xor_password[index % len(self.xor_password)])
-            for index, each_plain in enumerate(plain)
-        ])
+        return lokbot.codec.xor(plain, self.xor_password)
 
     def b64xor_enc(self, d: dict) -> str:
-        return base64.b64encode(self.xor(json.dumps(d, separators=(',', ':')).encode())).decode()
+        assert self.xor_password is not None
+
+        return lokbot.codec.b64xor_enc(d, self.xor_password)
 
     def b64xor_dec(self, s: typing.Union[str, bytes]) -> dict:
-        return json.loads(self.xor(base64.b64decode(s)))
+        assert self.xor_password is not None
+
+        return lokbot.codec.b64xor_dec(s, self.xor_password)
 
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(2),
@@ -75,11 +107,7 @@ class LokBotApi:
         wait=tenacity.wait_fixed(3600),
         retry=tenacity.retry_if_exception_type(ExceedLimitPacketException),  # server-side rate limiter(wait 1h)
     )
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=0.1)
+    @lokbot.rate_limiter.limits(calls=1, period=0.1)
     def post(self, url, json_data=None):
         if json_data is None:
             json_data = {}
@@ -115,6 +143,9 @@ class LokBotApi:
         if json_response.get('isPacked') is True:
             json_response = json.loads(gzip.decompress(bytearray(json_response.get('payload'))))
 
+        if self.recorder:
+            self.recorder.record_http(api_path, json_data, json_response, log_data.get('elapsed'))
+
         log_data.update({'res': json_response})
 
         logger.debug(json.dumps(log_data))
@@ -170,17 +201,13 @@ class LokBotApi:
     def auth_captcha(self):
         return self.opener.get('auth/captcha')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def auth_captcha_confirm(self, value):
         return self.post('auth/captcha/confirm', {'value': value})
 
     def auth_connect(self, json_data=None):
         try:
-            res = self.post('https://lok-api-live.leagueofkingdoms.com/api/auth/connect', json_data)
+            res = self.post(self.live_api_base_url + 'auth/connect', json_data)
         except OtherException:
             # {"result":false,"err":{}} when no auth
             project_root.joinpath(f'data/{self._id}.token').unlink(missing_ok=True)
@@ -202,9 +229,11 @@ class LokBotApi:
     def alliance_shop_list(self):
         return self.post('alliance/shop/list')
 
+    @lokbot.cache.invalidates('item_list')
     def alliance_shop_buy(self, code, amount):
         return self.post('alliance/shop/buy', {'code': code, 'amount': amount})
 
+    @lokbot.cache.invalidates('item_list')
     def alliance_gift_claim_all(self):
         return self.post('alliance/gift/claim/all')
 
@@ -228,11 +257,8 @@ class LokBotApi:
         """
         return self.post('quest/list/daily')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=1)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
     def quest_claim(self, quest):
         """
         领取任务奖励
@@ -241,11 +267,8 @@ class LokBotApi:
         """
         return self.post('quest/claim', {'questId': quest.get('_id'), 'code': quest.get('code')})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=1)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
     def quest_claim_daily(self, quest):
         """
         领取日常任务奖励
@@ -254,11 +277,8 @@ class LokBotApi:
         """
         return self.post('quest/claim/daily', {'questId': quest.get('_id'), 'code': quest.get('code')})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=1)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
     def quest_claim_daily_level(self, reward):
         """
         领取日常任务上方进度条奖励
@@ -280,12 +300,14 @@ class LokBotApi:
     def pkg_list(self):
         return self.post('pkg/list')
 
+    @lokbot.cache.invalidates('item_list')
     def event_roulette_open(self):
         return self.post('event/roulette/open')
 
     def event_cvc_open(self):
         return self.post('event/cvc/open')
 
+    @lokbot.single_flight.coalesce()
     def drago_lair_list(self):
         return self.post('drago/lair/list')
 
@@ -296,11 +318,7 @@ class LokBotApi:
         """
         return self.post('event/list')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def event_info(self, root_event_id):
         """
         获取活动信息
@@ -308,11 +326,8 @@ class LokBotApi:
         """
         return self.post('event/info', {'rootEventId': root_event_id})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=1)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=1)
     def event_claim(self, event_id, event_target_id, code):
         """
         领取活动奖励
@@ -320,6 +335,7 @@ class LokBotApi:
         """
         return self.post('event/claim', {'eventId': event_id, 'eventTargetId': event_target_id, 'code': code})
 
+    @lokbot.cache.invalidates('kingdom_task_all')
     def train_troop(self, troop_code, amount):
         return self.post('kingdom/barrack/train', {'troopCode': troop_code, 'amount': amount, 'instant': 0})
 
@@ -337,7 +353,7 @@ class LokBotApi:
         获取基础信息
         :return:
         """
-        res = self.post('https://lok-api-live.leagueofkingdoms.com/api/kingdom/enter')
+        res = self.post(self.live_api_base_url + 'kingdom/enter')
 
         captcha = res.get('captcha')
         if captcha and captcha.get('next'):
@@ -348,6 +364,8 @@ class LokBotApi:
 
         return res
 
+    @lokbot.cache.cached(ttl=30)
+    @lokbot.single_flight.coalesce()
     def kingdom_task_all(self):
         """
         获取当前任务执行状态(左侧建筑x2/招募/研究)
@@ -355,11 +373,8 @@ class LokBotApi:
         """
         return self.post('kingdom/task/all')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=4)
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     def kingdom_task_claim(self, position):
         """
         领取任务奖励
@@ -367,11 +382,8 @@ class LokBotApi:
         """
         return self.post('kingdom/task/claim', {'position': position})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.cache.invalidates('item_list', 'kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def kingdom_task_speedup(self, task_id, code, amount, is_buy=0):
         """
         加速任务
@@ -383,11 +395,8 @@ class LokBotApi:
 
         return res
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def kingdom_heal_speedup(self, code, amount, is_buy=0):
         """
         加速治疗
@@ -406,6 +415,7 @@ class LokBotApi:
         """
         return self.post('kingdom/tutorial/finish', {'code': code})
 
+    @lokbot.single_flight.coalesce()
     def kingdom_academy_research_list(self):
         """
         获取研究列表
@@ -423,11 +433,7 @@ class LokBotApi:
     def kingdom_hospital_wounded(self):
         return self.post('kingdom/hospital/wounded')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=4)
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     def kingdom_resource_harvest(self, position):
         """
         收获资源
@@ -436,11 +442,8 @@ class LokBotApi:
         """
         return self.post('kingdom/resource/harvest', {'position': position})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),  # client-side rate limiter
-    )
-    @ratelimit.limits(calls=1, period=6)
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
     def kingdom_building_upgrade(self, building, instant=0):
         """
         建筑升级
@@ -454,11 +457,8 @@ class LokBotApi:
             'instant': instant
         })
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=6)
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
     def kingdom_building_build(self, building, instant=0):
         """
         建筑建造
@@ -472,11 +472,8 @@ class LokBotApi:
             'instant': instant
         })
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=6)
+    @lokbot.cache.invalidates('kingdom_task_all')
+    @lokbot.rate_limiter.limits(calls=1, period=6)
     def kingdom_academy_research(self, research, instant=0):
         """
         学院研究升级
@@ -496,6 +493,7 @@ class LokBotApi:
         """
         return self.post('kingdom/vip/info')
 
+    @lokbot.cache.invalidates('item_list')
     def kingdom_vip_claim(self):
         """
         领取VIP奖励
@@ -515,17 +513,16 @@ class LokBotApi:
     def kingdom_caravan_list(self):
         return self.post('kingdom/caravan/list')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=4)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     def kingdom_caravan_buy(self, caravan_item_id):
         return self.post('kingdom/caravan/buy', {'caravanItemId': caravan_item_id})
 
+    @lokbot.single_flight.coalesce()
     def kingdom_profile_troops(self):
         return self.post('kingdom/profile/troops')
 
+    @lokbot.cache.invalidates('item_list')
     def kingdom_vipshop_buy(self, code, amount):
         return self.post('kingdom/vipshop/buy', {'code': code, 'amount': amount})
 
@@ -550,6 +547,7 @@ class LokBotApi:
         """
         return self.post('alliance/join', {'allianceId': alliance_id})
 
+    @lokbot.single_flight.coalesce()
     def alliance_battle_list_v2(self):
         """
         获取战争列表
@@ -557,6 +555,8 @@ class LokBotApi:
         """
         return self.post('alliance/battle/list/v2')
 
+    @lokbot.cache.cached(ttl=60)
+    @lokbot.single_flight.coalesce()
     def item_list(self):
         """
         获取道具列表
@@ -564,11 +564,8 @@ class LokBotApi:
         """
         return self.post('item/list')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def item_use(self, code, amount=1):
         """
         使用道具
@@ -591,11 +588,8 @@ class LokBotApi:
         """
         return self.post('auth/analytics', {'url': url, 'param': param})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=4)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     def item_free_chest(self, _type=0):
         """
         领取免费宝箱
@@ -604,11 +598,7 @@ class LokBotApi:
         """
         return self.post('item/freechest', {'type': _type})
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def event_roulette_spin(self):
         """
         转轮抽奖
@@ -620,14 +610,12 @@ class LokBotApi:
     def mail_list_check(self):
         return self.post('mail/list/check')
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=2)
+    @lokbot.cache.invalidates('item_list')
+    @lokbot.rate_limiter.limits(calls=1, period=2)
     def mail_claim_all(self, category=1):
         return self.post('mail/claim/all', {'category': category})
 
+    @lokbot.single_flight.coalesce()
     def field_worldmap_devrank(self):
         """
         Returns the land rank (length: 65535)
@@ -640,19 +628,11 @@ class LokBotApi:
     def field_march_info(self, data):
         return self.post('field/march/info', data)
 
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=4)
+    @lokbot.rate_limiter.limits(calls=1, period=4)
     def field_march_start(self, data):
         return self.post('field/march/start', data)
     
-    @tenacity.retry(
-        wait=tenacity.wait_fixed(1),
-        retry=tenacity.retry_if_exception_type(ratelimit.RateLimitException),
-    )
-    @ratelimit.limits(calls=1, period=15)
+    @lokbot.rate_limiter.limits(calls=1, period=15)
     def field_rally_join(self, data):
         return self.post('field/rally/join', data)
 
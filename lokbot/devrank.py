@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import numpy
+
+from lokbot import project_root, logger
+
+LAND_COUNT = 256 * 256
+DEFAULT_TTL = 6 * 3600
+
+# world id -> (mtime of the mapped file, memmap)
+_maps = {}
+_lock = threading.Lock()
+_refreshing = set()
+
+
+def path(world_id):
+    return project_root.joinpath(f'data/devrank_{world_id}.bin')
+
+
+def parse(lands: str) -> numpy.ndarray:
+    """
+    :param lands: the `lands` of `field/worldmap/devrank`, one digit per land
+    :return: uint8 level of every land, indexed by `land_id - 100000`
+    """
+    levels = numpy.frombuffer(lands.encode('ascii'), dtype=numpy.uint8) - ord('0')
+    assert levels.size == LAND_COUNT, f'unexpected devrank size: {levels.size}'
+
+    return levels
+
+
+def _write(world_id, levels):
+    target = path(world_id)
+    tmp = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+    tmp.write_bytes(levels.tobytes())
+
+    try:
+        # readers keep their mapping of the old file, the swap is atomic for the others
+        os.replace(tmp, target)
+    except OSError:
+        # windows refuses to replace a file mapped by another process, that copy stays until the next refresh
+        tmp.unlink()
+        raise
+
+
+def _refresh(world_id, fetch):
+    try:
+        _write(world_id, parse(fetch()))
+    except Exception as e:
+        logger.warning(f'devrank refresh of world {world_id} failed: {e}')
+    finally:
+        _refreshing.discard(world_id)
+
+
+def get(world_id, fetch, ttl=DEFAULT_TTL) -> numpy.ndarray:
+    """
+    Read-only memory-mapped devrank of `world_id`, shared by every process of the host through `data/`,
+    an expired map keeps being served while it's refreshed in the background
+    :param world_id:
+    :param fetch: returns the `lands` string of `field/worldmap/devrank`
+    :param ttl: in seconds
+    :return:
+    """
+    target = path(world_id)
+
+    with _lock:
+        if not target.exists():
+            logger.info(f'fetching devrank of world {world_id}')
+            _write(world_id, parse(fetch()))
+
+        mtime = target.stat().st_mtime
+        if time.time() - mtime > ttl and world_id not in _refreshing:
+            _refreshing.add(world_id)
+            threading.Thread(target=_refresh, args=(world_id, fetch), daemon=True).start()
+
+        mapped = _maps.get(world_id)
+        if mapped is None or mapped[0] != mtime:
+            mapped = _maps[world_id] = (mtime, numpy.memmap(target, dtype=numpy.uint8, mode='r', shape=(LAND_COUNT,)))
+
+    return mapped[1]
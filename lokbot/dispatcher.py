@@ -0,0 +1,141 @@
+import collections
+import queue
+import threading
+
+from lokbot import logger
+from lokbot.exceptions import OtherException
+
+
+class Batch:
+    """
+    Candidates of one zone batch, best first, `done` is set once each one was started or dropped
+    """
+
+    def __init__(self, candidates, args=()):
+        self.candidates = list(candidates)
+        self.args = args
+        self.started = 0
+        self.stopped = None  # the error that ended the batch early
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+
+class MarchDispatcher:
+    """
+    Starts marches off the socket.io callback: a validating thread runs the `field_march_info` of the next
+    candidate while the starting thread waits on the rate limit of `field_march_start` for the current one.
+    The validating thread stays at most one candidate ahead of each free march slot
+    """
+
+    def __init__(self, validate, start, free_slots, stop_errors=(), on_error=None, name='march'):
+        """
+        :param validate: (candidate, *batch.args) -> context for `start`, falsy to drop the candidate
+        :param start: (candidate, context) -> True if a march was started
+        :param free_slots: () -> number of march slots left
+        :param stop_errors: api errors after which the rest of the batch would fail the same way
+        :param on_error: (candidate, error) for the other api errors
+        """
+        self.validate = validate
+        self.start = start
+        self.free_slots = free_slots
+        self.stop_errors = stop_errors
+        self.on_error = on_error
+        self.name = name
+
+        self.batches = queue.Queue()
+        self.validated = collections.deque()  # (batch, candidate, context), candidate None closes the batch
+        self.outstanding = 0  # validated, not started yet
+        self.condition = threading.Condition()
+        self.threads = []
+        self.counters = collections.Counter()
+
+    def submit(self, candidates, *args):
+        """
+        :return: Batch
+        """
+        batch = Batch(candidates, args)
+
+        with self.condition:
+            if not self.threads:
+                self.threads = [
+                    threading.Thread(target=self._validate_loop, name=f'{self.name}-validate', daemon=True),
+                    threading.Thread(target=self._start_loop, name=f'{self.name}-start', daemon=True),
+                ]
+                for thread in self.threads:
+                    thread.start()
+
+        self.batches.put(batch)
+
+        return batch
+
+    def stats(self):
+        return dict(self.counters, queued=self.batches.qsize(), outstanding=self.outstanding)
+
+    def _put(self, batch, candidate, context):
+        with self.condition:
+            self.validated.append((batch, candidate, context))
+            if candidate is not None:
+                self.outstanding += 1
+            self.condition.notify_all()
+
+    def _handle_error(self, batch, candidate, error):
+        if str(error) in self.stop_errors:
+            logger.warning(f'{self.name}: {error}, skip the rest of the batch')
+            batch.stopped = error
+            return
+
+        logger.info(f'{self.name}: {error}, {candidate}')
+        if self.on_error:
+            self.on_error(candidate, error)
+
+    def _call(self, batch, candidate, func, *args):
+        try:
+            return func(candidate, *args)
+        except OtherException as error:
+            self.counters['errors'] += 1
+            self._handle_error(batch, candidate, error)
+        except Exception as e:
+            self.counters['errors'] += 1
+            logger.exception(f'{self.name}: {func.__name__} failed: {e}')
+
+    def _validate_loop(self):
+        while True:
+            batch = self.batches.get()
+
+            for candidate in batch.candidates:
+                with self.condition:
+                    while not batch.stopped and self.outstanding and self.free_slots() <= self.outstanding:
+                        self.condition.wait()
+
+                    if batch.stopped or self.free_slots() <= self.outstanding:
+                        break
+
+                self.counters['validations'] += 1
+                context = self._call(batch, candidate, self.validate, *batch.args)
+                if context:
+                    self._put(batch, candidate, context)
+
+            self._put(batch, None, None)
+
+    def _start_loop(self):
+        while True:
+            with self.condition:
+                while not self.validated:
+                    self.condition.wait()
+
+                batch, candidate, context = self.validated.popleft()
+
+            if candidate is None:
+                batch.done.set()
+                continue
+
+            try:
+                if not batch.stopped and self.free_slots() > 0 and self._call(batch, candidate, self.start, context):
+                    batch.started += 1
+                    self.counters['started'] += 1
+            finally:
+                with self.condition:
+                    self.outstanding -= 1
+                    self.condition.notify_all()
@@ -1,8 +1,7 @@
-import json
-
-from lokbot import project_root
+import lokbot.asset_compiler
 
 API_BASE_URL = 'https://api-lok-live.leagueofkingdoms.com/api/'
+LIVE_API_BASE_URL = 'https://lok-api-live.leagueofkingdoms.com/api/'
 
 # 刚进游戏
 TUTORIAL_CODE_INTRO = 'Intro'
@@ -843,31 +842,9 @@ MARCH_TYPE_SUPPORT = 7
 MARCH_TYPE_RALLY = 8
 
 
-def load_building_json():
-    result = {}
-
-    for building_type, building_code in BUILDING_CODE_MAP.items():
-        current_building_json = json.load(open(project_root.joinpath(f'lokbot/assets/buildings/{building_type}.json')))
-        result[building_code] = current_building_json
-
-    return result
-
-
-def load_research_json():
-    result = {}
-
-    for research_category, research in RESEARCH_CODE_MAP.items():
-        current_research_json = json.load(
-            open(project_root.joinpath(f'lokbot/assets/research/{research_category}.json'))
-        )
-        for research_name, research_code in research.items():
-            result[research_code] = current_research_json[research_name]
-
-    return result
-
-
-building_json = load_building_json()
-research_json = load_research_json()
+# {code: (BuildingLevel of level 1, ...)}, {code: (ResearchLevel of level 1, ...)}, compiled on first access
+building_json = lokbot.asset_compiler.LazyTable('building')
+research_json = lokbot.asset_compiler.LazyTable('research')
 # https://play.leagueofkingdoms.com/json/table-live_136.nod
 # troop_json = json.load(open(project_root.joinpath('lokbot/assets/troop.json')))
 # field_monster_json = json.load(open(project_root.joinpath('lokbot/assets/field_monster.json')))
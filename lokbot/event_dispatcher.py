@@ -0,0 +1,127 @@
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+
+from lokbot import logger
+
+
+class EventStats:
+    def __init__(self):
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.lag = 0.0  # from received to handled, summed
+        self.lag_max = 0.0
+        self.latency = 0.0  # in the handler, summed
+        self.latency_max = 0.0
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'handled': self.handled,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'lag_mean': self.lag / self.handled if self.handled else None,
+            'lag_max': self.lag_max,
+            'latency_mean': self.latency / self.handled if self.handled else None,
+            'latency_max': self.latency_max,
+        }
+
+
+class EventDispatcher:
+    """
+    Takes socket.io handlers off the receive thread: every event type has its own bounded queue,
+    drained in order by one worker of the pool at a time. Events whose order matters to each other share a queue.
+    A coalescing event only keeps its latest payload while it waits, older ones are outdated anyway
+    """
+
+    def __init__(self, name, max_workers=4, maxsize=64):
+        self.name = name
+        self.maxsize = maxsize
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix=name)
+        self.handlers = {}  # event -> (handler, coalesce, queue name)
+        self.queues = collections.defaultdict(collections.deque)  # queue name -> deque of (received_at, event, data)
+        self.draining = set()
+        self.stats = collections.defaultdict(EventStats)
+        self.lock = threading.Lock()
+
+    def on(self, sio, event, coalesce=False, queue=None):
+        """
+        Like `sio.on`, the handler runs on the pool
+        :param sio: `socketio.Client`
+        :param event:
+        :param coalesce: keep only the latest pending payload
+        :param queue: name of the queue shared with other events, handled in the order they were received
+        :return:
+        """
+
+        def decorator(handler):
+            self.handlers[event] = (handler, coalesce, queue or event)
+            sio.on(event, functools.partial(self.push, event))
+
+            return handler
+
+        return decorator
+
+    def push(self, event, data=None):
+        _, coalesce, name = self.handlers[event]
+
+        with self.lock:
+            stats = self.stats[event]
+            queue = self.queues[name]
+            stats.received += 1
+
+            pending = [each for each in queue if each[1] == event] if coalesce else []
+            if pending:
+                for each in pending:
+                    queue.remove(each)
+                stats.coalesced += 1
+            elif len(queue) >= self.maxsize:
+                _, dropped_event, _ = queue.popleft()
+                self.stats[dropped_event].dropped += 1
+                logger.warning(f'{self.name}: {name} queue is full, dropped the oldest {dropped_event}')
+
+            queue.append((time.time(), event, data))
+
+            if name in self.draining:
+                return
+
+            self.draining.add(name)
+
+        self.pool.submit(self._drain, name)
+
+    def _drain(self, name):
+        while True:
+            with self.lock:
+                if not self.queues[name]:
+                    self.draining.discard(name)
+                    return
+
+                received_at, event, data = self.queues[name].popleft()
+
+            handler, _, _ = self.handlers[event]
+            started_at = time.time()
+            try:
+                handler(data)
+            except Exception as e:
+                logger.exception(f'{self.name}: {event} handler failed: {e}')
+
+            ended_at = time.time()
+            with self.lock:
+                stats = self.stats[event]
+                stats.handled += 1
+                stats.lag += started_at - received_at
+                stats.lag_max = max(stats.lag_max, started_at - received_at)
+                stats.latency += ended_at - started_at
+                stats.latency_max = max(stats.latency_max, ended_at - started_at)
+
+    def queue_depth(self):
+        with self.lock:
+            return {event: len(queue) for event, queue in self.queues.items() if queue}
+
+    def get_stats(self):
+        with self.lock:
+            return {event: stats.as_dict() for event, stats in self.stats.items()}
@@ -0,0 +1,549 @@
+import asyncio
+import base64
+import collections
+import datetime
+import json
+import math
+import random
+import time
+
+import fire
+
+import lokbot.util
+from lokbot.enum import *
+from lokbot.replay_server import LocalLokServer
+from lokbot import logger
+
+PROTECTED_API_LIST = ['field/march/info', 'field/march/start']
+
+# seconds between two calls of the same api before the server answers `duplicated`
+DEFAULT_RATE_LIMITS = {
+    'field/march/start': 2,
+    'field/march/info': 0.5,
+    'field/rally/join': 10,
+    'kingdom/building/upgrade': 4,
+    'kingdom/building/build': 4,
+    'kingdom/arcademy/research': 4,
+    'kingdom/task/claim': 2,
+}
+
+
+TROOP_SPEED_MAP = {each['code']: each['speed'] for each in lokbot.util.load_asset('troop.json')}
+FIELD_OBJECT_GATHERING_MAP = {
+    (each['code'], each['level']): each for each in lokbot.util.load_asset('field_object.json')
+}
+
+
+def iso_time(ts):
+    return datetime.datetime.utcfromtimestamp(ts).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+class FakeAccount:
+    def __init__(self, _id, index, world_id, rng):
+        self._id = _id
+        self.kingdom = {
+            '_id': _id,
+            'fieldObjectId': f'{index + 1:024x}',
+            'worldId': world_id,
+            'loc': [world_id, rng.randrange(64, 1984), rng.randrange(64, 1984)],
+            'level': 15,
+            'vip': {'level': 5},
+            'dragoActionPoint': {'value': 0},
+            'resources': [1_000_000, 1_000_000, 1_000_000, 1_000_000],
+            'buildings': [
+                {'code': BUILDING_CODE_MAP[name], 'position': position, 'level': 10, 'state': BUILDING_STATE_NORMAL}
+                for name, position in dict(BUILDING_POSITION_MAP, barrack=101, farm=102).items()
+            ],
+        }
+        self.production_per_second = [10, 10, 10, 5]
+        self.produced_at = time.time()
+        self.troops = {TROOP_CODE_FIGHTER: 100_000, TROOP_CODE_WARRIOR: 50_000}
+        self.march_limit = 3
+        self.march_size = 30_000
+        self.marches = {}
+        self.tasks = {}
+        self.researches = {}  # code -> level researched
+        self.called_at = {}
+        self.packets = collections.deque()
+        self.kingdom_sid = None
+        self.march_started_at = []
+        self.slot_free_since = time.time()
+        self.slot_idle_seconds = []
+
+    def produce(self):
+        now = time.time()
+        elapsed = now - self.produced_at
+        self.produced_at = now
+
+        self.kingdom['resources'] = [
+            int(value + rate * elapsed) for value, rate in zip(self.kingdom['resources'], self.production_per_second)
+        ]
+
+        return self.kingdom['resources']
+
+
+class FakeServer(LocalLokServer):
+    """
+    Deterministic, scriptable stand-in of the game server for load testing the bot without a real account
+
+    Models march timers (travel + gathering), resource production, kingdom tasks with `/task/update` and
+    `/building/update` events, field zones with `/field/objects/v4` packs,
+    and the server-side limiters: `duplicated` for an api called again within its `rate_limits` window,
+    `exceed_limit_packet` above `packet_limit` requests per minute
+
+    `speed` divides every server-side timer
+    """
+
+    def __init__(self, seed=0, speed=1.0, objects_per_zone=4, rate_limits=None, packet_limit=240,
+                 stall_threshold=60, world_id=32, host='127.0.0.1', port=8080):
+        super().__init__(host, port)
+
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.speed = speed
+        self.objects_per_zone = objects_per_zone
+        self.rate_limits = DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.packet_limit = packet_limit
+        self.stall_threshold = stall_threshold
+        self.world_id = world_id
+
+        self.xor_password = ''.join(self.rng.choice('0123456789abcdef') for _ in range(16))
+        self.protected_api_list = PROTECTED_API_LIST
+        self.devrank = ''.join(str(min(int(self.rng.expovariate(0.6)), 9)) for _ in range(65536))
+
+        self.accounts = {}
+        self.zones = {}  # zone_id -> {object_id: object}
+        self.sequence = 0
+
+        self._setup_socket_handlers()
+
+    def _next_id(self):
+        self.sequence += 1
+
+        return f'{self.sequence:024x}'
+
+    def _account(self, token):
+        _id = lokbot.util.decode_jwt(token).get('_id') if token else 'anonymous'
+
+        if _id not in self.accounts:
+            self.accounts[_id] = FakeAccount(_id, len(self.accounts), self.world_id, self.rng)
+
+        return self.accounts[_id]
+
+    # region field
+
+    def _spawn(self, zone_id, rng):
+        code = rng.choice(OBJECT_MINE_CODE_LIST[:5] + OBJECT_MONSTER_CODE_LIST[:4])
+        level = rng.randint(1, 5)
+        x = (zone_id % 64) * 32 + rng.randrange(32)
+        y = (zone_id // 64) * 32 + rng.randrange(32)
+
+        value = level * 1000 * (1 if code in OBJECT_MONSTER_CODE_LIST else 50)
+        gathering = FIELD_OBJECT_GATHERING_MAP.get((code, level))
+        if gathering:
+            value = gathering.get('production')
+
+        return {
+            '_id': self._next_id(),
+            'loc': [self.world_id, x, y],
+            'level': level,
+            'code': code,
+            'param': {'value': value},
+            'state': 1,
+            'expired': iso_time(time.time() + rng.randint(3600, 6 * 3600) / self.speed),
+        }
+
+    def zone_objects(self, zone_id):
+        objects = self.zones.get(zone_id)
+
+        if objects is None:
+            rng = random.Random(f'{self.seed}-{zone_id}')
+            objects = self.zones[zone_id] = {}
+            for _ in range(self.objects_per_zone):
+                obj = self._spawn(zone_id, rng)
+                objects[obj['_id']] = obj
+
+        # respawn what has expired or been taken
+        now_iso = iso_time(time.time())
+        for object_id in [k for k, v in objects.items() if v['expired'] < now_iso or v['param']['value'] <= 0]:
+            del objects[object_id]
+            obj = self._spawn(zone_id, self.rng)
+            objects[obj['_id']] = obj
+
+        return list(objects.values())
+
+    def find_object(self, loc):
+        zone_id = lokbot.util.get_zone_id_by_coords(loc[1], loc[2])
+
+        for obj in self.zone_objects(zone_id):
+            if obj['loc'] == list(loc):
+                return obj
+
+        return None
+
+    # endregion
+
+    # region api
+
+    def _limited(self, account, api_path):
+        now = time.time()
+
+        window = self.rate_limits.get(api_path)
+        if window and now - account.called_at.get(api_path, 0) < window:
+            return 'duplicated'
+        account.called_at[api_path] = now
+
+        account.packets.append(now)
+        while account.packets and account.packets[0] < now - 60:
+            account.packets.popleft()
+        if len(account.packets) > self.packet_limit:
+            return 'exceed_limit_packet'
+
+        return None
+
+    async def api(self, api_path, json_data, token):
+        account = self._account(token)
+
+        err = self._limited(account, api_path)
+        if err:
+            logger.warning(f'{account._id}: {api_path} {err}')
+            return {'result': False, 'err': {'code': err}}
+
+        handler = getattr(self, 'api_' + api_path.replace('/', '_'), None)
+        if handler is None:
+            return {'result': True}
+
+        res = handler(account, json_data, token)
+        if 'err' in res:
+            return {'result': False, 'err': {'code': res['err']}}
+
+        return dict({'result': True}, **res)
+
+    def api_auth_connect(self, account, json_data, token):
+        return {
+            'token': token,
+            'lstProtect': base64.b64encode(json.dumps([f'/api/{api}' for api in PROTECTED_API_LIST]).encode()).decode(),
+            'regionHash': base64.b64encode(json.dumps(f'fake-{self.xor_password}-{self.seed}').encode()).decode(),
+        }
+
+    def api_kingdom_enter(self, account, json_data, token):
+        account.produce()
+
+        return {'kingdom': account.kingdom, 'networks': self.networks()}
+
+    def api_drago_lair_list(self, account, json_data, token):
+        return {'dragos': []}
+
+    def api_item_list(self, account, json_data, token):
+        return {'items': []}
+
+    def api_quest_list(self, account, json_data, token):
+        return {'mainQuests': [], 'sideQuests': []}
+
+    def api_quest_list_daily(self, account, json_data, token):
+        return {'dailyQuest': {'quests': [], 'rewards': []}}
+
+    def api_event_list(self, account, json_data, token):
+        return {'events': []}
+
+    def api_item_freechest(self, account, json_data, token):
+        now = time.time()
+
+        return {'freeChest': {
+            'silver': {'next': iso_time(now + 600 / self.speed)},
+            'gold': {'next': iso_time(now + 3600 / self.speed)},
+            'platinum': {'next': iso_time(now + 86400 / self.speed)},
+        }}
+
+    def api_kingdom_caravan_list(self, account, json_data, token):
+        return {'caravan': {'items': []}}
+
+    def api_kingdom_arcademy_research_list(self, account, json_data, token):
+        return {'researches': [{'code': code, 'level': level} for code, level in account.researches.items()]}
+
+    def api_kingdom_hospital_wounded(self, account, json_data, token):
+        return {'wounded': []}
+
+    def api_field_worldmap_devrank(self, account, json_data, token):
+        return {'lands': self.devrank}
+
+    def api_kingdom_task_all(self, account, json_data, token):
+        return {'kingdomTasks': list(account.tasks.values())}
+
+    def api_kingdom_profile_troops(self, account, json_data, token):
+        return {'troops': {
+            'field': list(account.marches.values()),
+            'info': {'marchLimit': account.march_limit, 'marchSize': account.march_size},
+        }}
+
+    def api_field_march_info(self, account, json_data, token):
+        fo = self.find_object(json_data.get('toLoc'))
+        if fo is None:
+            # already gone, looks like an expired object to the bot
+            fo = {'code': None, 'param': {'value': 0}, 'expired': iso_time(0)}
+
+        return {
+            'fo': fo,
+            'troops': [{'code': code, 'amount': amount} for code, amount in account.troops.items() if amount],
+            'distance': self._distance(account, json_data.get('toLoc')),
+        }
+
+    def _distance(self, account, to_loc):
+        from_loc = account.kingdom['loc']
+
+        return math.ceil(math.hypot(from_loc[1] - to_loc[1], from_loc[2] - to_loc[2]))
+
+    def api_field_march_start(self, account, json_data, token):
+        if len(account.marches) >= account.march_limit:
+            return {'err': 'full_task'}
+
+        fo = self.find_object(json_data.get('toLoc'))
+        if fo is None or fo.get('occupied'):
+            return {'err': 'not_exist'}
+
+        march_troops = [each for each in json_data.get('marchTroops', []) if each.get('amount')]
+        for each in march_troops:
+            if account.troops.get(each['code'], 0) < each['amount']:
+                return {'err': 'not_enough_troop'}
+        for each in march_troops:
+            account.troops[each['code']] -= each['amount']
+
+        # travel both ways at the slowest troop speed, plus gathering when it's a mine
+        speed = min([TROOP_SPEED_MAP.get(each['code'], 65) for each in march_troops] or [65])
+        seconds = 2 * self._distance(account, fo['loc']) * 60 / speed
+        if fo['code'] in OBJECT_MINE_CODE_LIST:
+            gathering = FIELD_OBJECT_GATHERING_MAP.get((fo['code'], fo['level']), {}).get('gathering', 40000)
+            seconds += fo['param']['value'] / gathering * 3600
+            fo['occupied'] = {'id': account._id, 'worldId': self.world_id}
+        else:
+            fo['param']['value'] = 0
+        seconds /= self.speed
+
+        now = time.time()
+        task = {
+            '_id': self._next_id(),
+            'code': 'march',
+            'status': STATUS_PENDING,
+            'started': iso_time(now),
+            'expectedEnded': iso_time(now + seconds),
+            'endTime': iso_time(now + seconds),
+            'toLoc': fo['loc'],
+            'marchTroops': march_troops,
+            'objectId': fo['_id'],
+        }
+        account.marches[task['_id']] = task
+
+        # how long the slot this march took had been free
+        account.slot_idle_seconds.append(now - account.slot_free_since)
+        account.march_started_at.append(now)
+        if len(account.marches) < account.march_limit:
+            account.slot_free_since = now
+
+        return {'newTask': dict(task)}
+
+    def _start_task(self, account, code, seconds, **extra):
+        now = time.time()
+        task = dict({
+            '_id': self._next_id(),
+            'code': code,
+            'status': STATUS_PENDING,
+            'started': iso_time(now),
+            'expectedEnded': iso_time(now + seconds / self.speed),
+        }, **extra)
+        account.tasks[task['_id']] = task
+
+        return task
+
+    def _pay(self, account, costs):
+        resources = account.produce()
+        if any(have < need for have, need in zip(resources, costs)):
+            return False
+
+        account.kingdom['resources'] = [have - need for have, need in zip(resources, costs)]
+
+        return True
+
+    def _busy(self, account, codes):
+        return [t for t in account.tasks.values() if t['code'] in codes and t['status'] == STATUS_PENDING]
+
+    def api_kingdom_building_upgrade(self, account, json_data, token):
+        if len(self._busy(account, (TASK_CODE_SILVER_HAMMER, TASK_CODE_GOLD_HAMMER))) >= 2:
+            return {'err': 'full_task'}
+
+        building = [b for b in account.kingdom['buildings'] if b['position'] == json_data.get('position')]
+        if not building:
+            return {'err': 'not_exist'}
+        building = building[0]
+
+        levels = building_json.get(building['code'], ())
+        if building['level'] >= len(levels):
+            return {'err': 'max_level'}
+        level_json = levels[building['level']]
+        if not self._pay(account, level_json.resources):
+            return {'err': 'insufficient_resources'}
+
+        busy_silver = self._busy(account, (TASK_CODE_SILVER_HAMMER,))
+        code = TASK_CODE_GOLD_HAMMER if busy_silver else TASK_CODE_SILVER_HAMMER
+        task = self._start_task(account, code, level_json.time * 60, position=building['position'])
+        building['state'] = BUILDING_STATE_UPGRADING
+
+        return {'newTask': task, 'updateBuilding': dict(building), 'resources': account.kingdom['resources']}
+
+    def api_kingdom_building_build(self, account, json_data, token):
+        account.kingdom['buildings'].append({
+            'code': json_data.get('buildingCode'),
+            'position': json_data.get('position'),
+            'level': 0,
+            'state': BUILDING_STATE_NORMAL,
+        })
+
+        res = self.api_kingdom_building_upgrade(account, json_data, token)
+        if 'updateBuilding' in res:
+            res['newBuilding'] = res.pop('updateBuilding')
+
+        return res
+
+    def api_kingdom_barrack_train(self, account, json_data, token):
+        if self._busy(account, (TASK_CODE_CAMP,)):
+            return {'err': 'full_task'}
+
+        troop_code, amount = json_data.get('troopCode'), json_data.get('amount')
+        costs = [each * amount for each in TRAIN_TROOP_RESOURCE_REQUIREMENT.get(troop_code, [0, 0, 0, 0])]
+        if not self._pay(account, costs):
+            return {'err': 'insufficient_resources'}
+
+        task = self._start_task(account, TASK_CODE_CAMP, 3 * amount / 10, troopCode=troop_code, amount=amount)
+
+        return {'newTask': task, 'resources': account.kingdom['resources']}
+
+    def api_kingdom_arcademy_research(self, account, json_data, token):
+        if self._busy(account, (TASK_CODE_ACADEMY,)):
+            return {'err': 'full_task'}
+
+        research_code = json_data.get('researchCode')
+        levels = research_json.get(research_code, ())
+        level = account.researches.get(research_code, 0)
+        if level >= len(levels):
+            return {'err': 'max_level'}
+        if not self._pay(account, levels[level].resources):
+            return {'err': 'insufficient_resources'}
+
+        task = self._start_task(account, TASK_CODE_ACADEMY, 600, researchCode=research_code, level=level + 1)
+
+        return {'newTask': task, 'resources': account.kingdom['resources']}
+
+    def api_kingdom_task_claim(self, account, json_data, token):
+        for task_id, task in list(account.tasks.items()):
+            if task['status'] == STATUS_FINISHED:
+                task['status'] = STATUS_CLAIMED
+                self._emit_kingdom(account, '/task/update', task)
+                del account.tasks[task_id]
+
+        return {}
+
+    # endregion
+
+    # region timers
+
+    def _emit_kingdom(self, account, event, data):
+        if account.kingdom_sid:
+            self.sio['kingdom'].start_background_task(self.sio['kingdom'].emit, event, data, to=account.kingdom_sid)
+
+    def _tick(self):
+        now = time.time()
+        now_iso = iso_time(now)
+
+        for account in self.accounts.values():
+            for march_id, march in list(account.marches.items()):
+                if march['endTime'] > now_iso:
+                    continue
+
+                del account.marches[march_id]
+                self._emit_kingdom(account, '/task/update', dict(march, status=STATUS_FINISHED))
+                for each in march['marchTroops']:
+                    account.troops[each['code']] = account.troops.get(each['code'], 0) + each['amount']
+
+                fo = self.find_object(march['toLoc'])
+                if fo and fo['code'] in OBJECT_MINE_CODE_LIST:
+                    resource_index = OBJECT_MINE_CODE_LIST.index(fo['code'])
+                    if resource_index < 4:
+                        account.kingdom['resources'][resource_index] += fo['param']['value']
+                    fo['param']['value'] = 0
+
+                if len(account.marches) == account.march_limit - 1:
+                    account.slot_free_since = now
+
+            for task in list(account.tasks.values()):
+                if task['status'] != STATUS_PENDING or task['expectedEnded'] > now_iso:
+                    continue
+
+                task['status'] = STATUS_FINISHED
+                self._emit_kingdom(account, '/task/update', task)
+
+                if task['code'] in (TASK_CODE_SILVER_HAMMER, TASK_CODE_GOLD_HAMMER):
+                    building = [b for b in account.kingdom['buildings'] if b['position'] == task.get('position')][0]
+                    building['level'] += 1
+                    building['state'] = BUILDING_STATE_NORMAL
+                    # building queues are released without claiming
+                    del account.tasks[task['_id']]
+                    self._emit_kingdom(account, '/building/update', dict(building))
+
+                if task['code'] == TASK_CODE_CAMP:
+                    account.troops[task['troopCode']] = account.troops.get(task['troopCode'], 0) + task['amount']
+
+                if task['code'] == TASK_CODE_ACADEMY:
+                    account.researches[task['researchCode']] = task['level']
+
+    async def _run_timers(self):
+        while True:
+            self._tick()
+            await asyncio.sleep(0.5)
+
+    # endregion
+
+    def _setup_socket_handlers(self):
+        @self.sio['kingdom'].on('/kingdom/enter')
+        async def on_kingdom_enter(sid, data):
+            self._account(data.get('token')).kingdom_sid = sid
+
+        @self.sio['field'].on('/field/enter/v3')
+        async def on_field_enter(sid, data):
+            token = self.decode(data).get('token')
+            await self.sio['field'].save_session(sid, {'token': token})
+            await self.sio['field'].emit('/field/enter/v3', self.encode({'loc': self._account(token).kingdom['loc']}), to=sid)
+
+        @self.sio['field'].on('/zone/enter/list/v4')
+        async def on_zone_enter(sid, data):
+            zone_ids = json.loads(self.decode(data).get('zones'))
+            objects = [obj for zone_id in zone_ids for obj in self.zone_objects(zone_id)]
+
+            await self.emit_field_objects(sid, {'objects': objects})
+
+    def stats(self):
+        stats = super().stats()
+        elapsed_hours = max(time.time() - self.started_at, 1) / 3600
+
+        for _id, account in self.accounts.items():
+            idle = account.slot_idle_seconds
+            stats[_id] = {
+                'marches': len(account.march_started_at),
+                'marches_per_hour': len(account.march_started_at) / elapsed_hours,
+                'active_marches': len(account.marches),
+                'slot_idle_mean': sum(idle) / len(idle) if idle else None,
+                'stalls': len([each for each in idle if each > self.stall_threshold]),
+            }
+
+        return stats
+
+    async def serve(self):
+        asyncio.ensure_future(self._run_timers())
+        await super().serve()
+
+
+def main(seed=0, speed=1.0, objects_per_zone=4, packet_limit=240, host='127.0.0.1', port=8080):
+    FakeServer(seed=seed, speed=speed, objects_per_zone=objects_per_zone, packet_limit=packet_limit,
+               host=host, port=port).run()
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -1,6 +1,6 @@
 import base64
-import functools
-import gzip
+import collections
+import json
 import math
 import random
 import threading
@@ -8,15 +8,41 @@ import time
 
 import arrow
 import numpy
-import socketio
 import tenacity
 
+import lokbot.build_planner
+import lokbot.cache
+import lokbot.devrank
+import lokbot.dispatcher
+import lokbot.event_dispatcher
+import lokbot.field_index
+import lokbot.field_pack
+import lokbot.field_session
+import lokbot.geometry
+import lokbot.ledger
+import lokbot.march_tracker
+import lokbot.ranking
+import lokbot.recorder
+import lokbot.research_planner
+import lokbot.scheduler
+import lokbot.state
 import lokbot.util
-from lokbot import logger, socf_logger, sock_logger, socc_logger
+import lokbot.zone_scheduler
+from lokbot import logger, project_root, sock_logger, socc_logger
 from lokbot.client import LokBotApi
 from lokbot.enum import *
 from lokbot.exceptions import OtherException, FatalApiException
 
+# stop marching for this round, the next object would fail the same way
+MARCH_STOP_ERRORS = (
+    'full_task', 'not_enough_troop', 'insufficient_actionpoint', 'not_open_gate',
+    'no_drago_action_point', 'no_drago', 'exceed_crystal_daily_quota', 'not_available_drago'
+)
+# scanning starts this many seconds before a march is due back, in time to take its slot
+MARCH_RETURN_LEAD = 10
+# zone batches scanned per `socf_thread` loop, below `FieldSession`'s enter budget so that loops share a connection
+ZONE_BATCHES_PER_LOOP = 3
+
 ws_headers = {
     'Accept': '*/*',
     'Accept-Encoding': 'gzip, deflate, br',
@@ -28,50 +54,12 @@ ws_headers = {
 }
 
 
-# Ref: https://stackoverflow.com/a/16858283/6266737
-def blockshaped(arr, nrows, ncols):
-    """
-    Return an array of shape (n, nrows, ncols) where
-    n * nrows * ncols = arr.size
-
-    If arr is a 2D array, the returned array should look like n subblocks with
-    each subblock preserving the "physical" layout of arr.
-    """
-    h, w = arr.shape
-    assert h % nrows == 0, f"{h} rows is not evenly divisible by {nrows}"
-    assert w % ncols == 0, f"{w} cols is not evenly divisible by {ncols}"
-    return (arr.reshape(h // nrows, nrows, -1, ncols)
-            .swapaxes(1, 2)
-            .reshape(-1, nrows, ncols))
-
-
-# Ref: https://stackoverflow.com/a/432175/6266737
-# noinspection PyBroadException
-def ndindex(ndarray, item):
-    if len(ndarray.shape) == 1:
-        try:
-            return [ndarray.tolist().index(item)]
-        except:
-            pass
-    else:
-        for i, subarray in enumerate(ndarray):
-            try:
-                return [i] + ndindex(subarray, item)
-            except:
-                pass
-
-
-# Ref: https://stackoverflow.com/a/22550933/6266737
-def neighbors(a, radius, row_number, column_number):
-    return [[a[i][j] if 0 <= i < len(a) and 0 <= j < len(a[0]) else 0
-             for j in range(column_number - 1 - radius, column_number + radius)]
-            for i in range(row_number - 1 - radius, row_number + radius)]
-
-
 class LokFarmer:
-    def __init__(self, token, captcha_solver_config):
+    def __init__(self, token, captcha_solver_config, scheduler=None):
         self.kingdom_enter = None
+        self.state = None
         self.token = token
+        self.scheduler = scheduler or lokbot.scheduler.Scheduler()
         self.api = LokBotApi(token, captcha_solver_config, self._request_callback)
 
         auth_res = self.api.auth_connect({"deviceInfo": {"build": "global"}})
@@ -85,6 +73,11 @@ class LokFarmer:
         project_root.joinpath(f'data/{self._id}.token').write_text(self.token)
 
         self.kingdom_enter = self.api.kingdom_enter()
+        self.state = lokbot.state.KingdomState(self.kingdom_enter.get('kingdom'))
+        self.ledger = lokbot.ledger.ResourceLedger(self.state)
+        self.build_planner = None
+        self.research_planner = None
+        self.research_in_progress = None  # (code, level)
         self.alliance_id = self.kingdom_enter.get('kingdom', {}).get('allianceId')
 
         # Thêm biến đếm số mỏ đã khai thác và quái đã đánh
@@ -107,26 +100,33 @@ class LokFarmer:
         if self.alliance_id:
             self.api.chat_logs(f'a{self.alliance_id}')
 
-        # [food, lumber, stone, gold]
-        self.resources = self.kingdom_enter.get('kingdom').get('resources')
         self.buff_item_use_lock = threading.Lock()
         self.hospital_recover_lock = threading.Lock()
         self.has_additional_building_queue = self.kingdom_enter.get('kingdom').get('vip', {}).get('level') >= 5
-        self.troop_queue = []
-        self.march_limit = 2
+        self.available_troops = []  # as of the last `field_march_info`
+        self.troops_sent = collections.Counter()  # by code, since the start
+        self.march_tracker = lokbot.march_tracker.MarchTracker()
         self.march_size = 10000
         self.level = self.kingdom_enter.get('kingdom').get('level')
-        self.socf_entered = False
         self.socf_world_id = None
-        self.field_object_processed = False
+        self.xp_value = None  # see `lokbot.ranking.score`
         self.started_at = time.time()
-        self.building_queue_available = threading.Event()
-        self.research_queue_available = threading.Event()
-        self.train_queue_available = threading.Event()
-        self.kingdom_tasks = []
-        self.zones = []
-        self.available_dragos = self._get_available_dragos()
-        self.drago_action_point = self.kingdom_enter.get('kingdom').get('dragoActionPoint', {}).get('value', 0)
+        self.building_queue_available = lokbot.scheduler.Trigger(self.scheduler, f'{self._id}:building_queue_available')
+        self.research_queue_available = lokbot.scheduler.Trigger(self.scheduler, f'{self._id}:research_queue_available')
+        self.train_queue_available = lokbot.scheduler.Trigger(self.scheduler, f'{self._id}:train_queue_available')
+        self.zone_scheduler = None
+        self.field_session = None
+        # kingdom socket.io handlers run here, off the receive thread
+        self.kingdom_events = lokbot.event_dispatcher.EventDispatcher(f'{self._id}:kingdom')
+        self.zone_hits = collections.Counter()
+        self.negative_cache = lokbot.cache.NegativeCache()
+        self.march_dispatcher = lokbot.dispatcher.MarchDispatcher(
+            self._validate_field_object, self._start_field_object_march,
+            lambda: self.march_tracker.free_slots(time.time() + MARCH_RETURN_LEAD), MARCH_STOP_ERRORS,
+            self._on_field_object_error,
+            name=f'{self._id}:march'
+        )
+        self.state.set_dragos(self._get_available_dragos())
         self.shared_objects = set()
         # Track joined rally IDs to avoid duplicate joins
         self.joined_rally_ids = set()
@@ -141,6 +141,37 @@ class LokFarmer:
 
         return diff_in_seconds + random.randint(5, 10)
 
+    @property
+    def resources(self):
+        """
+        [food, lumber, stone, gold]
+        """
+        return self.state.snapshot.resources
+
+    @property
+    def kingdom_tasks(self):
+        return self.state.snapshot.tasks
+
+    @property
+    def available_dragos(self):
+        return self.state.snapshot.dragos
+
+    @property
+    def drago_action_point(self):
+        return self.state.snapshot.drago_action_point
+
+    def _get_kingdom_tasks(self):
+        """
+        :return: the kingdom tasks as the socket events left them, re-fetched once they may have drifted
+        """
+        if self.state.tasks_stale():
+            self.state.set_tasks(self.api.kingdom_task_all().get('kingdomTasks', []))
+
+        return self.kingdom_tasks
+
+    def _call_later(self, delay, func, args=()):
+        self.scheduler.call_later(delay, func, args, name=f'{self._id}:{func.__name__}')
+
     def _is_building_upgradeable(self, building, buildings):
         if building.get('state') != BUILDING_STATE_NORMAL:
             return False
@@ -157,69 +188,22 @@ class LokFarmer:
         building_level = building.get('level')
         current_building_json = building_json.get(building.get('code'))
 
-        if not current_building_json:
-            return False
-
-        next_level_building_json = current_building_json.get(str(building_level + 1))
-        for requirement in next_level_building_json.get('requirements'):
-            req_level = requirement.get('level')
-            req_type = requirement.get('type')
-            req_code = BUILDING_CODE_MAP.get(req_type)
-
-            if not [b for b in buildings if b.get('code') == req_code and b.get('level') >= req_level]:
-                return False
-
-        for res_requirement in next_level_building_json.get('resources'):
-            req_value = res_requirement.get('value')
-            req_type = res_requirement.get('type')
-
-            if self.resources[RESOURCE_IDX_MAP[req_type]] < req_value:
-                return False
-
-        return True
-
-    def _is_researchable(self, academy_level, category_name, research_name, exist_researches, to_max_level=False):
-        research_category = RESEARCH_CODE_MAP.get(category_name)
-        research_code = research_category.get(research_name)
-
-        exist_research = [each for each in exist_researches if each.get('code') == research_code]
-        current_research_json = research_json.get(research_code)
-
-        # already finished
-        if exist_research and exist_research[0].get('level') >= int(current_research_json[-1].get('level')):
+        # already max level
+        if not current_building_json or building_level >= len(current_building_json):
             return False
 
-        # minimum required level only
-        if not to_max_level and \
-                exist_research and \
-                exist_research[0].get('level') >= RESEARCH_MINIMUM_LEVEL_MAP.get(category_name).get(research_name, 0):
+        next_level_building_json = current_building_json[building_level]
+        # golden pillars and the like aren't tracked
+        if next_level_building_json.items:
             return False
 
-        next_level_research_json = current_research_json[0]
-        if exist_research:
-            next_level_research_json = current_research_json[exist_research[0].get('level')]
-
-        for requirement in next_level_research_json.get('requirements'):
-            req_level = int(requirement.get('level'))
-            req_type = requirement.get('type')
-
-            # 判断学院等级
-            if req_type == 'academy' and req_level > academy_level:
-                return False
-
-            # 判断前置研究是否完成
-            if req_type != 'academy' and not [each for each in exist_researches if
-                                              each.get('code') == research_category.get(req_type)
-                                              and each.get('level') >= req_level]:
-                return False
-
-        for res_requirement in next_level_research_json.get('resources'):
-            req_value = int(res_requirement.get('value'))
-            req_type = res_requirement.get('type')
+        for req_type, req_level in next_level_building_json.requirements:
+            req_code = BUILDING_CODE_MAP.get(req_type)
 
-            if self.resources[RESOURCE_IDX_MAP[req_type]] < req_value:
+            if not [b for b in buildings if b.get('code') == req_code and b.get('level') >= req_level]:
                 return False
 
+        # resources are up to `self.ledger.reserve`
         return True
 
     def _update_kingdom_enter_building(self, building):
@@ -228,19 +212,18 @@ class LokFarmer:
                 logger.info('hospital has wounded troops, try to recover')
                 self.hospital_recover()
 
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
-
-        self.kingdom_enter['kingdom']['buildings'] = [
-                                                         b for b in buildings if
-                                                         b.get('position') != building.get('position')
-                                                     ] + [building]
+        self.state.update_building(building)
 
     def _request_callback(self, json_response):
-        resources = json_response.get('resources')
+        if self.state is None:
+            # not in the kingdom yet
+            return
 
+        resources = json_response.get('resources')
         if resources and len(resources) == 4:
             logger.info(f'resources updated: {resources}')
-            self.resources = resources
+
+        self.state.on_response(json_response)
 
     def _get_optimal_speedups(self, need_seconds, speedup_type):
         current_map = ITEM_CODE_SPEEDUP_MAP.get(speedup_type)
@@ -320,6 +303,11 @@ class LokFarmer:
         if not self._is_building_upgradeable(building, buildings):
             return 'continue'
 
+        cost = building_json.get(building.get('code'))[building.get('level')].resources
+        reservation = self.ledger.reserve(cost, f'building {building.get("code")}({building.get("level") + 1})')
+        if reservation is None:
+            return 'continue'
+
         try:
             if building.get('level') == 0:
                 res = self.api.kingdom_building_build(building)
@@ -334,6 +322,11 @@ class LokFarmer:
 
             logger.info(f'building upgrade failed: {building}')
             return 'continue'
+        else:
+            reservation.commit(res)
+        finally:
+            # whatever the api raised, don't hold the resources
+            reservation.release()
 
         building['state'] = BUILDING_STATE_UPGRADING
         self._update_kingdom_enter_building(building)
@@ -400,49 +393,21 @@ class LokFarmer:
 
             alliance_point -= cost * amount
 
-    @functools.lru_cache()
-    def _get_land_with_level(self):
-        rank = self.api.field_worldmap_devrank().get('lands')
-
-        land_with_level = [[], [], [], [], [], [], [], [], [], []]
-        for index, level in enumerate(rank):
-            # land id start from 100000
-            land_with_level[int(level)].append(100000 + index)
+    def _get_land_levels(self):
+        """
+        :return: devrank level of every land, indexed by `land_id - 100000`
+        """
+        world_id = self.kingdom_enter.get('kingdom').get('worldId')
 
-        return land_with_level
+        return lokbot.devrank.get(world_id, lambda: self.api.field_worldmap_devrank().get('lands'))
 
-    @staticmethod
-    @functools.lru_cache()
-    def _get_land_array():
-        return numpy.arange(100000, 165536).reshape(256, 256)
-
-    @functools.lru_cache()
-    def _get_land_array_4_by_4(self):
-        return blockshaped(self._get_land_array(), 4, 4)
+    def _get_land_with_level(self):
+        levels = self._get_land_levels()
 
-    @staticmethod
-    @functools.lru_cache()
-    def _get_zone_array():
-        return numpy.arange(0, 4096).reshape(64, 64)
+        return [(lokbot.geometry.LAND_ID_BASE + numpy.flatnonzero(levels == level)).tolist() for level in range(10)]
 
-    @functools.lru_cache()
     def _get_nearest_land(self, x, y, radius=32):
-        land_array = self._get_land_array()
-        # current_land_id = land_array[y // 8, x // 8]
-        nearby_land_ids = neighbors(land_array, radius, y // 8 + 1, x // 8 + 1)
-        nearby_land_ids = [item for sublist in nearby_land_ids for item in sublist if item != 0]
-        land_with_level = self._get_land_with_level()
-
-        lands = []
-        for index, each_level in enumerate(reversed(land_with_level)):
-            level = 10 - index
-
-            # if level < 3:
-            #     continue
-
-            lands += [(each_land_id, level) for each_land_id in each_level if each_land_id in nearby_land_ids]
-
-        return lands
+        return lokbot.geometry.nearest_lands(x, y, radius, self._get_land_levels())
 
     def _get_top_leveled_land(self, limit=1024):
         land_with_level = self._get_land_with_level()
@@ -462,44 +427,29 @@ class LokFarmer:
 
         return lands
 
-    @functools.lru_cache()
-    def _get_zone_id_by_land_id(self, land_id):
-        land_array = self._get_land_array_4_by_4()
-
-        return ndindex(land_array, land_id)[0]
-
-    @functools.lru_cache()
     def _get_nearest_zone(self, x, y, radius=16):
-        lands = self._get_nearest_land(x, y, radius)
-        zones = []
-        for land_id, _ in lands:
-            zone_id = self._get_zone_id_by_land_id(land_id)
-            if zone_id not in zones:
-                zones.append(zone_id)
+        return lokbot.geometry.nearest_zones(x, y, radius, self._get_land_levels())
 
-        return zones
-
-    def _get_nearest_zone_ng(self, x, y, radius=8):
-        current_zone_id = lokbot.util.get_zone_id_by_coords(x, y)
-
-        idx = ndindex(self._get_zone_array(), current_zone_id)
+    @staticmethod
+    def _get_nearest_zone_ng(x, y, radius=8):
+        return lokbot.geometry.zones_within(x, y, radius).tolist()
 
-        nearby_zone_ids = neighbors(self._get_zone_array(), radius, idx[0] + 1, idx[1] + 1)
-        nearby_zone_ids = [item.item() for sublist in nearby_zone_ids for item in sublist if item != 0]
+    @property
+    def troop_queue(self):
+        return self.march_tracker.tasks()
 
-        return nearby_zone_ids
+    @property
+    def march_limit(self):
+        return self.march_tracker.limit
 
     def _update_march_limit(self):
         troops = self.api.kingdom_profile_troops().get('troops')
-        self.troop_queue = troops.get('field')
-        self.march_limit = troops.get('info').get('marchLimit')
+        self.march_tracker.reconcile(troops.get('field'), troops.get('info').get('marchLimit'))
         self.march_size = troops.get('info').get('marchSize')
 
     def _is_march_limit_exceeded(self):
-        if len(self.troop_queue) >= self.march_limit:
-            return True
-
-        return False
+        # a march due back before the next one could be started counts as returned
+        return self.march_tracker.free_slots(time.time() + MARCH_RETURN_LEAD) <= 0
 
     @staticmethod
     def _calc_distance(from_loc, to_loc):
@@ -520,9 +470,15 @@ class LokFarmer:
 
         new_task = res.get('newTask')
         new_task['endTime'] = new_task['expectedEnded']
-        self.troop_queue.append(new_task)
+        self.march_tracker.add(new_task)
 
-    def _prepare_march_troops(self, each_obj, march_type=MARCH_TYPE_GATHER):
+        for troop in march_troops:
+            self.troops_sent[troop.get('code')] += troop.get('amount')
+
+    def _get_march_info(self, each_obj, march_type=MARCH_TYPE_GATHER):
+        """
+        :return: `field_march_info` of `each_obj`, None if it's not worth a march anymore
+        """
         march_info = self.api.field_march_info({
             'fromId': self.kingdom_enter.get('kingdom').get('fieldObjectId'),
             'toLoc': each_obj.get('loc')
@@ -531,24 +487,35 @@ class LokFarmer:
         expired_ts = arrow.get(march_info.get('fo').get('expired')).timestamp()
         if expired_ts < arrow.now().timestamp():
             logger.info(f'Expired: {march_info}')
-            return []
+            self.negative_cache.add(each_obj, 'expired')
+            return None
 
         if march_type == MARCH_TYPE_MONSTER:
             # check if monster is already dead
             if march_info.get('fo').get('code') != each_obj.get('code'):
-                return []
+                self.negative_cache.add(each_obj, 'dead')
+                return None
+
+        if not march_info.get('fo').get('param').get('value'):
+            # "value": 0, means no more resources or monster
+            self.negative_cache.add(each_obj, 'empty')
+            return None
+
+        self.available_troops = list(march_info.get('troops'))
 
-        troops = march_info.get('troops')
-        troops.sort(key=lambda x: x.get('code'), reverse=True)  # priority using high tier troops
+        return march_info
+
+    def _plan_march_troops(self, each_obj, march_info, troops, march_type=MARCH_TYPE_GATHER):
+        """
+        :param troops: the troops of `march_info` still at home
+        :return: march troops, empty if there are not enough
+        """
+        troops = sorted(troops, key=lambda x: x.get('code'), reverse=True)  # priority using high tier troops
 
         need_troop_count = march_info.get('fo').get('param').get('value')
         if march_type == MARCH_TYPE_MONSTER:
             need_troop_count *= 2.5
 
-        if not need_troop_count:
-            # "value": 0, means no more resources or monster
-            return []
-
         troop_count = sum([each_troop.get('amount') for each_troop in troops])
         # we don't care about insufficient troops when gathering
         if (march_type == MARCH_TYPE_MONSTER) and (need_troop_count > troop_count):
@@ -590,6 +557,10 @@ class LokFarmer:
             })
 
         march_troop_count = sum([each_troop.get('amount') for each_troop in march_troops])
+        if not march_troop_count:
+            logger.info(f'No troops left: {each_obj}')
+            return []
+
         if march_troop_count > self.march_size:
             logger.info(f'Troop count exceeded: {march_troop_count} > {self.march_size}: {each_obj}')
             return []
@@ -601,6 +572,13 @@ class LokFarmer:
 
         return march_troops
 
+    def _prepare_march_troops(self, each_obj, march_type=MARCH_TYPE_GATHER):
+        march_info = self._get_march_info(each_obj, march_type)
+        if not march_info:
+            return []
+
+        return self._plan_march_troops(each_obj, march_info, march_info.get('troops'), march_type)
+
     def _get_available_dragos(self):
         drago_lair_list = self.api.drago_lair_list()
         dragos = drago_lair_list.get('dragos')
@@ -608,45 +586,138 @@ class LokFarmer:
 
         return available_dragos
 
-    def _on_field_objects_gather(self, each_obj):
-        if each_obj.get('occupied'):
-            return False
-
-        if each_obj.get('code') == OBJECT_CODE_CRYSTAL_MINE and self.level < 11:
-            return False
-
+    def _validate_field_object(self, each_obj, target_code_set):
+        """
+        Everything checked before marching on `each_obj`, `field_march_info` included
+        :return: (march_type, march_info, troops sent so far) or None
+        """
+        code = each_obj.get('code')
+
+        if code == OBJECT_CODE_DRAGON_SOUL_CAVERN:
+            if self.drago_action_point < 1:
+                logger.info(f'no_drago_action_point, ignore: {each_obj}')
+                return None
+            if not self.available_dragos:
+                logger.info(f'not_available_drago, ignore: {each_obj}')
+                return None
+
+        reason = self.negative_cache.get(each_obj)
+        if reason:
+            logger.debug(f'{reason}, skip: {each_obj}')
+            return None
+
+        if code in set(OBJECT_MINE_CODE_LIST).intersection(target_code_set):
+            if each_obj.get('occupied'):
+                self.negative_cache.add(each_obj, 'occupied')
+                return None
+
+            if code == OBJECT_CODE_CRYSTAL_MINE and self.level < 11:
+                return None
+
+            march_type = MARCH_TYPE_GATHER
+        elif code in set(OBJECT_MONSTER_CODE_LIST).intersection(target_code_set):
+            march_type = MARCH_TYPE_MONSTER
+        else:
+            return None
+
+        troops_sent = self.troops_sent.copy()
+        march_info = self._get_march_info(each_obj, march_type)
+        if not march_info:
+            return None
+
+        return march_type, march_info, troops_sent
+
+    def _start_field_object_march(self, each_obj, context):
+        """
+        :param context: see `_validate_field_object`
+        :return: True if a march was started
+        """
+        march_type, march_info, troops_sent = context
+        code = each_obj.get('code')
         to_loc = each_obj.get('loc')
-        march_troops = self._prepare_march_troops(each_obj, MARCH_TYPE_GATHER)
+
+        # marches started since `field_march_info` took their troops away
+        sent_since = self.troops_sent - troops_sent
+        troops = [
+            dict(troop, amount=max(troop.get('amount') - sent_since[troop.get('code')], 0))
+            for troop in march_info.get('troops')
+        ]
+        march_troops = self._plan_march_troops(each_obj, march_info, troops, march_type)
 
         if not march_troops:
             return False
 
-        if each_obj.get('code') == OBJECT_CODE_DRAGON_SOUL_CAVERN:
-            self._start_march(to_loc, march_troops, MARCH_TYPE_GATHER, self.available_dragos[0]['_id'])
-            return True
+        # validated ahead of a return, let the march come back first
+        if not self.march_tracker.wait_for_free_slot(MARCH_RETURN_LEAD + lokbot.march_tracker.RETURN_GRACE):
+            raise OtherException('full_task')
 
-        self._start_march(to_loc, march_troops, MARCH_TYPE_GATHER)
+        if code == OBJECT_CODE_DRAGON_SOUL_CAVERN:
+            self._start_march(to_loc, march_troops, MARCH_TYPE_GATHER, self.available_dragos[0]['_id'])
+        elif march_type == MARCH_TYPE_GATHER:
+            self._start_march(to_loc, march_troops, MARCH_TYPE_GATHER)
+
+            # Tăng biến đếm khi khai thác thành công
+            self.mines_gathered += 1
+            # Ghi log tổng số mỏ đã khai thác
+            logger.info(f"Mỏ khai thác thành công: {code} tại {to_loc}. Tổng số mỏ đã khai thác: {self.mines_gathered}")
+        else:
+            self._start_march(to_loc, march_troops, MARCH_TYPE_MONSTER)
+
+            # Tăng biến đếm khi tấn công quái thành công
+            self.monsters_killed += 1
+            # Ghi log tổng số quái đã đánh
+            logger.info(f"Quái tấn công thành công: {code} tại {to_loc}. Tổng số quái đã đánh: {self.monsters_killed}")
+
+        logger.info(f'march_started {code}({each_obj.get("level")}): {each_obj}')
+        lokbot.field_index.get_index(self.socf_world_id).remove(each_obj.get('_id'))
+        # ours now, overlapping batches will see it again
+        self.negative_cache.add(each_obj, 'occupied')
 
-        # Tăng biến đếm khi khai thác thành công
-        self.mines_gathered += 1
-        # Ghi log tổng số mỏ đã khai thác
-        logger.info(f"Mỏ khai thác thành công: {each_obj.get('code')} tại {to_loc}. Tổng số mỏ đã khai thác: {self.mines_gathered}")
         return True
 
-    def _on_field_objects_monster(self, each_obj):
-        to_loc = each_obj.get('loc')
-        march_troops = self._prepare_march_troops(each_obj, MARCH_TYPE_MONSTER)
+    def _on_field_object_error(self, each_obj, error_code):
+        # about this object rather than the kingdom, most likely gone since
+        self.negative_cache.add(each_obj, 'march_start')
+        lokbot.field_index.get_index(self.socf_world_id).remove(each_obj.get('_id'))
+
+    def _share_field_objects(self, objects, chat_channels):
+        for each_obj in objects:
+            code = each_obj.get('code')
+            loc = each_obj.get('loc')
+
+            for chat_channel in chat_channels:
+                text = f'Lv.{each_obj.get("level")}?fo_{code}'
+                obj_hash = f'{text}_{loc[0]}_{loc[1]}_{loc[2]}'
+                if obj_hash in self.shared_objects:
+                    # already shared
+                    continue
 
-        if not march_troops:
-            return False
+                self.shared_objects.add(obj_hash)
+                self.api.chat_new(chat_channel, CHAT_TYPE_LOC, text, {'loc': loc})
 
-        self._start_march(to_loc, march_troops, MARCH_TYPE_MONSTER)
-        
-        # Tăng biến đếm khi tấn công quái thành công
-        self.monsters_killed += 1
-        # Ghi log tổng số quái đã đánh
-        logger.info(f"Quái tấn công thành công: {each_obj.get('code')} tại {to_loc}. Tổng số quái đã đánh: {self.monsters_killed}")
-        return True
+    def _march_to_known_targets(self, targets):
+        """
+        Start marches on the nearest targets already in the field index, before scanning for new ones
+        :return:
+        """
+        from_loc = self.kingdom_enter.get('kingdom').get('loc')
+        target_code_set = set([target['code'] for target in targets])
+        free_slots = self.march_tracker.free_slots(time.time() + MARCH_RETURN_LEAD)
+
+        field_index = lokbot.field_index.get_index(self.socf_world_id)
+        known = field_index.nearest(from_loc[1], from_loc[2], free_slots * 4, targets)
+        if not known:
+            return
+
+        ranked = lokbot.ranking.rank(known, from_loc, self.available_troops, self.march_size, self.xp_value)
+        self._wait_for_batch(self.march_dispatcher.submit(ranked, target_code_set))
+
+    def _wait_for_batch(self, batch):
+        batch.wait()
+
+        if str(batch.stopped) == 'full_task':
+            # a march is out longer than the tracker thought
+            self._update_march_limit()
 
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(4),
@@ -661,19 +732,22 @@ class LokFarmer:
         """
         url = self.kingdom_enter.get('networks').get('kingdoms')[0]
 
-        sio = socketio.Client(reconnection=False, logger=sock_logger, engineio_logger=sock_logger)
+        sio = lokbot.recorder.socketio_client(
+            'kingdom', lambda: self.api.xor_password, reconnection=False, logger=sock_logger, engineio_logger=sock_logger
+        )
 
-        @sio.on('/building/update')
+        # the state updates are applied in the order received, a task finishing wakes up threads reading the buildings
+        @self.kingdom_events.on(sio, '/building/update', queue='state')
         def on_building_update(data):
             logger.debug(data)
             self._update_kingdom_enter_building(data)
 
-        @sio.on('/resource/upgrade')
+        @self.kingdom_events.on(sio, '/resource/upgrade', queue='state')
         def on_resource_update(data):
             logger.debug(data)
-            self.resources[data.get('resourceIdx')] = data.get('value')
+            self.state.set_resource(data.get('resourceIdx'), data.get('value'))
 
-        @sio.on('/buff/list')
+        @self.kingdom_events.on(sio, '/buff/list', coalesce=True)
         def on_buff_list(data):
             logger.debug(f'on_buff_list: {data}')
 
@@ -709,7 +783,7 @@ class LokFarmer:
                     if code == ITEM_CODE_GOLDEN_HAMMER:
                         self.has_additional_building_queue = True
 
-        @sio.on('/alliance/rally/new')
+        @self.kingdom_events.on(sio, '/alliance/rally/new')
         def on_alliance_rally_new(data):
             code = data.get('code')
             if code not in join_rally_code_list:
@@ -747,9 +821,16 @@ class LokFarmer:
                         except Exception as e:
                             logger.error(f'Error joining rally {rally_id}: {e}')
 
-        @sio.on('/task/update')
+        @self.kingdom_events.on(sio, '/task/update', queue='state')
         def on_task_update(data):
             logger.debug(data)
+            self.api.response_cache.invalidate('kingdom_task_all')
+
+            if self.march_tracker.update(data):
+                logger.info(f'march returned: {data.get("_id")}')
+            else:
+                self.state.update_task(data)
+
             if data.get('status') == STATUS_FINISHED:
                 if data.get('code') in (TASK_CODE_SILVER_HAMMER, TASK_CODE_GOLD_HAMMER):
                     self.building_queue_available.set()
@@ -767,174 +848,131 @@ class LokFarmer:
         logger.warning('sock_thread disconnected, reconnecting')
         raise tenacity.TryAgain()
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(4),
-        wait=tenacity.wait_random_exponential(multiplier=1, max=60),
-        retry=tenacity.retry_if_not_exception_type(FatalApiException),
-        reraise=True
-    )
-    def socf_thread(self, radius, targets, share_to=None):
-        """
-        websocket connection of the field
-        :return:
-        """
+    def _wait_for_field(self):
         while self.api.last_requested_at + 16 > time.time():
             # if last request is less than 16 seconds ago, wait
             # when we are in the field, we should not be doing anything else
             logger.info(f'last requested at {arrow.get(self.api.last_requested_at).humanize()}, waiting...')
             time.sleep(4)
 
-        self._update_march_limit()
-
-        while self._is_march_limit_exceeded():
-            nearest_end_time = sorted(
-                self.troop_queue,
-                key=lambda x: x.get('endTime') if x.get('endTime') else '9999-99-99T99:99:99.999Z'
-            )[0].get('endTime')
-            seconds = self.calc_time_diff_in_seconds(nearest_end_time)
-            logger.info(f'_is_march_limit_exceeded: wait {seconds} seconds')
-            time.sleep(seconds)
-            self._update_march_limit()
+    def _on_field_objects(self, data, targets, share_to=None):
+        """
+        Index the objects of a scan and hand the wanted ones to the march dispatcher
+        :return: `lokbot.dispatcher.Batch`
+        """
+        objects = lokbot.field_pack.iter_objects(data.get('packs'), self.api.xor_password)
+        target_code_set = set([target['code'] for target in targets])
+
+        logger.debug('Processing objects')
+        field_index = lokbot.field_index.get_index(self.socf_world_id)
+        candidates = []
+        to_share = []
+        for each_obj in objects:
+            code = each_obj.get('code')
+            level = each_obj.get('level')
+            loc = each_obj.get('loc')
+
+            field_index.add(each_obj)
+
+            level_whitelist = [target['level'] for target in targets if target['code'] == code]
+            if not level_whitelist:
+                # not the one we are looking for
+                continue
 
-        self.socf_entered = False
-        self.socf_world_id = self.kingdom_enter.get('kingdom').get('worldId')
-        url = self.kingdom_enter.get('networks').get('fields')[0]
-        from_loc = self.kingdom_enter.get('kingdom').get('loc')
+            if not level_whitelist[0] or level in level_whitelist[0]:
+                self.zone_hits[lokbot.geometry.zone_id_by_coords(loc[1], loc[2])] += 1
 
-        if not self.zones:
-            logger.info('getting nearest zone')
-            self.zones = self._get_nearest_zone_ng(from_loc[1], from_loc[2], radius)
+            if each_obj.get('occupied'):
+                self.negative_cache.add(each_obj, 'occupied')
 
-        sio = socketio.Client(reconnection=False, logger=socf_logger, engineio_logger=socf_logger)
+            if self._is_march_limit_exceeded():
+                continue
 
-        @sio.on('/field/objects/v4')
-        def on_field_objects(data):
-            packs = data.get('packs')
-            gzip_decompress = gzip.decompress(bytearray(packs))
-            data_decoded = self.api.b64xor_dec(gzip_decompress)
-            objects = data_decoded.get('objects')
-            target_code_set = set([target['code'] for target in targets])
+            if share_to and share_to.get('chat_channels'):
+                to_share.append(each_obj)
 
-            logger.debug(f'Processing {len(objects)} objects')
-            for each_obj in objects:
-                if self._is_march_limit_exceeded():
-                    continue
+            level_whitelist = level_whitelist[0]
+            if level_whitelist and level not in level_whitelist:
+                logger.info(f'level not in whitelist, ignore: {each_obj}')
+                continue
 
-                code = each_obj.get('code')
-                level = each_obj.get('level')
-                loc = each_obj.get('loc')
+            candidates.append(each_obj)
 
-                level_whitelist = [target['level'] for target in targets if target['code'] == code]
-                if not level_whitelist:
-                    # not the one we are looking for
-                    continue
+        if to_share:
+            self.scheduler.call_soon(
+                self._share_field_objects, (to_share, share_to.get('chat_channels')),
+                name=f'{self._id}:_share_field_objects'
+            )
 
-                if share_to and share_to.get('chat_channels'):
-                    for chat_channel in share_to.get('chat_channels'):
-                        text = f'Lv.{level}?fo_{code}'
-                        obj_hash = f'{text}_{loc[0]}_{loc[1]}_{loc[2]}'
-                        if obj_hash in self.shared_objects:
-                            # already shared
-                            continue
-
-                        self.shared_objects.add(obj_hash)
-                        self.api.chat_new(chat_channel, CHAT_TYPE_LOC, text, {'loc': loc})
-
-                if code == OBJECT_CODE_DRAGON_SOUL_CAVERN:
-                    if self.drago_action_point < 1:
-                        logger.info(f'no_drago_action_point, ignore: {each_obj}')
-                        continue
-                    if not self.available_dragos:
-                        logger.info(f'not_available_drago, ignore: {each_obj}')
-                        continue
-
-                level_whitelist = level_whitelist[0]
-                if level_whitelist and level not in level_whitelist:
-                    logger.info(f'level not in whitelist, ignore: {each_obj}')
-                    continue
+        from_loc = self.kingdom_enter.get('kingdom').get('loc')
+        ranked = lokbot.ranking.rank(candidates, from_loc, self.available_troops, self.march_size, self.xp_value)
 
-                res = False
-                try:
-                    if code in set(OBJECT_MINE_CODE_LIST).intersection(target_code_set):
-                        res = self._on_field_objects_gather(each_obj)
-
-                    if code in set(OBJECT_MONSTER_CODE_LIST).intersection(target_code_set):
-                        res = self._on_field_objects_monster(each_obj)
-                except OtherException as error_code:
-                    if str(error_code) in (
-                            'full_task', 'not_enough_troop', 'insufficient_actionpoint', 'not_open_gate',
-                            'no_drago_action_point', 'no_drago', 'exceed_crystal_daily_quota',
-                            'not_available_drago'
-                    ):
-                        logger.warning(f'on_field_objects: {error_code}, skip')
-                        self.field_object_processed = True
-                        return
-                    raise
-                else:
-                    if res is True:
-                        logger.info(f'march_started {code}({level}): {each_obj}')
+        return self.march_dispatcher.submit(ranked, target_code_set)
 
-            self.field_object_processed = True
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(4),
+        wait=tenacity.wait_random_exponential(multiplier=1, max=60),
+        retry=tenacity.retry_if_not_exception_type(FatalApiException),
+        reraise=True
+    )
+    def socf_thread(self, radius, targets, share_to=None, xp_value=None):
+        """
+        websocket connection of the field
+        :param xp_value: resources one monster xp is worth in the ranking, None ranks mines and monsters among their own
+        :return:
+        """
+        self.xp_value = xp_value
+        if self.march_tracker.needs_reconcile():
+            self._update_march_limit()
 
-        @sio.on('/field/enter/v3')
-        def on_field_enter(data):
-            data_decoded = self.api.b64xor_dec(data)
-            logger.debug(f'field_enter_v3: {data_decoded}')
-            self.socf_world_id = data_decoded.get('loc')[0]  # in case of cvc event world map
+        while self._is_march_limit_exceeded():
+            if self.march_tracker.needs_reconcile():
+                self._update_march_limit()
+                continue
 
-            # knock
-            sio.emit('/zone/leave/list/v2', {'world': self.socf_world_id, 'zones': '[]'})
-            default_zones = '[0,64,1,65]'
-            sio.emit('/zone/enter/list/v4', self.api.b64xor_enc({'world': self.socf_world_id, 'zones': default_zones}))
-            sio.emit('/zone/leave/list/v2', {'world': self.socf_world_id, 'zones': default_zones})
+            seconds = max(self.march_tracker.next_free_slot_at() - MARCH_RETURN_LEAD - time.time(), 1)
+            logger.info(f'_is_march_limit_exceeded: wait up to {seconds:.0f} seconds')
+            # an unknown return is waited for until the next reconcile
+            self.march_tracker.wait_for_free_slot(seconds)
 
-            self.socf_entered = True
+        if self.field_session is None:
+            self.socf_world_id = self.kingdom_enter.get('kingdom').get('worldId')
+            self.field_session = lokbot.field_session.FieldSession(
+                self.kingdom_enter.get('networks').get('fields')[0], self.api, lambda: self.token,
+                headers=ws_headers, before_connect=self._wait_for_field
+            )
 
-        sio.connect(f'{url}?token={self.token}', transports=["websocket"], headers=ws_headers)
-        logger.debug(f'entering field: {self.zones}')
-        sio.emit('/field/enter/v3', self.api.b64xor_enc({'token': self.token}))
-
-        while not self.socf_entered:
-            time.sleep(1)
-
-        step = 9
-        grace = 7  # 9 times enter-leave action will cause ban
-        index = 0
-        while self.zones:
-            if index >= grace:
-                logger.info('socf_thread grace exceeded, break')
-                break
+        self._march_to_known_targets(targets)
+        if self._is_march_limit_exceeded():
+            logger.info('march limit reached with known targets, skip scanning')
+            return
+        from_loc = self.kingdom_enter.get('kingdom').get('loc')
 
-            index += 1
-            zone_ids = []
-            for _ in range(step):
-                if not self.zones:
-                    break
+        if self.zone_scheduler is None:
+            logger.info('ranking nearest zones')
+            self.zone_scheduler = lokbot.zone_scheduler.ZoneScheduler(
+                from_loc[1], from_loc[2], radius, self._get_land_levels()
+            )
 
-                zone_ids.append(self.zones.pop(0))
+        # loops share the connection until its zone enters run out, the reconnect waits for the field to be quiet
+        self.field_session.ensure_connected()
+        self.socf_world_id = self.field_session.world_id
 
-            if len(zone_ids) < step:
-                logger.info(f'len(zone_ids) < {step}, break')
-                self.zones = []
-                break
+        batches = self.zone_scheduler.next_batches(min(ZONE_BATCHES_PER_LOOP, self.field_session.remaining_enters))
 
-            if not sio.connected:
-                logger.warning('socf_thread disconnected, reconnecting')
-                raise tenacity.TryAgain()
+        for zone_ids in batches:
+            self.zone_hits.clear()
+            logger.debug(f'entering zone: {zone_ids}')
+            data = self.field_session.scan(zone_ids)
+            self.socf_world_id = self.field_session.world_id
 
-            message = {'world': self.socf_world_id, 'zones': json.dumps(zone_ids, separators=(',', ':'))}
-            encoded_message = self.api.b64xor_enc(message)
+            if data is not None:
+                # the session is free for the next scan as soon as the marches are started
+                self._wait_for_batch(self._on_field_objects(data, targets, share_to))
 
-            sio.emit('/zone/enter/list/v4', encoded_message)
-            self.field_object_processed = False
-            logger.debug(f'entering zone: {zone_ids} and waiting for processing')
-            while not self.field_object_processed:
-                time.sleep(1)
-            sio.emit('/zone/leave/list/v2', message)
+            self.zone_scheduler.record(zone_ids, self.zone_hits)
 
         logger.info('a loop is finished')
-        sio.disconnect()
-        sio.wait()
 
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(4),
@@ -949,7 +987,9 @@ class LokFarmer:
         """
         url = self.kingdom_enter.get('networks').get('chats')[0]
 
-        sio = socketio.Client(reconnection=False, logger=socc_logger, engineio_logger=socc_logger)
+        sio = lokbot.recorder.socketio_client(
+            'chat', lambda: self.api.xor_password, reconnection=False, logger=socc_logger, engineio_logger=socc_logger
+        )
 
         # no token needed in query string, yet
         sio.connect(url, transports=["websocket"], headers=ws_headers)
@@ -964,7 +1004,7 @@ class LokFarmer:
         收获资源
         :return:
         """
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
+        buildings = list(self.state.snapshot.buildings)
 
         random.shuffle(buildings)
 
@@ -998,7 +1038,7 @@ class LokFarmer:
         if len([self.api.quest_claim(q) for q in quest_list.get('sideQuests') if
                 q.get('status') == STATUS_FINISHED]) >= 5:
             # 若五个均为已完成, 则翻页
-            threading.Thread(target=self.quest_monitor_thread).start()
+            self._call_later(0, self.quest_monitor_thread)
             return
 
         quest_list_daily = self.api.quest_list_daily().get('dailyQuest')
@@ -1007,7 +1047,7 @@ class LokFarmer:
         if len([self.api.quest_claim_daily(q) for q in quest_list_daily.get('quests') if
                 q.get('status') == STATUS_FINISHED]) >= 5:
             # 若五个均为已完成, 则翻页
-            threading.Thread(target=self.quest_monitor_thread).start()
+            self._call_later(0, self.quest_monitor_thread)
             return
 
         # daily quest reward
@@ -1032,13 +1072,68 @@ class LokFarmer:
             ) for each in event_info.get('event').get('events') if each.get('code') in finished_code]
 
         logger.info('quest_monitor: done, sleep for 1h')
-        threading.Timer(3600, self.quest_monitor_thread).start()
+        self._call_later(3600, self.quest_monitor_thread)
         return
 
+    @staticmethod
+    def _planned_building(code, level, snapshot):
+        """
+        :return: the building to take to `level` for the plan, None if there is none right now
+        """
+        built = snapshot.buildings_by_code.get(code)
+        if built:
+            highest = max(built, key=lambda b: b.get('level'))
+            return dict(highest) if highest.get('level') == level - 1 else None
+
+        positions = [
+            position.get('position')
+            for level_requirement, each_positions in BUILD_POSITION_UNLOCK_MAP.items()
+            if snapshot.building_level(BUILDING_CODE_MAP['castle']) >= level_requirement
+            for position in each_positions if position.get('code') == code
+        ]
+        positions += [BUILDING_POSITION_MAP[name] for name, each in BUILDING_CODE_MAP.items()
+                      if each == code and name in BUILDING_POSITION_MAP]
+
+        for position in positions:
+            if position not in snapshot.buildings_by_position:
+                return {'code': code, 'position': position, 'level': 0, 'state': BUILDING_STATE_NORMAL}
+
+        return None
+
+    def _building_planner_worker(self, snapshot, buildings, speedup):
+        """
+        Start the most critical upgrade of the plan
+        :return: True if one was started, False if the queue is full, None if none of the plan could be
+        """
+        self.build_planner.update(snapshot)
+
+        for code, level in self.build_planner.ready():
+            building = self._planned_building(code, level, snapshot)
+            if building is None:
+                continue
+
+            res = self._upgrade_building(building, buildings, speedup)
+
+            if res == 'continue':
+                continue
+            if res == 'break':
+                return False
+
+            return True
+
+        return None
+
     def _building_farmer_worker(self, speedup=False):
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
-        buildings.sort(key=lambda x: x.get('level'))
-        kingdom_level = [b for b in buildings if b.get('code') == BUILDING_CODE_MAP['castle']][0].get('level')
+        snapshot = self.state.snapshot
+        buildings = sorted(snapshot.buildings, key=lambda x: x.get('level'))
+        kingdom_level = snapshot.building_level(BUILDING_CODE_MAP['castle'])
+
+        if self.build_planner is not None:
+            res = self._building_planner_worker(snapshot, buildings, speedup)
+            if res is not None:
+                return res
+
+            # nothing of the plan can start now, keep the hammers busy with the rest
 
         # First check if there is any empty position available for building
         for level_requirement, positions in BUILD_POSITION_UNLOCK_MAP.items():
@@ -1046,7 +1141,7 @@ class LokFarmer:
                 continue
 
             for position in positions:
-                if position.get('position') in [building.get('position') for building in buildings]:
+                if position.get('position') in snapshot.buildings_by_position:
                     continue
 
                 building = {
@@ -1078,119 +1173,129 @@ class LokFarmer:
 
         return False
 
-    def building_farmer_thread(self, speedup=False):
+    def building_farmer_thread(self, speedup=False, target_castle_level=None):
         """
         building farmer
         :param speedup:
+        :param target_castle_level: upgrade along the critical path to this castle level first
         :return:
         """
-        self.kingdom_tasks = self.api.kingdom_task_all().get('kingdomTasks', [])
+        if target_castle_level and self.build_planner is None:
+            self.build_planner = lokbot.build_planner.BuildPlanner(BUILDING_CODE_MAP['castle'], target_castle_level)
 
-        silver_in_use = [t for t in self.kingdom_tasks if t.get('code') == TASK_CODE_SILVER_HAMMER]
-        gold_in_use = [t for t in self.kingdom_tasks if t.get('code') == TASK_CODE_GOLD_HAMMER]
+        self._get_kingdom_tasks()
+
+        silver_in_use = self.state.snapshot.tasks_of(TASK_CODE_SILVER_HAMMER)
+        gold_in_use = self.state.snapshot.tasks_of(TASK_CODE_GOLD_HAMMER)
 
         if not silver_in_use or (self.has_additional_building_queue and not gold_in_use):
             if not self._building_farmer_worker(speedup):
                 logger.info(f'no building to upgrade, sleep for 2h')
-                threading.Timer(7200, self.building_farmer_thread).start()
+                self._call_later(7200, self.building_farmer_thread, [speedup, target_castle_level])
                 return
 
-        self.building_queue_available.wait()  # wait for building queue available from `sock_thread`
-        self.building_queue_available.clear()
-        threading.Thread(target=self.building_farmer_thread, args=[speedup]).start()
+        # wait for building queue available from `sock_thread`
+        self.building_queue_available.then(self.building_farmer_thread, [speedup, target_castle_level])
 
-    def academy_farmer_thread(self, to_max_level=False, speedup=False):
+    def academy_farmer_thread(self, to_max_level=False, speedup=False, objective='power_per_second',
+                              target_research=None, target_research_level=None):
         """
         research farmer
         :param to_max_level:
         :param speedup:
+        :param objective: power_per_second, or target to research towards `target_research` first
+        :param target_research: research code
+        :param target_research_level: max level if not set
         :return:
         """
-        self.kingdom_tasks = self.api.kingdom_task_all().get('kingdomTasks', [])
+        args = [to_max_level, speedup, objective, target_research, target_research_level]
+        if self.research_planner is None:
+            self.research_planner = lokbot.research_planner.ResearchPlanner(
+                lokbot.research_planner.minimum_levels(to_max_level)
+            )
 
-        worker_used = [t for t in self.kingdom_tasks if t.get('code') == TASK_CODE_ACADEMY]
+        self._get_kingdom_tasks()
+        worker_used = self.state.snapshot.tasks_of(TASK_CODE_ACADEMY)
 
         if worker_used:
             if worker_used[0].get('status') != STATUS_CLAIMED:
-                self.research_queue_available.wait()  # wait for research queue available from `sock_thread`
-                self.research_queue_available.clear()
-                threading.Thread(target=self.academy_farmer_thread, args=[to_max_level, speedup]).start()
+                # wait for research queue available from `sock_thread`
+                self.research_queue_available.then(self.academy_farmer_thread, args)
                 return
 
             # 如果已完成, 则领取奖励并继续
             self.api.kingdom_task_claim(BUILDING_POSITION_MAP['academy'])
+            self.state.remove_tasks(TASK_CODE_ACADEMY)
 
-        exist_researches = self.api.kingdom_academy_research_list().get('researches', [])
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
-        academy_level = [b for b in buildings if b.get('code') == BUILDING_CODE_MAP['academy']][0].get('level')
+            if self.research_in_progress:
+                self.research_planner.complete(*self.research_in_progress)
+                self.research_in_progress = None
+            else:
+                # started before we were, no idea which one
+                self.research_planner.synced = False
+
+        academy_level = self.state.snapshot.building_level(BUILDING_CODE_MAP['academy'])
+        if not self.research_planner.synced:
+            exist_researches = self.api.kingdom_academy_research_list().get('researches', [])
+            self.research_planner.sync(exist_researches, academy_level)
+        else:
+            self.research_planner.set_academy_level(academy_level)
+
+        target = None
+        if target_research:
+            target = (target_research, target_research_level or len(research_json[target_research]))
+
+        for research_code, level in self.research_planner.candidates(objective, target):
+            research_level_json = research_json[research_code][level - 1]
+            if research_level_json.items:
+                continue
 
-        for category_name, each_category in RESEARCH_CODE_MAP.items():
-            # Skip advanced research category
-            if category_name == 'advanced':
+            reservation = self.ledger.reserve(research_level_json.resources, f'research {research_code}({level})')
+            if reservation is None:
                 continue
-                
-            for research_name, research_code in each_category.items():
-                if not self._is_researchable(
-                        academy_level, category_name, research_name, exist_researches, to_max_level
-                ):
-                    continue
 
-                try:
-                    res = self.api.kingdom_academy_research({'code': research_code})
-                except OtherException as error_code:
-                    if str(error_code) == 'not_enough_condition':
-                        logger.warning(f'category {category_name} reached max level')
-                        break
+            try:
+                res = self.api.kingdom_academy_research({'code': research_code})
+            except OtherException as error_code:
+                if str(error_code) == 'not_enough_condition':
+                    # researched somewhere else, catch up next time
+                    self.research_planner.synced = False
 
-                    logger.info(f'research failed, try next one, current: {research_name}({research_code})')
-                    continue
+                logger.info(f'research failed, try next one, current: {research_code}({level}), {error_code}')
+                continue
+            else:
+                reservation.commit(res)
+            finally:
+                reservation.release()
 
-                if speedup:
-                    self.do_speedup(res.get('newTask').get('expectedEnded'), res.get('newTask').get('_id'), 'research')
+            self.research_in_progress = (research_code, level)
 
-                self.research_queue_available.wait()  # wait for research queue available from `sock_thread`
-                self.research_queue_available.clear()
-                threading.Thread(target=self.academy_farmer_thread, args=[to_max_level, speedup]).start()
-                return
+            if speedup:
+                self.do_speedup(res.get('newTask').get('expectedEnded'), res.get('newTask').get('_id'), 'research')
+
+            # wait for research queue available from `sock_thread`
+            self.research_queue_available.then(self.academy_farmer_thread, args)
+            return
 
         logger.info('academy_farmer: no research to do, sleep for 2h')
-        threading.Timer(2 * 3600, self.academy_farmer_thread, [to_max_level]).start()
+        self._call_later(2 * 3600, self.academy_farmer_thread, args)
         return
 
     def _troop_training_capacity(self):
         """
         return total troop training capacity of all barracks
         """
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
         troop_training_capacity = 0
-        for building in buildings:
-            if building['code'] == BUILDING_CODE_MAP['barrack']:
-                troop_training_capacity += BARRACK_LEVEL_TROOP_TRAINING_RATE_MAP[int(building['level'])]
+        for building in self.state.snapshot.buildings_by_code.get(BUILDING_CODE_MAP['barrack'], ()):
+            troop_training_capacity += BARRACK_LEVEL_TROOP_TRAINING_RATE_MAP[int(building['level'])]
 
         return troop_training_capacity
 
-    def _total_troops_capacity_according_to_resources(self, troop_code):
-        """
-        return maximum number of troops according to resources
-        """
-        req_resources = TRAIN_TROOP_RESOURCE_REQUIREMENT[troop_code]
-
-        amount = None
-        for req_resource, resource in zip(req_resources, self.resources):
-            if req_resource == 0:
-                continue
-
-            if amount is None or resource // req_resource <= amount:
-                amount = resource // req_resource
-
-        return amount if amount is not None else 0
-
     def _random_choice_building(self, building_code):
         """
         return a random building object with the building_code
         """
-        buildings = self.kingdom_enter.get('kingdom', {}).get('buildings', [])
-        return random.choice([building for building in buildings if building['code'] == building_code])
+        return random.choice(self.state.snapshot.buildings_by_code[building_code])
 
     def train_troop_thread(self, troop_code, speedup=False, interval=3600):
         """
@@ -1200,53 +1305,50 @@ class LokFarmer:
         :param speedup:
         :return:
         """
-        while self.api.last_requested_at + 4 > time.time():
-            # attempt to prevent `insufficient_resources` due to race conditions
-            logger.info(f'last requested at {arrow.get(self.api.last_requested_at).humanize()}, waiting...')
-            time.sleep(4)
-
-        self.kingdom_tasks = self.api.kingdom_task_all().get('kingdomTasks', [])
-
-        worker_used = [t for t in self.kingdom_tasks if t.get('code') == TASK_CODE_CAMP]
+        self._get_kingdom_tasks()
+        worker_used = self.state.snapshot.tasks_of(TASK_CODE_CAMP)
 
         troop_training_capacity = self._troop_training_capacity()
 
         if worker_used:
             if worker_used[0].get('status') == STATUS_CLAIMED:
                 self.api.kingdom_task_claim(self._random_choice_building(BUILDING_CODE_MAP['barrack'])['position'])
+                self.state.remove_tasks(TASK_CODE_CAMP)
                 logger.info(f'train_troop: one loop completed, sleep for {interval} seconds')
-                threading.Timer(interval, self.train_troop_thread, [troop_code, speedup, interval]).start()
+                self._call_later(interval, self.train_troop_thread, [troop_code, speedup, interval])
                 return
 
             if worker_used[0].get('status') == STATUS_PENDING:
-                self.train_queue_available.wait()  # wait for train queue available from `sock_thread`
-                self.train_queue_available.clear()
-                threading.Thread(target=self.train_troop_thread, args=[troop_code, speedup, interval]).start()
+                # wait for train queue available from `sock_thread`
+                self.train_queue_available.then(self.train_troop_thread, [troop_code, speedup, interval])
                 return
 
         # if there are not enough resources, train how much possible
-        total_troops_capacity_according_to_resources = self._total_troops_capacity_according_to_resources(troop_code)
-        if troop_training_capacity > total_troops_capacity_according_to_resources:
-            troop_training_capacity = total_troops_capacity_according_to_resources
+        troop_training_capacity, reservation = self.ledger.reserve_units(
+            TRAIN_TROOP_RESOURCE_REQUIREMENT[troop_code], troop_training_capacity, f'train {troop_code}'
+        )
 
         if not troop_training_capacity:
             logger.info('train_troop: no resource, sleep for 1h')
-            threading.Timer(3600, self.train_troop_thread, [troop_code, speedup, interval]).start()
+            self._call_later(3600, self.train_troop_thread, [troop_code, speedup, interval])
             return
 
         try:
             res = self.api.train_troop(troop_code, troop_training_capacity)
         except OtherException as error_code:
             logger.info(f'train_troop: {error_code}, sleep for 1h')
-            threading.Timer(3600, self.train_troop_thread, [troop_code, speedup, interval]).start()
+            self._call_later(3600, self.train_troop_thread, [troop_code, speedup, interval])
             return
+        else:
+            reservation.commit(res)
+        finally:
+            reservation.release()
 
         if speedup:
             self.do_speedup(res.get('newTask').get('expectedEnded'), res.get('newTask').get('_id'), 'train')
 
-        self.train_queue_available.wait()  # wait for train queue available from `sock_thread`
-        self.train_queue_available.clear()
-        threading.Thread(target=self.train_troop_thread, args=[troop_code, speedup, interval]).start()
+        # wait for train queue available from `sock_thread`
+        self.train_queue_available.then(self.train_troop_thread, [troop_code, speedup, interval])
 
     def free_chest_farmer_thread(self, _type=0):
         """
@@ -1258,7 +1360,7 @@ class LokFarmer:
         except OtherException as error_code:
             if str(error_code) == 'free_chest_not_yet':
                 logger.info('free_chest_farmer: free_chest_not_yet, sleep for 2h')
-                threading.Timer(2 * 3600, self.free_chest_farmer_thread).start()
+                self._call_later(2 * 3600, self.free_chest_farmer_thread)
                 return
 
             raise
@@ -1270,10 +1372,9 @@ class LokFarmer:
         }
         next_type = min(next_dict, key=next_dict.get)
 
-        threading.Timer(
-            self.calc_time_diff_in_seconds(next_dict[next_type]),
-            self.free_chest_farmer_thread, [next_type]
-        ).start()
+        self._call_later(
+            self.calc_time_diff_in_seconds(next_dict[next_type]), self.free_chest_farmer_thread, [next_type]
+        )
 
     def use_resource_in_item_list(self):
         """
@@ -1341,10 +1442,17 @@ class LokFarmer:
             if resource_index == -1:
                 continue
 
-            if each_item.get('cost') > self.resources[resource_index]:
+            amounts = [0, 0, 0, 0]
+            amounts[resource_index] = each_item.get('cost')
+            reservation = self.ledger.reserve(amounts, f'caravan {each_item.get("code")}')
+            if reservation is None:
                 continue
 
-            self.api.kingdom_caravan_buy(each_item.get('_id'))
+            try:
+                res = self.api.kingdom_caravan_buy(each_item.get('_id'))
+                reservation.commit(res)
+            finally:
+                reservation.release()
 
     def mail_claim(self):
         self.api.mail_claim_all(1)  # report
@@ -1394,7 +1502,7 @@ class LokFarmer:
                 except OtherException as error:
                     if str(error) == 'yet_in_cooltime':
                         logger.info(f'Skill {skill_id} in cooldown, scheduling retry in 1h')
-                        threading.Timer(3600, self.skill_use, [(skill_id,)]).start()
+                        self._call_later(3600, self.skill_use, [(skill_id,)])
                     else:
                         logger.error(f'Error using skill {skill_id}: {error}')
                         raise
@@ -1456,7 +1564,21 @@ class LokFarmer:
             'current_time': current_time,
             'level': getattr(self, 'level', 'Unknown'),
             'alliance_id': self.alliance_id,
-            'resources': self.resources,
+            'resources': list(self.resources),
+            'state_version': self.state.snapshot.version,
+            'resource_ledger': self.ledger.stats(),
+            'build_plan': self.build_planner.stats() if self.build_planner else None,
+            'research_plan': self.research_planner.stats() if self.research_planner else None,
             'march_limit': self.march_limit,
-            'troop_queue_count': len(self.troop_queue)
+            'troop_queue_count': len(self.march_tracker),
+            'march_tracker': self.march_tracker.stats(),
+            'rate_limiter_queue_depth': self.api.rate_limiter.queue_depth(),
+            'response_cache': self.api.response_cache.stats(),
+            'single_flight_coalesced': self.api.single_flight.stats(),
+            'negative_cache': self.negative_cache.stats(),
+            'march_dispatcher': self.march_dispatcher.stats(),
+            'field_session': self.field_session.stats() if self.field_session else None,
+            'kingdom_events': self.kingdom_events.get_stats(),
+            'kingdom_events_queue_depth': self.kingdom_events.queue_depth(),
+            'scheduler_jobs': [repr(job) for job in self.scheduler.jobs() if job.name.startswith(self._id)],
         }
@@ -0,0 +1,150 @@
+import heapq
+import math
+import threading
+import time
+
+import arrow
+
+import lokbot.geometry
+from lokbot.enum import OBJECT_MINE_CODE_LIST, OBJECT_MONSTER_CODE_LIST
+
+INDEXED_CODES = frozenset(OBJECT_MINE_CODE_LIST + OBJECT_MONSTER_CODE_LIST)
+
+
+def matches(obj, targets):
+    """
+    :param targets: [{"code": ..., "level": [...]}] as in the `socf_thread` config, an empty level list matches all
+    :return:
+    """
+    for target in targets:
+        if target['code'] == obj.get('code') and (not target.get('level') or obj.get('level') in target['level']):
+            return True
+
+    return False
+
+
+class FieldIndex:
+    """
+    Mines and monsters seen on one world, bucketed by zone and dropped once expired
+    """
+
+    def __init__(self):
+        self.zones = {}  # zone_id -> {object_id: entry}
+        self.entries = {}
+        self.expiry = []  # heap of (expired_ts, object_id)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, obj):
+        if obj.get('code') not in INDEXED_CODES:
+            return
+
+        object_id = obj.get('_id')
+        loc = obj.get('loc')
+        expired = arrow.get(obj.get('expired')).timestamp() if obj.get('expired') else math.inf
+        entry = {
+            '_id': object_id,
+            'loc': loc,
+            'code': obj.get('code'),
+            'level': obj.get('level'),
+            'param': {'value': obj.get('param', {}).get('value')},
+            'occupied': obj.get('occupied'),
+            'expired': obj.get('expired'),
+            'expired_ts': expired,
+        }
+
+        with self.lock:
+            previous = self.entries.get(object_id)
+            self._remove(object_id)
+            self.entries[object_id] = entry
+            self.zones.setdefault(lokbot.geometry.zone_id_by_coords(loc[1], loc[2]), {})[object_id] = entry
+            # every entry already has its expiry in the heap, re-sightings mostly don't change it
+            if previous is None or previous['expired_ts'] != expired:
+                heapq.heappush(self.expiry, (expired, object_id))
+                self._compact()
+
+    def _compact(self):
+        # outdated expiries of objects seen again with a new one
+        if len(self.expiry) > 2 * len(self.entries) + 64:
+            self.expiry = [(entry['expired_ts'], object_id) for object_id, entry in self.entries.items()]
+            heapq.heapify(self.expiry)
+
+    def _remove(self, object_id):
+        entry = self.entries.pop(object_id, None)
+        if entry is None:
+            return
+
+        zone_id = lokbot.geometry.zone_id_by_coords(entry['loc'][1], entry['loc'][2])
+        self.zones[zone_id].pop(object_id, None)
+        if not self.zones[zone_id]:
+            del self.zones[zone_id]
+
+    def remove(self, object_id):
+        with self.lock:
+            self._remove(object_id)
+
+    def evict(self, now=None):
+        now = now or time.time()
+
+        with self.lock:
+            while self.expiry and self.expiry[0][0] <= now:
+                expired, object_id = heapq.heappop(self.expiry)
+                entry = self.entries.get(object_id)
+                # the object may have been seen again with a new expiry since
+                if entry and entry['expired_ts'] == expired:
+                    self._remove(object_id)
+
+    def nearest(self, x, y, k, targets, max_radius=lokbot.geometry.ZONES_PER_ROW):
+        """
+        Searches the zones ring by ring around (x, y) until the k nearest are known
+        :param targets: see `matches`
+        :return: up to k unoccupied entries matching `targets`, nearest first
+        """
+        self.evict()
+
+        size = lokbot.geometry.ZONES_PER_ROW
+        center_col, center_row = x // lokbot.geometry.ZONE_SIZE, y // lokbot.geometry.ZONE_SIZE
+        found = []
+
+        with self.lock:
+            for radius in range(max_radius + 1):
+                # every zone of this ring is at least this far away
+                if len(found) >= k and found[k - 1][0] <= (radius - 1) * lokbot.geometry.ZONE_SIZE:
+                    break
+
+                for row in range(max(center_row - radius, 0), min(center_row + radius, size - 1) + 1):
+                    for col in range(max(center_col - radius, 0), min(center_col + radius, size - 1) + 1):
+                        if max(abs(row - center_row), abs(col - center_col)) != radius:
+                            continue
+
+                        zone = self.zones.get(row * size + col)
+                        if not zone:
+                            continue
+
+                        for entry in zone.values():
+                            if entry['occupied'] or not matches(entry, targets):
+                                continue
+
+                            distance = math.hypot(entry['loc'][1] - x, entry['loc'][2] - y)
+                            found.append((distance, entry['_id'], entry))
+
+                found.sort(key=lambda each: each[:2])
+
+        return [entry for _, _, entry in found[:k]]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(world_id):
+    """
+    :return: the `FieldIndex` of `world_id`, shared by every farmer of the process
+    """
+    with _indexes_lock:
+        if world_id not in _indexes:
+            _indexes[world_id] = FieldIndex()
+
+        return _indexes[world_id]
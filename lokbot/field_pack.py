@@ -0,0 +1,178 @@
+import base64
+import codecs
+import json
+import re
+import typing
+import zlib
+
+import lokbot.codec
+
+OBJECTS_ARRAY_PATTERN = re.compile(r'"objects"\s*:\s*\[')
+WHITESPACE_AND_COMMA = ' \t\r\n,'
+
+_json_decoder = json.JSONDecoder()
+
+
+def _iter_plain_chunks(packs: typing.Iterable[int], password: str, chunk_size: int) -> typing.Iterator[str]:
+    """
+    int list -> contiguous buffer -> incremental gunzip -> base64 -> XOR -> utf-8 text, chunk by chunk
+    """
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+
+    pending = bytes(packs)
+    b64_remainder = b''
+    offset = 0
+
+    while True:
+        compressed_done = not pending
+        chunk = decompressor.flush() if compressed_done else decompressor.decompress(pending, chunk_size)
+        if not compressed_done:
+            pending = decompressor.unconsumed_tail
+
+        b64_chunk = b64_remainder + chunk
+        usable = len(b64_chunk) - len(b64_chunk) % 4 if not compressed_done else len(b64_chunk)
+        b64_remainder = b64_chunk[usable:]
+
+        cipher = base64.b64decode(b64_chunk[:usable])
+        plain = lokbot.codec.xor(cipher, password, offset)
+        offset += len(cipher)
+
+        yield text_decoder.decode(plain, final=compressed_done)
+
+        if compressed_done:
+            return
+
+
+def iter_objects(packs: typing.Iterable[int], password: str, chunk_size: int = 16 * 1024) -> typing.Iterator[dict]:
+    """
+    Streaming decoder of the `packs` of `/field/objects/v4`,
+    yields each element of `objects` as soon as it is fully decoded instead of parsing the whole pack first
+    :param packs: gzip(base64(xor(json))) as a list of ints
+    :param password: `LokBotApi.xor_password`
+    :param chunk_size: max decompressed bytes per step
+    :return:
+    """
+    chunks = _iter_plain_chunks(packs, password, chunk_size)
+    buffer = ''
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, exhausted
+
+        try:
+            buffer += next(chunks)
+        except StopIteration:
+            exhausted = True
+
+    # seek to the start of the objects array
+    while True:
+        match = OBJECTS_ARRAY_PATTERN.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+
+        if exhausted:
+            return
+
+        read_more()
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE_AND_COMMA:
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            obj, position = _json_decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+
+            # incomplete object at the end of the buffer, drop what has been consumed and wait for more
+            buffer = buffer[position:]
+            position = 0
+            read_more()
+            continue
+
+        yield obj
+
+
+def benchmark(object_counts=(1000, 10000), password='d1bc3a5b0d4e8f72', number=5):
+    """
+    Compare the streaming decoder with the previous
+    `json.loads(xor(b64decode(gzip.decompress(bytearray(packs)))))` on synthetic packs
+    :return:
+    """
+    import gzip
+    import time
+    import timeit
+    import tracemalloc
+
+    def make_packs(count):
+        objects = [{
+            '_id': f'{index:024x}',
+            'loc': [32, index % 2048, index // 2048],
+            'level': index % 5 + 1,
+            'code': 20100101 + index % 5,
+            'param': {'value': 50000},
+            'state': 1,
+            'expired': '2022-03-11T22:34:23.062Z',
+        } for index in range(count)]
+        encoded = lokbot.codec.b64xor_enc({'objects': objects}, password).encode()
+
+        return list(gzip.compress(encoded))
+
+    def legacy(packs):
+        data_decoded = json.loads(lokbot.codec.xor(base64.b64decode(gzip.decompress(bytearray(packs))), password))
+        for _ in data_decoded.get('objects'):
+            return
+
+    def streaming(packs):
+        for _ in iter_objects(packs, password):
+            return
+
+    def peak_memory(func):
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return peak
+
+    for count in object_counts:
+        packs = make_packs(count)
+        assert list(iter_objects(packs, password)) == json.loads(
+            lokbot.codec.xor(base64.b64decode(gzip.decompress(bytearray(packs))), password)
+        ).get('objects')
+
+        def drain():
+            for _ in iter_objects(packs, password):
+                pass
+
+        def drain_legacy():
+            data_decoded = json.loads(lokbot.codec.xor(base64.b64decode(gzip.decompress(bytearray(packs))), password))
+            for _ in data_decoded.get('objects'):
+                pass
+
+        started = time.perf_counter()
+        streaming(packs)
+        first_streaming = time.perf_counter() - started
+        started = time.perf_counter()
+        legacy(packs)
+        first_legacy = time.perf_counter() - started
+
+        total = timeit.timeit(drain, number=number) / number
+        total_legacy = timeit.timeit(drain_legacy, number=number) / number
+
+        print(f'{count:>6} objects ({len(packs)} bytes packed): '
+              f'first object legacy {first_legacy * 1000:.1f} ms / streaming {first_streaming * 1000:.2f} ms, '
+              f'all objects legacy {total_legacy * 1000:.1f} ms / streaming {total * 1000:.1f} ms, '
+              f'peak memory legacy {peak_memory(drain_legacy) / 1024:.0f} KiB / '
+              f'streaming {peak_memory(drain) / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,187 @@
+import json
+import queue
+import threading
+import time
+
+import socketio
+import tenacity
+
+import lokbot.recorder
+from lokbot import logger, socf_logger
+
+# `/zone/enter/list/v4` the web client sends right after entering the field
+KNOCK_ZONES = '[0,64,1,65]'
+# 9 times enter-leave action on one connection will cause ban, the knock included
+MAX_ZONE_ENTERS = 8
+
+
+class FieldSession:
+    """
+    Long-lived connection to the field server of one account: the handshake, `/field/enter/v3` and the knock
+    are done once, each scan is then a single zone enter/leave round trip.
+    A dropped connection is re-established on the next scan, so is one that used up its `max_enters`
+    """
+
+    def __init__(self, url, api, token_getter, headers=None, before_connect=None, timeout=30,
+                 max_enters=MAX_ZONE_ENTERS):
+        """
+        :param url: `networks.fields` of `kingdom_enter`
+        :param api: `LokBotApi`, for the xor codec
+        :param token_getter: returns the current token
+        :param before_connect: called before each (re)connection
+        :param timeout: in seconds, for the field to be entered and for each scan to be answered
+        :param max_enters: zone enter/leave round trips on one connection, the knock included
+        """
+        self.url = url
+        self.api = api
+        self.token_getter = token_getter
+        self.headers = headers
+        self.before_connect = before_connect
+        self.timeout = timeout
+        self.max_enters = max_enters
+
+        self.sio = None
+        self.world_id = None
+        self.entered = threading.Event()
+        self.objects = queue.Queue()  # `/field/objects/v4` payloads, in order
+        self.enters = 0  # on the current connection
+        self.lock = threading.Lock()
+
+        self.connects = 0
+        self.rotations = 0
+        self.scans = 0
+        self.timeouts = 0
+        self.scan_seconds = 0.0
+
+    @property
+    def connected(self):
+        return self.sio is not None and self.sio.connected and self.entered.is_set()
+
+    def _on_field_enter(self, data):
+        data_decoded = self.api.b64xor_dec(data)
+        logger.debug(f'field_enter_v3: {data_decoded}')
+        self.world_id = data_decoded.get('loc')[0]  # in case of cvc event world map
+        self.entered.set()
+
+    def _drain(self):
+        while True:
+            try:
+                self.objects.get_nowait()
+            except queue.Empty:
+                return
+
+    def _connect(self):
+        self.close()
+
+        if self.before_connect:
+            self.before_connect()
+
+        sio = lokbot.recorder.socketio_client(
+            'field', lambda: self.api.xor_password, reconnection=False, logger=socf_logger, engineio_logger=socf_logger
+        )
+        sio.on('/field/enter/v3', self._on_field_enter)
+        sio.on('/field/objects/v4', self.objects.put)
+
+        self.entered.clear()
+        token = self.token_getter()
+        sio.connect(f'{self.url}?token={token}', transports=['websocket'], headers=self.headers)
+        self.sio = sio
+        self.connects += 1
+
+        sio.emit('/field/enter/v3', self.api.b64xor_enc({'token': token}))
+        if not self.entered.wait(self.timeout):
+            raise socketio.exceptions.ConnectionError('/field/enter/v3 timed out')
+
+        # knock, and let its objects arrive before the first scan
+        sio.emit('/zone/leave/list/v2', {'world': self.world_id, 'zones': '[]'})
+        sio.emit('/zone/enter/list/v4', self.api.b64xor_enc({'world': self.world_id, 'zones': KNOCK_ZONES}))
+        self.enters = 1
+        try:
+            self.objects.get(timeout=5)
+        except queue.Empty:
+            pass
+        sio.emit('/zone/leave/list/v2', {'world': self.world_id, 'zones': KNOCK_ZONES})
+
+        logger.info(f'field session entered world {self.world_id}')
+
+    @property
+    def remaining_enters(self):
+        """
+        :return: scans left before the connection has to be rotated
+        """
+        return max(self.max_enters - self.enters, 0) if self.connected else 0
+
+    def ensure_connected(self):
+        """
+        Connect, or rotate the connection if it has no zone enter left
+        """
+        with self.lock:
+            if not self.connected:
+                self._connect()
+            elif self.enters >= self.max_enters:
+                logger.info(f'{self.enters} zone enters on this connection, reconnecting before a ban')
+                self.rotations += 1
+                self._connect()
+
+    @tenacity.retry(
+        stop=tenacity.stop_after_attempt(3),
+        wait=tenacity.wait_random_exponential(multiplier=1, max=30),
+        retry=tenacity.retry_if_exception_type(socketio.exceptions.ConnectionError),
+        reraise=True
+    )
+    def scan(self, zone_ids):
+        """
+        Enter `zone_ids`, wait for their objects and leave them again, reconnecting first if needed
+        :return: the `/field/objects/v4` payload, None if the server didn't answer in time
+        """
+        with self.lock:
+            if not self.connected:
+                logger.warning('field session disconnected, reconnecting')
+                self._connect()
+            elif self.enters >= self.max_enters:
+                logger.info(f'{self.enters} zone enters on this connection, reconnecting before a ban')
+                self.rotations += 1
+                self._connect()
+
+            started_at = time.time()
+            message = {'world': self.world_id, 'zones': json.dumps(zone_ids, separators=(',', ':'))}
+
+            self._drain()
+            self.sio.emit('/zone/enter/list/v4', self.api.b64xor_enc(message))
+            self.enters += 1
+            try:
+                data = self.objects.get(timeout=self.timeout)
+            except queue.Empty:
+                data = None
+            self.sio.emit('/zone/leave/list/v2', message)
+
+            if data is None:
+                self.timeouts += 1
+                if not self.sio.connected:
+                    # the emits were dropped, try again on a new connection
+                    raise socketio.exceptions.ConnectionError('field session lost during scan')
+
+                logger.warning(f'no objects received for zone: {zone_ids}')
+
+            self.scans += 1
+            self.scan_seconds += time.time() - started_at
+
+            return data
+
+    def close(self):
+        if self.sio is not None and self.sio.connected:
+            self.sio.disconnect()
+
+        self.sio = None
+        self.entered.clear()
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'connects': self.connects,
+            'rotations': self.rotations,
+            'enters': self.enters,
+            'scans': self.scans,
+            'timeouts': self.timeouts,
+            'scan_seconds_mean': self.scan_seconds / self.scans if self.scans else None,
+        }
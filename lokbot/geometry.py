@@ -0,0 +1,188 @@
+import numpy
+
+# the 2048 x 2048 map is split into 256 x 256 lands of 8 x 8 (ids from 100000, row-major)
+# and 64 x 64 zones of 32 x 32 (ids from 0, row-major), a zone covers 4 x 4 lands
+LAND_ID_BASE = 100000
+LAND_SIZE = 8
+ZONE_SIZE = 32
+LANDS_PER_ROW = 256
+ZONES_PER_ROW = 64
+LANDS_PER_ZONE_ROW = ZONE_SIZE // LAND_SIZE
+
+
+def land_id_by_coords(x, y):
+    return LAND_ID_BASE + (y // LAND_SIZE) * LANDS_PER_ROW + x // LAND_SIZE
+
+
+def zone_id_by_coords(x, y):
+    return (x // ZONE_SIZE) + ZONES_PER_ROW * (y // ZONE_SIZE)
+
+
+def zone_id_by_land_id(land_id):
+    row, col = divmod(land_id - LAND_ID_BASE, LANDS_PER_ROW)
+
+    return (row // LANDS_PER_ZONE_ROW) * ZONES_PER_ROW + col // LANDS_PER_ZONE_ROW
+
+
+def land_coords(land_id):
+    """
+    :return: (x, y) of the top left corner of the land
+    """
+    row, col = divmod(land_id - LAND_ID_BASE, LANDS_PER_ROW)
+
+    return col * LAND_SIZE, row * LAND_SIZE
+
+
+def zone_coords(zone_id):
+    """
+    :return: (x, y) of the top left corner of the zone
+    """
+    row, col = divmod(zone_id, ZONES_PER_ROW)
+
+    return col * ZONE_SIZE, row * ZONE_SIZE
+
+
+def _window(row, col, radius, size):
+    rows = numpy.arange(max(row - radius, 0), min(row + radius, size - 1) + 1)
+    cols = numpy.arange(max(col - radius, 0), min(col + radius, size - 1) + 1)
+
+    return (rows[:, None] * size + cols[None, :]).ravel()
+
+
+def lands_within(x, y, radius):
+    """
+    Land ids of the (2 * radius + 1) square of lands centered on (x, y), clipped to the map, row-major
+    :return: numpy.ndarray
+    """
+    return LAND_ID_BASE + _window(y // LAND_SIZE, x // LAND_SIZE, radius, LANDS_PER_ROW)
+
+
+def zones_within(x, y, radius):
+    """
+    Zone ids of the (2 * radius + 1) square of zones centered on (x, y), clipped to the map, row-major
+    :return: numpy.ndarray
+    """
+    return _window(y // ZONE_SIZE, x // ZONE_SIZE, radius, ZONES_PER_ROW)
+
+
+def nearest_lands(x, y, radius, levels):
+    """
+    :param levels: devrank level of every land, indexed by `land_id - LAND_ID_BASE`
+    :return: [(land_id, level)] of the lands within radius, highest level first then by land id,
+    lands are level 1 to 10: the devrank level plus one, as `LokFarmer` always counted them
+    """
+    land_ids = lands_within(x, y, radius)
+    land_levels = levels[land_ids - LAND_ID_BASE].astype(numpy.int16)
+    order = numpy.lexsort((land_ids, -land_levels))
+
+    return list(zip(land_ids[order].tolist(), (land_levels[order] + 1).tolist()))
+
+
+def nearest_zones(x, y, radius, levels):
+    """
+    Zone ids of `nearest_lands` in order of their first land
+    :return:
+    """
+    zone_ids = []
+    for land_id, _ in nearest_lands(x, y, radius, levels):
+        zone_id = zone_id_by_land_id(land_id)
+        if zone_id not in zone_ids:
+            zone_ids.append(zone_id)
+
+    return zone_ids
+
+
+# region what `LokFarmer` used to do, kept for the benchmark
+
+def _legacy_blockshaped(arr, nrows, ncols):
+    h, w = arr.shape
+    return arr.reshape(h // nrows, nrows, -1, ncols).swapaxes(1, 2).reshape(-1, nrows, ncols)
+
+
+# noinspection PyBroadException
+def _legacy_ndindex(ndarray, item):
+    if len(ndarray.shape) == 1:
+        try:
+            return [ndarray.tolist().index(item)]
+        except:
+            pass
+    else:
+        for i, subarray in enumerate(ndarray):
+            try:
+                return [i] + _legacy_ndindex(subarray, item)
+            except:
+                pass
+
+
+def _legacy_neighbors(a, radius, row_number, column_number):
+    return [[a[i][j] if 0 <= i < len(a) and 0 <= j < len(a[0]) else 0
+             for j in range(column_number - 1 - radius, column_number + radius)]
+            for i in range(row_number - 1 - radius, row_number + radius)]
+
+
+def _legacy_zone_id_by_land_id(land_id):
+    blocks = _legacy_blockshaped(numpy.arange(100000, 165536).reshape(256, 256), 4, 4)
+
+    return _legacy_ndindex(blocks, land_id)[0]
+
+
+def _legacy_nearest_lands(x, y, radius, levels):
+    land_with_level = [[] for _ in range(10)]
+    for index, level in enumerate(levels.tolist()):
+        land_with_level[level].append(100000 + index)
+
+    nearby_land_ids = _legacy_neighbors(numpy.arange(100000, 165536).reshape(256, 256), radius, y // 8 + 1, x // 8 + 1)
+    nearby_land_ids = [item for sublist in nearby_land_ids for item in sublist if item != 0]
+
+    lands = []
+    for index, each_level in enumerate(reversed(land_with_level)):
+        lands += [(each_land_id, 10 - index) for each_land_id in each_level if each_land_id in nearby_land_ids]
+
+    return lands
+
+
+def _legacy_zones_within(x, y, radius):
+    zone_array = numpy.arange(0, 4096).reshape(64, 64)
+    idx = _legacy_ndindex(zone_array, (x // 32) + 64 * (y // 32))
+
+    nearby_zone_ids = _legacy_neighbors(zone_array, radius, idx[0] + 1, idx[1] + 1)
+
+    return [item.item() for sublist in nearby_zone_ids for item in sublist if item != 0]
+
+
+# endregion
+
+
+def benchmark(number=20):
+    """
+    Compare the closed-form conversions and numpy ranges against the scans `LokFarmer` used to do
+    :return:
+    """
+    import timeit
+
+    rng = numpy.random.default_rng(0)
+    levels = rng.integers(0, 10, LANDS_PER_ROW * LANDS_PER_ROW, dtype=numpy.uint8)
+    land_ids = rng.integers(LAND_ID_BASE, LAND_ID_BASE + LANDS_PER_ROW * LANDS_PER_ROW, 64).tolist()
+
+    assert [zone_id_by_land_id(each) for each in land_ids] == [_legacy_zone_id_by_land_id(each) for each in land_ids]
+    assert nearest_lands(1000, 1000, 8, levels) == _legacy_nearest_lands(1000, 1000, 8, levels)
+    assert zones_within(1000, 1000, 8).tolist() == _legacy_zones_within(1000, 1000, 8)
+
+    legacy = timeit.timeit(lambda: [_legacy_zone_id_by_land_id(each) for each in land_ids], number=1) / len(land_ids)
+    closed_form = timeit.timeit(lambda: [zone_id_by_land_id(each) for each in land_ids], number=number) / number
+    closed_form /= len(land_ids)
+    print(f'zone id by land id: legacy {legacy * 1000:9.3f} ms, closed form {closed_form * 1000:7.4f} ms')
+
+    legacy = timeit.timeit(lambda: _legacy_zones_within(1000, 1000, 8), number=number) / number
+    vectorized = timeit.timeit(lambda: zones_within(1000, 1000, 8), number=number) / number
+    print(f'zones within radius 8: legacy {legacy * 1000:9.3f} ms, vectorized {vectorized * 1000:7.3f} ms')
+
+    for radius in (4, 16):
+        legacy = timeit.timeit(lambda: _legacy_nearest_lands(1000, 1000, radius, levels), number=1)
+        vectorized = timeit.timeit(lambda: nearest_lands(1000, 1000, radius, levels), number=number) / number
+        print(f'nearest lands, radius {radius:>2}: legacy {legacy * 1000:9.3f} ms, '
+              f'vectorized {vectorized * 1000:7.3f} ms, x{legacy / vectorized:.0f}')
+
+
+if __name__ == '__main__':
+    benchmark()
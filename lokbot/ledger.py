@@ -0,0 +1,106 @@
+import threading
+
+from lokbot import logger
+
+
+class Reservation:
+    def __init__(self, ledger, amounts, name):
+        self.ledger = ledger
+        self.amounts = amounts
+        self.name = name
+        self.settled = False
+
+    def commit(self, response=None):
+        """
+        The action went through, the resources are spent
+        :param response: of the action, if it carries `resources` the state has them already
+        """
+        resources = (response or {}).get('resources')
+        self.ledger._settle(self, spent=True, reported=bool(resources) and len(resources) == 4)
+
+    def release(self):
+        """
+        The action failed, the resources are free again. Nothing happens once settled
+        """
+        self.ledger._settle(self, spent=False)
+
+    def __repr__(self):
+        return f'<Reservation {self.name} {self.amounts}>'
+
+
+class ResourceLedger:
+    """
+    Resources promised to the actions in flight, on top of those of the kingdom state:
+    a planner reserves what an action costs before calling the api, then commits or releases it,
+    so concurrent planners never spend the same resources twice
+    """
+
+    def __init__(self, state):
+        """
+        :param state: `lokbot.state.KingdomState`
+        """
+        self.state = state
+        self.reserved = [0, 0, 0, 0]
+        self.reservations = set()
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def available(self):
+        with self.lock:
+            return [max(have - held, 0) for have, held in zip(self.state.snapshot.resources, self.reserved)]
+
+    def _hold(self, amounts, name):
+        resources = self.state.snapshot.resources
+        if any(have - held < need for have, held, need in zip(resources, self.reserved, amounts)):
+            self.rejected += 1
+            return None
+
+        reservation = Reservation(self, list(amounts), name)
+        self.reserved = [held + need for held, need in zip(self.reserved, amounts)]
+        self.reservations.add(reservation)
+
+        return reservation
+
+    def reserve(self, amounts, name=None):
+        """
+        :param amounts: [food, lumber, stone, gold]
+        :return: Reservation, None if that much isn't available
+        """
+        with self.lock:
+            return self._hold(amounts, name)
+
+    def reserve_units(self, unit_cost, max_units, name=None):
+        """
+        Reserve as many units of `unit_cost` as available, up to `max_units`
+        :return: (units, Reservation), (0, None) if not even one is available
+        """
+        with self.lock:
+            available = [have - held for have, held in zip(self.state.snapshot.resources, self.reserved)]
+            units = min([max_units] + [have // cost for have, cost in zip(available, unit_cost) if cost])
+            if units <= 0:
+                self.rejected += 1
+                return 0, None
+
+            return units, self._hold([cost * units for cost in unit_cost], name)
+
+    def _settle(self, reservation, spent, reported=False):
+        with self.lock:
+            if reservation.settled:
+                return
+
+            reservation.settled = True
+            self.reservations.discard(reservation)
+            self.reserved = [held - need for held, need in zip(self.reserved, reservation.amounts)]
+
+            if spent and not reported:
+                self.state.spend(reservation.amounts)
+
+        logger.debug(f'{"committed" if spent else "released"}: {reservation}')
+
+    def stats(self):
+        with self.lock:
+            return {
+                'reserved': list(self.reserved),
+                'in_flight': [repr(each) for each in self.reservations],
+                'rejected': self.rejected,
+            }
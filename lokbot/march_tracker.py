@@ -0,0 +1,179 @@
+import heapq
+import math
+import threading
+import time
+
+import arrow
+
+from lokbot.enum import STATUS_FINISHED, STATUS_CLAIMED
+
+# reconcile with `kingdom_profile_troops` at least this often, in seconds
+RECONCILE_INTERVAL = 15 * 60
+# a march past its end holds its slot this many seconds more, unless `/task/update` tells it returned
+RETURN_GRACE = 30
+
+
+def _end_ts(task):
+    """
+    :return: epoch the march is back at, `expectedEnded` is the one kept up to date, `endTime` may be the arrival
+    """
+    ended = task.get('expectedEnded') or task.get('endTime')
+
+    return arrow.get(ended).timestamp() if ended else math.inf
+
+
+class MarchTracker:
+    """
+    Marches of one account in a min-heap of their epoch end times, kept up to date from `field_march_start`
+    and `/task/update` (matched by `_id`), the troop endpoint is only there to reconcile
+    """
+
+    def __init__(self, limit=2):
+        self.limit = limit
+        self.marches = {}  # _id -> task
+        self.ends = {}  # _id -> end ts
+        self.heap = []  # (release ts, end ts, _id), entries not matching `ends` are stale
+        self.condition = threading.Condition()
+        self.reconciled_at = None
+        self.freed = 0
+
+    def __len__(self):
+        return len(self.marches)
+
+    def _push(self, task, end_ts):
+        self.marches[task.get('_id')] = task
+        self.ends[task.get('_id')] = end_ts
+        heapq.heappush(self.heap, (end_ts, end_ts, task.get('_id')))
+
+    def _remove(self, march_id):
+        self.marches.pop(march_id, None)
+        self.ends.pop(march_id, None)
+
+    def _earliest(self):
+        """
+        :return: the earliest time a slot is released still ahead, the end of a march or its end plus `RETURN_GRACE`
+        """
+        now = time.time()
+        while self.heap:
+            release_ts, end_ts, march_id = self.heap[0]
+            if self.ends.get(march_id) == end_ts and release_ts > now:
+                break
+
+            heapq.heappop(self.heap)
+            if self.ends.get(march_id) == end_ts and release_ts < end_ts + RETURN_GRACE:
+                # past its end, held until `/task/update` or the grace is over
+                heapq.heappush(self.heap, (end_ts + RETURN_GRACE, end_ts, march_id))
+
+        return self.heap[0][0] if self.heap else math.inf
+
+    def _held(self, end_ts, at, now):
+        if end_ts > at:
+            return True
+
+        # a forecast counts a march due back by `at` as returned, the present waits for the grace
+        return at <= now < end_ts + RETURN_GRACE
+
+    def reconcile(self, marches, limit):
+        """
+        :param marches: `troops.field` of `kingdom_profile_troops`
+        :param limit: `troops.info.marchLimit`
+        """
+        with self.condition:
+            self.limit = limit
+            self.marches, self.ends, self.heap = {}, {}, []
+            for task in marches:
+                self._push(task, _end_ts(task))
+
+            self.reconciled_at = time.time()
+            self.condition.notify_all()
+
+    def reconcile_due_at(self):
+        return self.reconciled_at + RECONCILE_INTERVAL if self.reconciled_at is not None else 0
+
+    def needs_reconcile(self):
+        return self.reconcile_due_at() < time.time()
+
+    def add(self, task):
+        """
+        :param task: `newTask` of `field_march_start`
+        """
+        with self.condition:
+            self._push(task, _end_ts(task))
+
+    def update(self, task):
+        """
+        :param task: a `/task/update`, ignored unless it's one of ours
+        :return: True if a slot was freed
+        """
+        with self.condition:
+            if task.get('_id') not in self.marches:
+                return False
+
+            if task.get('status') in (STATUS_FINISHED, STATUS_CLAIMED):
+                self._remove(task.get('_id'))
+                self.freed += 1
+                self.condition.notify_all()
+                return True
+
+            # e.g. the march arrived and started gathering, the end only changes if the update carries one
+            end_ts = _end_ts(task) if task.get('expectedEnded') or task.get('endTime') else self.ends[task.get('_id')]
+            self._push(dict(self.marches[task.get('_id')], **task), end_ts)
+
+            return False
+
+    def free_slots(self, at=None):
+        """
+        :param at: epoch in the future to forecast, marches due back by then count as returned
+        """
+        now = time.time()
+        at = at or now
+
+        with self.condition:
+            return self.limit - len([end_ts for end_ts in self.ends.values() if self._held(end_ts, at, now)])
+
+    def next_free_slot_at(self):
+        """
+        :return: epoch a slot is released next, now if a slot is free already
+        """
+        with self.condition:
+            if self.free_slots() > 0:
+                return time.time()
+
+            return self._earliest()
+
+    def wait_for_free_slot(self, timeout=None):
+        """
+        Block until a slot is freed or `timeout` seconds have passed, never past the next reconcile
+        :return: True if a slot is free
+        """
+        with self.condition:
+            deadline = self.reconcile_due_at()
+            if timeout is not None and timeout != math.inf:
+                deadline = time.time() + timeout
+
+            while self.free_slots() <= 0:
+                remaining = min(deadline, self._earliest()) - time.time()
+                if remaining <= 0:
+                    break
+
+                self.condition.wait(remaining)
+
+            return self.free_slots() > 0
+
+    def tasks(self):
+        """
+        :return: the marches, soonest back first
+        """
+        with self.condition:
+            return sorted(self.marches.values(), key=lambda task: self.ends[task.get('_id')])
+
+    def stats(self):
+        next_free_slot_at = self.next_free_slot_at()
+
+        return {
+            'marches': len(self.marches),
+            'limit': self.limit,
+            'freed_by_events': self.freed,
+            'next_free_slot_in': max(next_free_slot_at - time.time(), 0) if next_free_slot_at != math.inf else None,
+            'reconciled_at': self.reconciled_at,
+        }
@@ -0,0 +1,100 @@
+import numpy
+
+import lokbot.util
+from lokbot.enum import OBJECT_MONSTER_CODE_LIST, TROOP_CODE_FIGHTER, TROOP_LOAD_MAP
+
+DEFAULT_TROOP_SPEED = 65
+
+troop_speed_map = {each['code']: each['speed'] for each in lokbot.util.load_asset('troop.json')}
+# (code, level) -> resources gathered per hour
+gathering_map = {
+    (each['code'], each['level']): each['gathering'] for each in lokbot.util.load_asset('field_object.json')
+}
+# (code, level) -> xp rewarded
+monster_reward_map = {
+    (each['code'], each['level']): each['xp'] for each in lokbot.util.load_asset('field_monster.json')
+}
+
+
+def march_capacity(troops, march_size):
+    """
+    What `_plan_march_troops` would send: high tier troops first, up to `march_size`
+    :param troops: [{"code": ..., "amount": ...}] as in `field_march_info`
+    :return: (load, speed) of the march
+    """
+    load = 0
+    speeds = []
+    remaining = march_size
+
+    for troop in sorted(troops, key=lambda x: x.get('code'), reverse=True):
+        amount = min(troop.get('amount', 0), remaining)
+        if amount <= 0:
+            continue
+
+        load += amount * TROOP_LOAD_MAP.get(troop.get('code'), 1)
+        speeds.append(troop_speed_map.get(troop.get('code'), DEFAULT_TROOP_SPEED))
+        remaining -= amount
+
+    if not speeds:
+        # nothing seen yet, assume a march of tier 1 infantry
+        return march_size * TROOP_LOAD_MAP[TROOP_CODE_FIGHTER], DEFAULT_TROOP_SPEED
+
+    # a march moves at the pace of its slowest troop
+    return load, min(speeds)
+
+
+def score(objects, from_loc, troops, march_size, xp_value=None):
+    """
+    Expected yield per second a march slot is busy: gathered resources for mines, xp for monsters
+    :param objects: field objects with `loc`, `code`, `level` and `param.value`
+    :param from_loc: the kingdom `loc`
+    :param troops: available troops, see `march_capacity`
+    :param march_size:
+    :param xp_value: resources one xp is worth, None to score mines and monsters relative to the best of their own
+    :return: numpy.ndarray, one score per object
+    """
+    if not objects:
+        return numpy.zeros(0)
+
+    load, speed = march_capacity(troops, march_size)
+
+    locs = numpy.array([each.get('loc') for each in objects], dtype=numpy.float64)
+    value = numpy.array([each.get('param', {}).get('value') or 0 for each in objects], dtype=numpy.float64)
+    is_monster = numpy.array([each.get('code') in OBJECT_MONSTER_CODE_LIST for each in objects])
+    gathering = numpy.array(
+        [gathering_map.get((each.get('code'), each.get('level')), 0) for each in objects], dtype=numpy.float64
+    )
+    reward = numpy.array(
+        [monster_reward_map.get((each.get('code'), each.get('level')), 0) for each in objects], dtype=numpy.float64
+    )
+
+    distance = numpy.hypot(locs[:, 1] - from_loc[1], locs[:, 2] - from_loc[2])
+    # there and back, `speed` is in tiles per minute
+    travel = 2 * distance * 60 / speed
+
+    gathered = numpy.minimum(value, load)
+    gather_time = numpy.divide(gathered * 3600, gathering, out=numpy.zeros_like(gathered), where=gathering > 0)
+
+    yield_ = numpy.where(is_monster, reward * (xp_value or 1), gathered)
+    busy = numpy.maximum(travel + numpy.where(is_monster, 0, gather_time), 1)
+    occupied = numpy.array([bool(each.get('occupied')) for each in objects])
+
+    scores = numpy.where((value > 0) & ~occupied, yield_ / busy, 0)
+    if xp_value is None:
+        # xp and resources don't compare, neither kind is put behind the other as a whole
+        for group in (is_monster, ~is_monster):
+            best = scores[group].max(initial=0)
+            if best > 0:
+                scores[group] /= best
+
+    return scores
+
+
+def rank(objects, from_loc, troops, march_size, xp_value=None):
+    """
+    :return: `objects` with a positive score, best first
+    """
+    scores = score(objects, from_loc, troops, march_size, xp_value)
+    order = numpy.argsort(-scores, kind='stable')
+
+    return [objects[i] for i in order if scores[i] > 0]
@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket in its GCRA form: every caller takes a ticket and learns the exact time its call is allowed,
+    so waiters are served in arrival order and each one wakes up right when its slot opens
+    """
+
+    def __init__(self, calls, period):
+        self.calls = calls
+        self.period = period
+        self.interval = period / calls
+        self.tolerance = period - self.interval  # allows a burst of `calls` within one `period`
+        self.theoretical_arrival_at = 0.0
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        take the next slot
+        :return: seconds to wait before the slot can be used
+        """
+        with self.lock:
+            now = time.monotonic()
+            theoretical_arrival_at = max(self.theoretical_arrival_at, now)
+            self.theoretical_arrival_at = theoretical_arrival_at + self.interval
+
+            return max(theoretical_arrival_at - self.tolerance - now, 0)
+
+    @contextlib.contextmanager
+    def _queued(self):
+        with self.lock:
+            self.waiting += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def acquire(self):
+        wait = self.reserve()
+
+        if wait > 0:
+            with self._queued():
+                time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+
+        if wait > 0:
+            with self._queued():
+                await asyncio.sleep(wait)
+
+
+class RateLimiterRegistry:
+    """
+    Per-endpoint buckets of one api instance (server-side limits apply per account)
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get(self, name, calls, period):
+        with self.lock:
+            if name not in self.buckets:
+                self.buckets[name] = TokenBucket(calls, period)
+
+            return self.buckets[name]
+
+    def queue_depth(self):
+        """
+        number of callers currently waiting on each endpoint
+        :return:
+        """
+        return {name: bucket.waiting for name, bucket in self.buckets.items()}
+
+
+def limits(calls, period, name=None):
+    """
+    Client-side rate limiter for api methods, blocks (or awaits) until the call is allowed
+    instead of raising and retrying like `ratelimit.limits` + `tenacity.wait_fixed(1)` did
+
+    The bucket is looked up from `self.rate_limiter` of the decorated method's instance
+    :param calls:
+    :param period: in seconds
+    :param name: bucket name, defaults to the method name
+    :return:
+    """
+
+    def decorator(func):
+        bucket_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                await self.rate_limiter.get(bucket_name, calls, period).acquire_async()
+
+                return await func(self, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            self.rate_limiter.get(bucket_name, calls, period).acquire()
+
+            return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
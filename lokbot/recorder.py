@@ -0,0 +1,137 @@
+import gzip
+import json
+import threading
+import time
+
+import socketio
+
+import lokbot.codec
+from lokbot import config, project_root, logger
+
+ENCODING_B64XOR = 'b64xor'  # payload was `b64xor_enc`-ed on the wire
+ENCODING_PACKS = 'packs'  # payload was a `/field/objects/v4` gzip pack
+
+
+class TrafficRecorder:
+    """
+    Append-only capture of the http and socket.io traffic, one compact json entry per line:
+    {"t": epoch, "ch": "http|kingdom|field|chat", "dir": "in|out", "ev": api path or event, "enc": ..., "data": ...}
+
+    Payloads are stored decoded, `enc` tells how they were encoded on the wire so they can be replayed
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def record(self, channel, direction, event, data, encoding=None, **extra):
+        entry = {'t': time.time(), 'ch': channel, 'dir': direction, 'ev': event, 'enc': encoding, 'data': data}
+        entry.update(extra)
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def record_http(self, api_path, json_data, json_response, elapsed):
+        self.record('http', 'in', api_path, json_response, req=json_data, elapsed=elapsed)
+
+    def record_socket(self, channel, direction, event, data, password):
+        encoding, data = decode_socket_payload(data, password)
+        self.record(channel, direction, event, data, encoding)
+
+
+def decode_socket_payload(data, password):
+    """
+    :return: (encoding, decoded data)
+    """
+    if password and isinstance(data, str):
+        try:
+            return ENCODING_B64XOR, lokbot.codec.b64xor_dec(data, password)
+        except ValueError:
+            return None, data
+
+    if password and isinstance(data, dict) and isinstance(data.get('packs'), list):
+        plain = gzip.decompress(bytes(data.get('packs')))
+
+        return ENCODING_PACKS, lokbot.codec.b64xor_dec(plain, password)
+
+    return None, data
+
+
+def encode_socket_payload(encoding, data, password):
+    if encoding == ENCODING_B64XOR:
+        return lokbot.codec.b64xor_enc(data, password)
+
+    if encoding == ENCODING_PACKS:
+        return {'packs': list(gzip.compress(lokbot.codec.b64xor_enc(data, password).encode()))}
+
+    return data
+
+
+def load_capture(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """
+    The process wide recorder, enabled by `record.enabled` in config.json
+    :return: `TrafficRecorder` or None
+    """
+    global _recorder
+
+    record_config = config.get('record', {})
+    if not record_config.get('enabled'):
+        return None
+
+    with _recorder_lock:
+        if _recorder is None:
+            path = project_root.joinpath(record_config.get('path', 'data/capture.jsonl'))
+            logger.info(f'recording traffic to {path}')
+            _recorder = TrafficRecorder(path)
+
+    return _recorder
+
+
+class RecordingClient(socketio.Client):
+    """
+    `socketio.Client` writing every emitted and received event to the recorder
+    """
+
+    def __init__(self, channel, recorder, password_getter, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.channel = channel
+        self.recorder = recorder
+        self.password_getter = password_getter
+
+    def emit(self, event, data=None, namespace=None, callback=None):
+        self.recorder.record_socket(self.channel, 'out', event, data, self.password_getter())
+
+        return super().emit(event, data, namespace, callback)
+
+    def _trigger_event(self, event, namespace, *args):
+        if event not in ('connect', 'disconnect'):
+            self.recorder.record_socket(self.channel, 'in', event, args[0] if args else None, self.password_getter())
+
+        return super()._trigger_event(event, namespace, *args)
+
+
+def socketio_client(channel, password_getter, **kwargs):
+    """
+    `socketio.Client` factory for the kingdom/field/chat connections, recording when enabled
+    :param channel: kingdom, field or chat
+    :param password_getter: returns the current xor password
+    :param kwargs: passed to `socketio.Client`
+    :return:
+    """
+    recorder = get_recorder()
+    if recorder is None:
+        return socketio.Client(**kwargs)
+
+    return RecordingClient(channel, recorder, password_getter, **kwargs)
@@ -0,0 +1,248 @@
+import abc
+import asyncio
+import base64
+import collections
+import json
+import statistics
+import time
+
+import fire
+import socketio
+from aiohttp import web
+
+import lokbot.codec
+import lokbot.recorder
+from lokbot import logger
+
+CHANNELS = ('kingdom', 'field', 'chat')
+
+
+class LocalLokServer(abc.ABC):
+    """
+    Local stand-in of the League of Kingdoms http api and the kingdom/field/chat socket.io servers,
+    the api listens on `port` and the socket.io servers on `port + 1`, `port + 2` and `port + 3`
+
+    Point the bot to it with `"api": {"base_url": "http://127.0.0.1:<port>/api/"}` in config.json,
+    the socket.io urls are handed out through the `networks` of `kingdom/enter`
+
+    Subclasses implement `api`
+    """
+
+    def __init__(self, host='127.0.0.1', port=8080):
+        self.host = host
+        self.port = port
+        self.xor_password = None
+        self.protected_api_list = []
+
+        self.sio = {
+            channel: socketio.AsyncServer(
+                async_mode='aiohttp', cors_allowed_origins='*', logger=False, engineio_logger=False
+            )
+            for channel in CHANNELS
+        }
+
+        self.started_at = time.time()
+        self.request_count = collections.Counter()
+        self.objects_emitted_at = None
+        self.decision_latencies = []
+
+    def networks(self):
+        return {
+            'kingdoms': [f'http://{self.host}:{self.port + 1}'],
+            'fields': [f'http://{self.host}:{self.port + 2}'],
+            'chats': [f'http://{self.host}:{self.port + 3}'],
+        }
+
+    def encode(self, data) -> str:
+        return lokbot.codec.b64xor_enc(data, self.xor_password)
+
+    def decode(self, data) -> dict:
+        return lokbot.codec.b64xor_dec(data, self.xor_password)
+
+    @abc.abstractmethod
+    async def api(self, api_path, json_data, token) -> dict:
+        """
+        :return: the json response of `api_path`
+        """
+
+    async def emit_field_objects(self, sid, data, encoding=lokbot.recorder.ENCODING_PACKS):
+        self.objects_emitted_at = time.time()
+
+        await self.sio['field'].emit(
+            '/field/objects/v4', lokbot.recorder.encode_socket_payload(encoding, data, self.xor_password), to=sid
+        )
+
+    async def _handle_api(self, request):
+        api_path = request.match_info['api_path']
+        form = await request.post()
+        post_data = form.get('json', '{}')
+
+        if api_path in self.protected_api_list and not post_data.startswith('{'):
+            json_data = self.decode(post_data)
+        else:
+            json_data = json.loads(post_data)
+
+        self.request_count[api_path] += 1
+        if api_path == 'field/march/start' and self.objects_emitted_at:
+            # time from the objects hitting the bot to the march it decided on
+            self.decision_latencies.append(time.time() - self.objects_emitted_at)
+
+        res = await self.api(api_path, json_data, request.headers.get('X-Access-Token'))
+
+        return web.json_response(res, dumps=lambda d: json.dumps(d, separators=(',', ':')))
+
+    def stats(self):
+        elapsed_minutes = max(time.time() - self.started_at, 1) / 60
+        latencies = self.decision_latencies
+
+        return {
+            'requests': sum(self.request_count.values()),
+            'requests_per_minute': sum(self.request_count.values()) / elapsed_minutes,
+            'marches_started': self.request_count['field/march/start'],
+            'decision_latency_mean': statistics.mean(latencies) if latencies else None,
+            'decision_latency_max': max(latencies) if latencies else None,
+            'top_requests': self.request_count.most_common(10),
+        }
+
+    async def _report_stats(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f'{self.__class__.__name__} stats: {self.stats()}')
+
+    async def serve(self):
+        api_app = web.Application()
+        api_app.router.add_post('/api/{api_path:.+}', self._handle_api)
+        api_app.router.add_get('/api/{api_path:.+}', self._handle_api)
+
+        apps = [(api_app, self.port)]
+        for offset, channel in enumerate(CHANNELS, start=1):
+            app = web.Application()
+            self.sio[channel].attach(app)
+            apps.append((app, self.port + offset))
+
+        for app, port in apps:
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, self.host, port).start()
+
+        logger.info(f'{self.__class__.__name__} listening on http://{self.host}:{self.port}/api/')
+        await self._report_stats()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+class ReplayServer(LocalLokServer):
+    """
+    Serves a capture written by `lokbot.recorder.TrafficRecorder`:
+    http responses are replayed per api path in recorded order (cycling once exhausted),
+    kingdom events are replayed after `/kingdom/enter` and field packs answer `/zone/enter/list/v4`,
+    every recorded delay is divided by `speed`
+    """
+
+    def __init__(self, capture_path, speed=10.0, host='127.0.0.1', port=8080):
+        super().__init__(host, port)
+        self.speed = speed
+
+        entries = lokbot.recorder.load_capture(capture_path)
+
+        self.http_entries = collections.defaultdict(list)
+        self.http_served = collections.Counter()
+        self.kingdom_entries = []
+        self.field_enter_entry = None
+        self.field_object_entries = []  # [(delay after the zone enter, entry)]
+        self.field_objects_served = 0
+
+        zone_entered_at = None
+        for entry in entries:
+            channel, direction, event = entry.get('ch'), entry.get('dir'), entry.get('ev')
+
+            if channel == 'http':
+                self.http_entries[event].append(entry)
+            elif channel == 'kingdom' and direction == 'in':
+                self.kingdom_entries.append(entry)
+            elif channel == 'field' and direction == 'out' and event == '/zone/enter/list/v4':
+                zone_entered_at = entry.get('t')
+            elif channel == 'field' and direction == 'in' and event == '/field/enter/v3':
+                self.field_enter_entry = self.field_enter_entry or entry
+            elif channel == 'field' and direction == 'in' and event == '/field/objects/v4':
+                delay = entry.get('t') - zone_entered_at if zone_entered_at else 0
+                self.field_object_entries.append((delay, entry))
+
+        auth_entries = self.http_entries.get('auth/connect')
+        if auth_entries:
+            auth_res = auth_entries[0].get('data')
+            self.protected_api_list = [
+                str(api).split('/api/').pop()
+                for api in json.loads(base64.b64decode(auth_res.get('lstProtect')).decode())
+            ]
+            self.xor_password = json.loads(base64.b64decode(auth_res.get('regionHash')).decode()).split('-')[1]
+
+        self._setup_socket_handlers()
+
+    async def api(self, api_path, json_data, token):
+        entries = self.http_entries.get(api_path)
+        if not entries:
+            logger.warning(f'no recorded response for {api_path}')
+            return {'result': True}
+
+        entry = entries[self.http_served[api_path] % len(entries)]
+        self.http_served[api_path] += 1
+
+        await asyncio.sleep((entry.get('elapsed') or 0) / self.speed)
+
+        res = entry.get('data')
+        if api_path == 'kingdom/enter':
+            res = dict(res, networks=self.networks())
+
+        return res
+
+    async def _replay_kingdom_events(self, sid):
+        if not self.kingdom_entries:
+            return
+
+        first_at = self.kingdom_entries[0].get('t')
+        replay_started_at = time.time()
+
+        for entry in self.kingdom_entries:
+            due = replay_started_at + (entry.get('t') - first_at) / self.speed
+            await asyncio.sleep(max(due - time.time(), 0))
+
+            data = lokbot.recorder.encode_socket_payload(entry.get('enc'), entry.get('data'), self.xor_password)
+            await self.sio['kingdom'].emit(entry.get('ev'), data, to=sid)
+
+    def _setup_socket_handlers(self):
+        @self.sio['kingdom'].on('/kingdom/enter')
+        async def on_kingdom_enter(sid, data):
+            self.sio['kingdom'].start_background_task(self._replay_kingdom_events, sid)
+
+        @self.sio['field'].on('/field/enter/v3')
+        async def on_field_enter(sid, data):
+            if self.field_enter_entry is None:
+                return
+
+            entry = self.field_enter_entry
+            await self.sio['field'].emit(
+                '/field/enter/v3',
+                lokbot.recorder.encode_socket_payload(entry.get('enc'), entry.get('data'), self.xor_password),
+                to=sid
+            )
+
+        @self.sio['field'].on('/zone/enter/list/v4')
+        async def on_zone_enter(sid, data):
+            if not self.field_object_entries:
+                return
+
+            delay, entry = self.field_object_entries[self.field_objects_served % len(self.field_object_entries)]
+            self.field_objects_served += 1
+
+            await asyncio.sleep(delay / self.speed)
+            await self.emit_field_objects(sid, entry.get('data'), entry.get('enc'))
+
+
+def main(capture_path, speed=10.0, host='127.0.0.1', port=8080):
+    ReplayServer(capture_path, speed, host, port).run()
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
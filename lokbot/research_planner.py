@@ -0,0 +1,199 @@
+import collections
+import threading
+
+from lokbot.enum import RESEARCH_CODE_MAP, RESEARCH_MINIMUM_LEVEL_MAP, research_json
+
+OBJECTIVE_POWER_PER_SECOND = 'power_per_second'
+OBJECTIVE_TARGET = 'target'
+
+
+def _requirement_graph():
+    """
+    One node per (code, level)
+    :return: {node: (research node it requires, ...)}, {node: academy level it requires}
+    """
+    graph, academy = {}, {}
+    for category in RESEARCH_CODE_MAP.values():
+        for research_code in category.values():
+            for each in research_json[research_code]:
+                node = (research_code, each.level)
+                # research names are only unique within their category
+                requires = [(category[req_type], req_level) for req_type, req_level in each.requirements
+                            if req_type != 'academy']
+                if each.level > 1:
+                    requires.append((research_code, each.level - 1))
+
+                graph[node] = tuple(requires)
+                academy[node] = max([req_level for req_type, req_level in each.requirements if req_type == 'academy'],
+                                    default=0)
+
+    return graph, academy
+
+
+def minimum_levels(to_max_level=False):
+    """
+    :return: {code: level to research up to}, as `academy_farmer_thread` always did
+    """
+    return {
+        research_code: len(research_json[research_code]) if to_max_level else
+        RESEARCH_MINIMUM_LEVEL_MAP.get(category_name, {}).get(research_name, 0)
+        for category_name, category in RESEARCH_CODE_MAP.items()
+        for research_name, research_code in category.items()
+    }
+
+
+class ResearchPlanner:
+    """
+    Researches of one account over the requirement DAG of `research_json`, advanced included.
+    The set of unlockable researches is kept up to date as research completes or the academy is upgraded,
+    the next one is then picked from it by an objective:
+    - power_per_second: the most power for its research time
+    - target: the one with the longest research time left to reach `target` (critical path)
+    """
+
+    def __init__(self, limits):
+        """
+        :param limits: {code: level to research up to}
+        """
+        self.graph, self.academy = _requirement_graph()
+        self.dependents = collections.defaultdict(list)
+        for node, requires in self.graph.items():
+            for required in requires:
+                self.dependents[required].append(node)
+
+        self.limits = limits
+        self.lock = threading.Lock()
+        self.synced = False
+        self.targets = {}  # target node -> ({node: critical path}) of what it needs
+
+        self._reset()
+
+    def _reset(self):
+        self.levels = {}  # code -> level researched
+        self.academy_level = 0
+        self.missing = {node: len(requires) for node, requires in self.graph.items()}
+        self.waiting = collections.defaultdict(set)  # academy level -> nodes only waiting for it
+        self.unlockable_nodes = set()
+
+        for node, count in self.missing.items():
+            if count == 0:
+                self._requirements_met(node)
+
+    def _requirements_met(self, node):
+        if self.academy[node] > self.academy_level:
+            self.waiting[self.academy[node]].add(node)
+        else:
+            self.unlockable_nodes.add(node)
+
+    def _complete(self, node):
+        self.unlockable_nodes.discard(node)
+        self.waiting[self.academy[node]].discard(node)
+
+        for dependent in self.dependents[node]:
+            self.missing[dependent] -= 1
+            if self.missing[dependent] == 0 and dependent[1] > self.levels.get(dependent[0], 0):
+                self._requirements_met(dependent)
+
+    def complete(self, code, level):
+        """
+        `code` was researched up to `level`
+        """
+        with self.lock:
+            for each_level in range(self.levels.get(code, 0) + 1, level + 1):
+                self.levels[code] = each_level
+                self._complete((code, each_level))
+
+    def set_academy_level(self, academy_level):
+        with self.lock:
+            for each_level in range(self.academy_level + 1, academy_level + 1):
+                self.unlockable_nodes.update(self.waiting.pop(each_level, ()))
+
+            self.academy_level = max(self.academy_level, academy_level)
+
+    def sync(self, researches, academy_level):
+        """
+        :param researches: `researches` of `kingdom_academy_research_list`
+        """
+        with self.lock:
+            self._reset()
+
+        self.set_academy_level(academy_level)
+        for each in researches:
+            if (each.get('code'), 1) in self.graph:
+                self.complete(each.get('code'), int(each.get('level')))
+
+        self.synced = True
+
+    def unlockable(self):
+        """
+        :return: [(code, level)] that can be researched now and are within the limits
+        """
+        with self.lock:
+            return [node for node in self.unlockable_nodes if node[1] <= self.limits.get(node[0], 0)]
+
+    def _critical_paths(self, target):
+        """
+        :return: {node: longest research time from starting it to `target` being done} of what `target` needs
+        """
+        if target in self.targets:
+            return self.targets[target]
+
+        needed, stack = set(), [target]
+        while stack:
+            node = stack.pop()
+            if node not in needed:
+                needed.add(node)
+                stack.extend(self.graph[node])
+
+        priority = {}
+
+        def visit(node):
+            if node not in priority:
+                priority[node] = research_json[node[0]][node[1] - 1].time + max(
+                    [visit(each) for each in self.dependents[node] if each in needed], default=0
+                )
+
+            return priority[node]
+
+        for node in needed:
+            visit(node)
+
+        self.targets[target] = priority
+
+        return priority
+
+    def candidates(self, objective=OBJECTIVE_POWER_PER_SECOND, target=None):
+        """
+        :param objective: power_per_second or target
+        :param target: (code, level), for the target objective
+        :return: [(code, level)], the best first
+        """
+        if objective == OBJECTIVE_TARGET and target is not None:
+            if self.levels.get(target[0], 0) < target[1]:
+                priority = self._critical_paths(target)
+                with self.lock:
+                    nodes = [node for node in self.unlockable_nodes if node in priority]
+
+                return sorted(nodes, key=lambda node: -priority[node])
+
+            # reached, carry on within the limits
+            objective = OBJECTIVE_POWER_PER_SECOND
+
+        if objective != OBJECTIVE_POWER_PER_SECOND:
+            raise ValueError(f'unknown research objective: {objective}')
+
+        def power_per_second(node):
+            each = research_json[node[0]][node[1] - 1]
+            return each.power / max(each.time, 1)
+
+        return sorted(self.unlockable(), key=power_per_second, reverse=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'synced': self.synced,
+                'academy_level': self.academy_level,
+                'researched': sum(self.levels.values()),
+                'unlockable': len(self.unlockable_nodes),
+                'waiting_for_academy': sum(len(each) for each in self.waiting.values()),
+            }
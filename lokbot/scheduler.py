@@ -0,0 +1,171 @@
+import concurrent.futures
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from lokbot import logger
+
+
+class Job:
+    def __init__(self, name, func, args=(), kwargs=None, interval=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.interval = interval  # (start, end) in seconds for repeating jobs
+        self.next_run = None
+        self.last_run = None
+        self.runs = 0
+        self.running = False
+        self.cancelled = False
+        self.last_error = None
+
+    def __repr__(self):
+        next_run = time.strftime('%H:%M:%S', time.localtime(self.next_run)) if self.next_run else None
+
+        return f'<Job {self.name} next_run={next_run} runs={self.runs} running={self.running}>'
+
+
+class Scheduler:
+    """
+    One timer heap plus a bounded worker pool instead of a `threading.Timer`/`threading.Thread` per job run
+    """
+
+    def __init__(self, max_workers=16):
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='lokbot-job')
+        self.active = set()
+        self.thread = None
+
+    def _push(self, job, delay):
+        job.next_run = time.time() + delay
+
+        with self.condition:
+            heapq.heappush(self.heap, (job.next_run, next(self.counter), job))
+            self.condition.notify()
+
+    def call_later(self, delay, func, args=(), kwargs=None, name=None):
+        """
+        Run `func(*args, **kwargs)` once, `delay` seconds from now, like `threading.Timer`
+        :return: Job
+        """
+        job = Job(name or func.__name__, func, args, kwargs)
+        self._push(job, delay)
+
+        return job
+
+    def call_soon(self, func, args=(), kwargs=None, name=None):
+        return self.call_later(0, func, args, kwargs, name)
+
+    def every(self, name, func, start, end=None, kwargs=None):
+        """
+        Run `func(**kwargs)` right away, then `start` to `end` seconds after each run has finished,
+        so a slow run never overlaps with the next one
+        :return: Job
+        """
+        job = Job(name, func, kwargs=kwargs, interval=(start, end or start))
+        self._push(job, 0)
+
+        return job
+
+    def cancel(self, job):
+        job.cancelled = True
+
+    def jobs(self):
+        """
+        :return: the running jobs, then the pending ones soonest first
+        """
+        with self.condition:
+            pending = [job for _, _, job in sorted(self.heap) if not job.cancelled]
+
+        return list(self.active) + pending
+
+    def _execute(self, job):
+        self.active.add(job)
+        job.running = True
+        job.last_run = time.time()
+
+        try:
+            job.func(*job.args, **job.kwargs)
+            job.last_error = None
+        except Exception as e:
+            job.last_error = e
+            logger.exception(f'job {job.name} failed: {e}')
+        finally:
+            job.running = False
+            job.runs += 1
+            self.active.discard(job)
+
+        if job.interval and not job.cancelled:
+            self._push(job, random.uniform(*job.interval))
+
+    def run_forever(self):
+        while True:
+            with self.condition:
+                while not self.heap or self.heap[0][0] > time.time():
+                    self.condition.wait(self.heap[0][0] - time.time() if self.heap else None)
+
+                _, _, job = heapq.heappop(self.heap)
+
+            if not job.cancelled:
+                self.pool.submit(self._execute, job)
+
+    def start(self):
+        """
+        Run the timer loop in a background thread
+        :return:
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run_forever, name='lokbot-scheduler', daemon=True)
+            self.thread.start()
+
+
+class Trigger:
+    """
+    `threading.Event` whose waiter can be a job: `then` schedules a callback on the next `set`
+    instead of parking a thread in `wait`
+    """
+
+    def __init__(self, scheduler, name):
+        self.scheduler = scheduler
+        self.name = name
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def set(self):
+        with self.lock:
+            callbacks, self.callbacks = self.callbacks, []
+            if not callbacks:
+                self.event.set()
+
+        # a pending callback consumes the trigger, just like `wait(); clear()` would
+        for func, args, kwargs in callbacks:
+            self.scheduler.call_soon(func, args, kwargs, name=f'{self.name}:{func.__name__}')
+
+    def clear(self):
+        self.event.clear()
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+    def then(self, func, args=(), kwargs=None):
+        """
+        Call `func(*args, **kwargs)` on the scheduler once the trigger is set, right away if it already is
+        :return:
+        """
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append((func, args, kwargs))
+                return
+
+            self.event.clear()
+
+        self.scheduler.call_soon(func, args, kwargs, name=f'{self.name}:{func.__name__}')
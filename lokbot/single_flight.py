@@ -0,0 +1,130 @@
+import asyncio
+import collections
+import copy
+import functools
+import inspect
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Concurrent identical calls of one api instance share a single in-flight request and its result
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.async_calls = {}
+        self.disabled = set()
+        self.coalesced = collections.Counter()
+        self.lock = threading.Lock()
+
+    def configure(self, name, enabled=True):
+        if enabled:
+            self.disabled.discard(name)
+        else:
+            self.disabled.add(name)
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.coalesced[key[0]] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+            # the caller of the leader may change its result while the followers copy theirs
+            call.result = copy.deepcopy(result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return result
+
+    async def do_async(self, key, coroutine_func):
+        future = self.async_calls.get(key)
+
+        if future is not None:
+            self.coalesced[key[0]] += 1
+            return copy.deepcopy(await asyncio.shield(future))
+
+        future = self.async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await coroutine_func()
+        except BaseException as e:
+            future.set_exception(e)
+            # followers retrieve it, don't warn about a never retrieved exception
+            future.exception()
+            raise
+        else:
+            future.set_result(copy.deepcopy(result))
+        finally:
+            del self.async_calls[key]
+
+        return result
+
+    def stats(self):
+        return dict(self.coalesced)
+
+
+def _flight_key(api, func, args, kwargs):
+    """
+    Calls after a mutation invalidated `func` start a new flight instead of joining the older one
+    """
+    generation = api.response_cache.generation(func.__name__)
+
+    return (func.__name__, generation) + args + tuple(sorted(kwargs.items()))
+
+
+def coalesce():
+    """
+    Single-flight read-only api methods through `self.single_flight`,
+    can be switched off per endpoint with `SingleFlight.configure(name, False)`
+    :return:
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                if func.__name__ in self.single_flight.disabled:
+                    return await func(self, *args, **kwargs)
+
+                key = _flight_key(self, func, args, kwargs)
+
+                return await self.single_flight.do_async(key, lambda: func(self, *args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if func.__name__ in self.single_flight.disabled:
+                return func(self, *args, **kwargs)
+
+            key = _flight_key(self, func, args, kwargs)
+
+            return self.single_flight.do(key, lambda: func(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
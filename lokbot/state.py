@@ -0,0 +1,165 @@
+import threading
+import time
+
+from lokbot.enum import STATUS_FINISHED, TASK_CODE_SILVER_HAMMER, TASK_CODE_GOLD_HAMMER
+
+# re-fetch `kingdom_task_all` at least this often, in seconds
+TASKS_TTL = 10 * 60
+
+
+def _index_by(items, key):
+    index = {}
+    for item in items:
+        index.setdefault(item.get(key), []).append(item)
+
+    return {k: tuple(v) for k, v in index.items()}
+
+
+class KingdomSnapshot:
+    """
+    Immutable view of the kingdom at `version`, never changed once published
+    """
+
+    def __init__(self, version, buildings, tasks, resources, dragos, drago_action_point, tasks_synced_at,
+                 buildings_by_position=None, buildings_by_code=None, tasks_by_code=None):
+        self.version = version
+        self.buildings = buildings  # tuple
+        self.tasks = tasks  # tuple
+        self.resources = resources  # tuple, [food, lumber, stone, gold]
+        self.dragos = dragos  # tuple of available dragos
+        self.drago_action_point = drago_action_point
+        self.tasks_synced_at = tasks_synced_at
+
+        self.buildings_by_position = buildings_by_position or {b.get('position'): b for b in buildings}
+        self.buildings_by_code = buildings_by_code or _index_by(buildings, 'code')
+        self.tasks_by_code = tasks_by_code or _index_by(tasks, 'code')
+
+    def building_level(self, code):
+        """
+        :return: the highest level of the buildings of `code`, 0 if there is none
+        """
+        return max([b.get('level') for b in self.buildings_by_code.get(code, ())], default=0)
+
+    def tasks_of(self, code):
+        return self.tasks_by_code.get(code, ())
+
+
+class KingdomState:
+    """
+    Versioned kingdom state of one account, fed by socket.io events and api responses.
+    Writers build a new `KingdomSnapshot` under a lock and swap it in, readers just take `snapshot`
+    """
+
+    def __init__(self, kingdom):
+        """
+        :param kingdom: `kingdom` of `kingdom_enter`
+        """
+        self.lock = threading.Lock()
+        self.snapshot = KingdomSnapshot(
+            0,
+            tuple(kingdom.get('buildings', [])),
+            (),
+            tuple(kingdom.get('resources', [0, 0, 0, 0])),
+            (),
+            kingdom.get('dragoActionPoint', {}).get('value', 0),
+            None,
+        )
+
+    def _publish(self, **changes):
+        current = self.snapshot
+        fields = dict(
+            buildings=current.buildings, tasks=current.tasks, resources=current.resources, dragos=current.dragos,
+            drago_action_point=current.drago_action_point, tasks_synced_at=current.tasks_synced_at,
+        )
+        # keep the indexes of what didn't change
+        if 'buildings' not in changes:
+            fields.update(buildings_by_position=current.buildings_by_position,
+                          buildings_by_code=current.buildings_by_code)
+        if 'tasks' not in changes:
+            fields.update(tasks_by_code=current.tasks_by_code)
+
+        fields.update(changes)
+        self.snapshot = KingdomSnapshot(current.version + 1, **fields)
+
+    def update_building(self, building):
+        with self.lock:
+            by_position = dict(self.snapshot.buildings_by_position)
+            by_position[building.get('position')] = dict(building)
+            self._publish(buildings=tuple(by_position.values()))
+
+    def set_resources(self, resources):
+        with self.lock:
+            self._publish(resources=tuple(resources))
+
+    def set_resource(self, index, value):
+        with self.lock:
+            resources = list(self.snapshot.resources)
+            resources[index] = value
+            self._publish(resources=tuple(resources))
+
+    def spend(self, amounts):
+        with self.lock:
+            self._publish(resources=tuple(max(have - need, 0) for have, need in zip(self.snapshot.resources, amounts)))
+
+    def set_tasks(self, tasks):
+        with self.lock:
+            self._publish(tasks=tuple(tasks), tasks_synced_at=time.time())
+
+    def update_task(self, task):
+        with self.lock:
+            tasks = {t.get('_id'): t for t in self.snapshot.tasks}
+            merged = dict(tasks.get(task.get('_id'), {}), **task)
+
+            if merged.get('code') in (TASK_CODE_SILVER_HAMMER, TASK_CODE_GOLD_HAMMER) and \
+                    merged.get('status') == STATUS_FINISHED:
+                # building queues are released without claiming
+                tasks.pop(task.get('_id'), None)
+            else:
+                tasks[task.get('_id')] = merged
+
+            self._publish(tasks=tuple(tasks.values()))
+
+    def remove_tasks(self, code):
+        with self.lock:
+            self._publish(tasks=tuple(t for t in self.snapshot.tasks if t.get('code') != code))
+
+    def tasks_stale(self):
+        synced_at = self.snapshot.tasks_synced_at
+
+        return synced_at is None or synced_at + TASKS_TTL < time.time()
+
+    def set_dragos(self, dragos):
+        with self.lock:
+            self._publish(dragos=tuple(dragos))
+
+    def set_drago_action_point(self, value):
+        with self.lock:
+            self._publish(drago_action_point=value)
+
+    def on_response(self, json_response):
+        """
+        Pick up what an api response tells about the kingdom
+        :return: True if anything changed
+        """
+        changed = False
+
+        resources = json_response.get('resources')
+        if resources and len(resources) == 4:
+            self.set_resources(resources)
+            changed = True
+
+        if isinstance(json_response.get('kingdomTasks'), list):
+            self.set_tasks(json_response.get('kingdomTasks'))
+            changed = True
+
+        if isinstance(json_response.get('updateBuilding'), dict):
+            self.update_building(json_response.get('updateBuilding'))
+            changed = True
+
+        new_task = json_response.get('newTask')
+        if isinstance(new_task, dict) and isinstance(new_task.get('code'), int):
+            # marches are `MarchTracker`'s
+            self.update_task(new_task)
+            changed = True
+
+        return changed
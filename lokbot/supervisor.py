@@ -0,0 +1,111 @@
+import time
+
+import fire
+
+import lokbot.scheduler
+from lokbot import logger
+from lokbot.app import load_farmer, start_farmer
+
+
+class Supervisor:
+    """
+    Runs many accounts in one process instead of one `python -m lokbot` process each,
+    the asset tables, the devrank map, the http connection pool and the scheduler are shared
+    """
+
+    def __init__(self, tokens, captcha_solver_config=None, stagger=5, workers_per_account=4):
+        self.tokens = tokens
+        self.captcha_solver_config = captcha_solver_config
+        self.stagger = stagger
+        self.scheduler = lokbot.scheduler.Scheduler(max_workers=max(16, workers_per_account * len(tokens)))
+        self.farmers = {}
+
+    def start(self):
+        for index, token in enumerate(self.tokens):
+            if index:
+                # don't log every account in at once
+                time.sleep(self.stagger)
+
+            try:
+                farmer = load_farmer(token, self.captcha_solver_config, self.scheduler)
+            except Exception as e:
+                logger.error(f'failed to load account #{index}: {e}')
+                continue
+
+            start_farmer(farmer)
+            self.farmers[farmer._id] = farmer
+            logger.info(f'account {farmer._id} started, {len(self.farmers)}/{len(self.tokens)}')
+
+    def run(self):
+        self.scheduler.start()
+        self.start()
+        self.scheduler.thread.join()
+
+
+def main(*tokens, tokens_file=None, captcha_solver_config=None, stagger=5):
+    """
+    python -m lokbot.supervisor TOKEN_1 TOKEN_2 ... or python -m lokbot.supervisor --tokens_file=tokens.txt
+    :param tokens:
+    :param tokens_file: one token per line
+    :param captcha_solver_config:
+    :param stagger: seconds between two account logins
+    :return:
+    """
+    tokens = list(tokens)
+    if tokens_file:
+        with open(tokens_file) as f:
+            tokens += [line.strip() for line in f if line.strip()]
+
+    Supervisor(tokens, captcha_solver_config, stagger).run()
+
+
+def benchmark(accounts=4, settle=5):
+    """
+    Resident memory of one process per account against all of them in one `Supervisor`,
+    each measured in a fresh interpreter.
+    Run it against `python -m lokbot.fake_server` with `api.base_url` of config.json pointing to it
+    :param accounts: how many fake accounts
+    :param settle: seconds to let the sockets connect and the first jobs run before measuring
+    :return:
+    """
+    import os
+    import subprocess
+    import sys
+
+    import jwt
+
+    from lokbot import project_root
+
+    measure = (
+        'import os, resource, sys, time\n'
+        'from lokbot.supervisor import Supervisor\n'
+        'supervisor = Supervisor(sys.argv[1:], stagger=0)\n'
+        'supervisor.scheduler.start()\n'
+        'supervisor.start()\n'
+        f'time.sleep({settle})\n'
+        'print("max_rss", len(supervisor.farmers), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, flush=True)\n'
+        'os._exit(0)\n'  # the farmers never stop on their own
+    )
+
+    def max_rss(tokens):
+        output = subprocess.run(
+            [sys.executable, '-c', measure, *tokens], cwd=project_root, capture_output=True, text=True,
+            env=dict(os.environ, PYTHONPATH=str(project_root)), timeout=settle + 60 + 10 * len(tokens),
+        ).stdout
+        # the loggers write to stdout too
+        _, loaded, kib = [line for line in output.splitlines() if line.startswith('max_rss ')][-1].split()
+        assert int(loaded) == len(tokens), 'not every account was loaded'
+
+        return int(kib) / 1024
+
+    tokens = [jwt.encode({'_id': f'benchmark{index}'}, 'benchmark') for index in range(accounts)]
+
+    single = max_rss(tokens[:1])
+    shared = max_rss(tokens)
+    print(f'one process per account: {single:6.1f} MiB each, {single * accounts:6.1f} MiB for {accounts}')
+    print(f'one supervisor:          {shared:6.1f} MiB for {accounts}, '
+          f'{(shared - single) / max(accounts - 1, 1):6.1f} MiB per extra account')
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
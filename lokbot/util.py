@@ -1,7 +1,10 @@
+import json
 import random
 
 import jwt
 
+import lokbot.geometry
+from lokbot import project_root
 from lokbot.enum import *
 
 
@@ -34,7 +37,16 @@ def run_functions_in_random_order(*funcs):
 
 
 def get_zone_id_by_coords(x, y):
-    return (x // 32) + 64 * (y // 32)
+    return lokbot.geometry.zone_id_by_coords(x, y)
+
+
+def load_asset(name):
+    """
+    :param name: path under `lokbot/assets`
+    :return: the parsed json
+    """
+    with open(project_root.joinpath(f'lokbot/assets/{name}')) as f:
+        return json.load(f)
 
 
 def decode_jwt(token):
@@ -0,0 +1,115 @@
+import collections
+import time
+
+import numpy
+
+import lokbot.geometry
+
+
+def zone_levels(levels):
+    """
+    :param levels: devrank level of every land
+    :return: mean devrank level of every zone, indexed by zone id
+    """
+    per_zone = lokbot.geometry.LANDS_PER_ZONE_ROW
+    grid = numpy.asarray(levels, dtype=numpy.float32).reshape(
+        lokbot.geometry.ZONES_PER_ROW, per_zone, lokbot.geometry.ZONES_PER_ROW, per_zone
+    )
+
+    return grid.mean(axis=(1, 3)).ravel()
+
+
+class ZoneScheduler:
+    """
+    Orders the zones within `radius` of the kingdom by expected yield:
+    the devrank level of their lands, their distance to the kingdom and a decayed history of
+    how many targets each scan found there.
+    Zones not scanned for a while gain priority without bound, so the whole radius is covered over the loops
+    """
+
+    def __init__(self, x, y, radius, levels, step=9, half_life=6 * 3600, rotation_period=3600,
+                 devrank_weight=1.0, history_weight=1.0, distance_weight=0.5, rotation_weight=0.5):
+        self.step = step
+        self.half_life = half_life
+        self.rotation_period = rotation_period
+        self.history_weight = history_weight
+        self.rotation_weight = rotation_weight
+
+        self.zone_ids = lokbot.geometry.zones_within(x, y, radius)
+        self.position = {zone_id: index for index, zone_id in enumerate(self.zone_ids.tolist())}
+
+        zone_x = (self.zone_ids % lokbot.geometry.ZONES_PER_ROW + 0.5) * lokbot.geometry.ZONE_SIZE
+        zone_y = (self.zone_ids // lokbot.geometry.ZONES_PER_ROW + 0.5) * lokbot.geometry.ZONE_SIZE
+        distance = numpy.hypot(zone_x - x, zone_y - y) / (max(radius, 1) * lokbot.geometry.ZONE_SIZE)
+
+        # the part of the score that only changes with the devrank
+        self.static_score = devrank_weight * zone_levels(levels)[self.zone_ids] / 9 - distance_weight * distance
+
+        self.hits = numpy.zeros(len(self.zone_ids))
+        self.hits_at = numpy.zeros(len(self.zone_ids))
+        self.scanned_at = numpy.zeros(len(self.zone_ids))
+
+    def _decayed_hits(self, now):
+        return self.hits * numpy.power(0.5, (now - self.hits_at) / self.half_life)
+
+    def scores(self, now=None):
+        now = now or time.time()
+
+        hits = self._decayed_hits(now)
+        # uncapped, even the poorest zone is eventually worth a scan again
+        staleness = (now - self.scanned_at) / self.rotation_period
+
+        return self.static_score + self.history_weight * hits / (1 + hits) + self.rotation_weight * staleness
+
+    def next_batches(self, count, now=None):
+        """
+        :param count: how many `step` sized batches the connection can afford
+        :return: [[zone_id]] richest zones first
+        """
+        order = numpy.argsort(-self.scores(now), kind='stable')[:count * self.step]
+        zone_ids = self.zone_ids[order].tolist()
+
+        return [zone_ids[i:i + self.step] for i in range(0, len(zone_ids), self.step)]
+
+    def record(self, zone_ids, found, now=None):
+        """
+        :param zone_ids: a scanned batch
+        :param found: zone id -> number of matching targets seen
+        :return:
+        """
+        now = now or time.time()
+        indexes = [self.position[zone_id] for zone_id in zone_ids if zone_id in self.position]
+
+        self.hits[indexes] = self._decayed_hits(now)[indexes] + [found.get(self.zone_ids[i], 0) for i in indexes]
+        self.hits_at[indexes] = now
+        self.scanned_at[indexes] = now
+
+
+def coverage(hours=24, loop_interval=60, batches=7, radius=8):
+    """
+    Simulate a day of scan loops with all the devrank in the north half of the radius,
+    every zone should still be scanned, and more than once
+    :return:
+    """
+    x, y = 1024, 1024
+    levels = numpy.ones(lokbot.geometry.LANDS_PER_ROW ** 2, dtype=numpy.uint8)
+    levels.reshape(lokbot.geometry.LANDS_PER_ROW, -1)[:y // lokbot.geometry.LAND_SIZE] = 9
+
+    scheduler = ZoneScheduler(x, y, radius, levels)
+    scans = collections.Counter()
+    started_at = time.time()
+
+    for loop in range(hours * 3600 // loop_interval):
+        now = started_at + loop * loop_interval
+        for zone_ids in scheduler.next_batches(batches, now):
+            scheduler.record(zone_ids, {}, now)
+            scans.update(zone_ids)
+
+    covered = len(scans) / len(scheduler.zone_ids)
+    print(f'{len(scans)} of {len(scheduler.zone_ids)} zones scanned, '
+          f'least {min(scans[zone_id] for zone_id in scheduler.zone_ids.tolist())} times, most {max(scans.values())}')
+    assert covered == 1, f'only {covered:.0%} of the radius was scanned'
+
+
+if __name__ == '__main__':
+    coverage()